@@ -0,0 +1,127 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+import json
+from typing import Optional, Tuple
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# (start_time_epoch, id, reverse)
+Cursor = Tuple[int, int, bool]
+
+
+def _position(record) -> Tuple[int, int]:
+    # Pages hold either records or rows fetched with `values()`
+    if isinstance(record, dict):
+        return record["start_time_epoch"], record["id"]
+    return record.start_time_epoch, record.id
+
+
+class RecordCursorPagination(BasePagination):
+    """Keyset pagination of records on (start_time_epoch, id), newest first.
+
+    Every page is a range query starting right after the last record seen,
+    so it costs the same no matter how deep into the history it is, and no
+    records are skipped or repeated when new ones are added meanwhile.
+    Clients passing a `page` query parameter get the page number based
+    pagination instead.
+    """
+
+    cursor_query_param = "cursor"
+    page_query_param = "page"
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.fallback: Optional[PageNumberPagination] = None
+        if self.page_query_param in request.query_params:
+            self.fallback = PageNumberPagination()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.base_url = request.build_absolute_uri()
+        cursor = self.decode_cursor(request)
+
+        if cursor is None:
+            start, pk, reverse = None, None, False
+        else:
+            start, pk, reverse = cursor
+
+        if reverse:
+            queryset = queryset.order_by("start_time_epoch", "id")
+        else:
+            queryset = queryset.order_by("-start_time_epoch", "-id")
+
+        if cursor is not None and reverse:
+            queryset = queryset.filter(
+                Q(start_time_epoch__gt=start)
+                | Q(start_time_epoch=start, id__gt=pk)
+            )
+        elif cursor is not None:
+            queryset = queryset.filter(
+                Q(start_time_epoch__lt=start)
+                | Q(start_time_epoch=start, id__lt=pk)
+            )
+
+        # Fetch one more record to find out whether there are any more
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next or not self.page:
+            return None
+        start, pk = _position(self.page[-1])
+        return self.encode_cursor((start, pk, False))
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        start, pk = _position(self.page[0])
+        return self.encode_cursor((start, pk, True))
+
+    def decode_cursor(self, request) -> Optional[Cursor]:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            start, pk, reverse = json.loads(
+                urlsafe_b64decode(encoded.encode("ascii"))
+            )
+            return int(start), int(pk), bool(reverse)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor: Cursor) -> str:
+        encoded = urlsafe_b64encode(json.dumps(cursor).encode("ascii"))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode("ascii")
+        )
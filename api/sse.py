@@ -0,0 +1,142 @@
+"""Server-sent events streaming the changes of the active record.
+
+Every change is sent as an `active` event holding the running record, or
+null once it was stopped. Clients tick its elapsed time themselves. A
+`heartbeat` event holding the time of the server is sent whenever nothing
+happened for a while, which keeps proxies from closing the connection and
+lets clients notice a dead one.
+
+Under WSGI a stream holds a server thread while it is open. The ASGI
+handler of `track.handlers` consumes `EventStreamResponse` through
+`async_streaming_content` instead, which waits on the event loop.
+"""
+
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+from track import events
+
+from .export import format_timestamp
+
+CONTENT_TYPE = "text/event-stream"
+
+# Milliseconds clients wait before reconnecting once a stream ended
+RETRY_MS = 1000
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Renders the errors of a stream as an `error` event."""
+
+    media_type = CONTENT_TYPE
+    format = "event-stream"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_event("error", data)
+
+
+def format_event(name: str, data: Any) -> bytes:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def _active(event: events.Event) -> Optional[Dict[str, Any]]:
+    if event is None:
+        return None
+
+    return {
+        "id": event["id"],
+        "project": event["project"],
+        "start_time": format_timestamp(event["start_time_epoch"]),
+    }
+
+
+def _first(event: events.Event) -> bytes:
+    return f"retry: {RETRY_MS}\n\n".encode() + format_event(
+        "active", _active(event)
+    )
+
+
+def _heartbeat() -> bytes:
+    now = format_timestamp(int(time.time()))
+    return format_event("heartbeat", {"now": now})
+
+
+def stream_active_record(
+    sequence: int, event: events.Event, *, heartbeat: float, duration: float
+) -> Iterator[bytes]:
+    """Send `event`, then every event published after `sequence`.
+
+    The stream ends after `duration` seconds, so a server thread is never
+    held forever, and clients reconnect to a fresh one.
+    """
+
+    yield _first(event)
+
+    deadline = time.monotonic() + duration
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+
+        latest, event = events.notifier.wait(
+            sequence, timeout=min(heartbeat, remaining)
+        )
+        if latest == sequence:
+            yield _heartbeat()
+            continue
+
+        sequence = latest
+        yield format_event("active", _active(event))
+
+
+async def astream_active_record(
+    sequence: int, event: events.Event, *, heartbeat: float, duration: float
+) -> AsyncIterator[bytes]:
+    """Same as `stream_active_record`, waiting on the event loop."""
+
+    yield _first(event)
+
+    deadline = time.monotonic() + duration
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+
+        latest, event = await events.notifier.wait_async(
+            sequence, timeout=min(heartbeat, remaining)
+        )
+        if latest == sequence:
+            yield _heartbeat()
+            continue
+
+        sequence = latest
+        yield format_event("active", _active(event))
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    """Streams the active record, to threads and event loops alike."""
+
+    def __init__(
+        self,
+        sequence: int,
+        event: events.Event,
+        *,
+        heartbeat: float,
+        duration: float
+    ) -> None:
+        super().__init__(
+            stream_active_record(
+                sequence, event, heartbeat=heartbeat, duration=duration
+            ),
+            content_type=CONTENT_TYPE,
+        )
+        self.async_streaming_content = astream_active_record(
+            sequence, event, heartbeat=heartbeat, duration=duration
+        )
+        self["Cache-Control"] = "no-cache"
+        # Keep nginx from buffering the events
+        self["X-Accel-Buffering"] = "no"
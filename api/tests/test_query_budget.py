@@ -0,0 +1,110 @@
+"""Make sure no endpoint issues queries per item it returns."""
+
+from datetime import date, datetime, timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+import pytest
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from track.tests import factories
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def data():
+    category = factories.CategoryFactory()
+    project = factories.ProjectFactory()
+    project.categories.add(category)
+
+    factories.RecordFactory(project=project, stop_time_epoch=None)
+
+    return {"category": category, "project": project}
+
+
+def _populate(data, count):
+    """Relate `count` more categories, projects and records to `data`."""
+
+    for category in factories.CategoryFactory.create_batch(count):
+        data["project"].categories.add(category)
+
+    now = datetime.now()
+    for project in factories.ProjectFactory.create_batch(count):
+        data["category"].projects.add(project)
+        factories.RecordFactory(
+            project=project,
+            start_time_epoch=datetime.timestamp(now - timedelta(hours=2)),
+            stop_time_epoch=datetime.timestamp(now - timedelta(hours=1)),
+        )
+
+
+def _count_queries(client, url, params):
+    cache.clear()
+
+    with CaptureQueriesContext(connection) as context:
+        resp = client.get(url, params)
+
+    assert resp.status_code == status.HTTP_200_OK, resp.content
+    return len(context)
+
+
+@pytest.mark.parametrize(
+    "name, kwargs, params",
+    [
+        ("api:category-list", {}, {}),
+        ("api:category-detail", {"name": "category"}, {}),
+        ("api:project-list", {}, {}),
+        ("api:project-detail", {"name": "project"}, {}),
+        ("api:record-list", {}, {}),
+        ("api:record-list", {}, {"page": 1}),
+        ("api:record-active", {}, {}),
+        ("api:report-week", {"year": "year", "week_number": "week"}, {}),
+        (
+            "api:report-week-category",
+            {"year": "year", "week_number": "week", "category": "category"},
+            {},
+        ),
+        ("api:report-period", {}, {"begin": "begin", "end": "end"}),
+    ],
+)
+@pytest.mark.django_db
+def test_query_budget(client, data, name, kwargs, params):
+
+    today = date.today()
+    values = {
+        "category": data["category"].name,
+        "project": data["project"].name,
+        "year": today.isocalendar()[0],
+        "week": today.isocalendar()[1],
+        "begin": (today - timedelta(days=7)).isoformat(),
+        "end": (today + timedelta(days=1)).isoformat(),
+    }
+    url = reverse(name, kwargs={k: values[v] for k, v in kwargs.items()})
+    params = {k: values.get(v, v) for k, v in params.items()}
+
+    _populate(data, 1)
+    few = _count_queries(client, url, params)
+
+    _populate(data, 10)
+    many = _count_queries(client, url, params)
+
+    assert few == many
+
+
+@pytest.mark.django_db
+def test_record_detail_query_budget(client, data, django_assert_num_queries):
+
+    record = factories.RecordFactory(project=data["project"])
+    url = reverse("api:record-detail", kwargs={"pk": record.pk})
+
+    with django_assert_num_queries(1):
+        resp = client.get(url)
+
+    assert resp.status_code == status.HTTP_200_OK, resp.content
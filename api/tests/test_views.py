@@ -1,9 +1,23 @@
+import csv
+from datetime import datetime
+import io
+import json
+import threading
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 import pendulum
 import pytest
 from rest_framework.test import APIClient
-from rest_framework import status
+from rest_framework import serializers, status
 
+from api.export import format_timestamp
+from api.views import RecordViewSet
+from track import events
+from track.intervals import PERIODS
+from track.models import DailyProjectTotal, Record
 from track.tests import factories
 
 
@@ -249,7 +263,7 @@ def test_list_records(client):
     assert resp.status_code == status.HTTP_200_OK, resp.content
 
     body = resp.json()
-    assert body["count"] == len(records)
+    assert len(body["results"]) == len(records)
     assert body["next"] is None
     assert body["previous"] is None
     for record, got in zip(
@@ -274,6 +288,155 @@ def test_list_records(client):
         )
 
 
+@pytest.mark.django_db
+def test_list_records_filters(client):
+
+    project1 = factories.ProjectFactory()
+    project2 = factories.ProjectFactory()
+    category = factories.CategoryFactory()
+    category.projects.add(project2)
+    start_time = pendulum.datetime(2019, 7, 9, 9)
+
+    for offset in range(6):
+        begin = start_time.add(days=offset)
+        stop = begin.add(minutes=30 * (offset + 1))
+        factories.RecordFactory(
+            project=project1 if offset % 2 else project2,
+            start_time_epoch=begin.int_timestamp,
+            stop_time_epoch=stop.int_timestamp,
+        )
+    factories.RecordFactory(
+        project=project1,
+        start_time_epoch=start_time.add(days=6).int_timestamp,
+        stop_time_epoch=None,
+    )
+
+    def records(**params):
+        resp = client.get(reverse("api:record-list"), params)
+        assert resp.status_code == status.HTTP_200_OK, resp.content
+        return [
+            (got["project"], pendulum.parse(got["start_time"]).day)
+            for got in resp.json()["results"]
+        ]
+
+    assert records(
+        start_after=start_time.add(days=1).isoformat(),
+        start_before=start_time.add(days=3).isoformat(),
+    ) == [(project2.name, 11), (project1.name, 10)]
+    assert records(project=project1.name) == [
+        (project1.name, 15),
+        (project1.name, 14),
+        (project1.name, 12),
+        (project1.name, 10),
+    ]
+    assert records(category=category.name) == [
+        (project2.name, 13),
+        (project2.name, 11),
+        (project2.name, 9),
+    ]
+    assert records(open="true") == [(project1.name, 15)]
+    assert records(
+        min_elapsed=2 * 3600, start_before=start_time.add(days=6).isoformat()
+    ) == [(project1.name, 14), (project2.name, 13), (project1.name, 12)]
+    assert records(project=project2.name, open="false", min_elapsed=3600) == [
+        (project2.name, 13),
+        (project2.name, 11),
+    ]
+
+
+@pytest.mark.django_db
+def test_list_records_invalid_filter(client):
+
+    resp = client.get(reverse("api:record-list"), {"min_elapsed": -1})
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+    assert "min_elapsed" in resp.json()
+
+
+@pytest.mark.django_db
+def test_list_records_cursor_pagination(client):
+
+    project = factories.ProjectFactory()
+    start_time_epoch = pendulum.datetime(2019, 7, 12).int_timestamp
+
+    # Several records share a start time, so the ids have to break ties
+    for offset in range(120):
+        factories.RecordFactory(
+            project=project,
+            start_time_epoch=start_time_epoch + (offset // 3) * 60,
+            stop_time_epoch=start_time_epoch + (offset // 3) * 60 + 30,
+        )
+    expected = list(
+        Record.objects.order_by("-start_time_epoch", "-id").values_list(
+            "start_time_epoch", flat=True
+        )
+    )
+
+    pages = []
+    url = reverse("api:record-list")
+    while url is not None:
+        resp = client.get(url)
+        assert resp.status_code == status.HTTP_200_OK, resp.content
+        body = resp.json()
+        assert "count" not in body
+        pages.append(body)
+        url = body["next"]
+
+    assert [len(page["results"]) for page in pages] == [50, 50, 20]
+    assert pages[0]["previous"] is None
+
+    starts = [
+        pendulum.parse(r["start_time"]).int_timestamp
+        for page in pages
+        for r in page["results"]
+    ]
+    assert starts == expected
+
+    resp = client.get(pages[2]["previous"])
+    assert resp.json()["results"] == pages[1]["results"]
+    resp = client.get(resp.json()["previous"])
+    assert resp.json()["results"] == pages[0]["results"]
+    assert resp.json()["previous"] is None
+
+
+@pytest.mark.django_db
+def test_list_records_cursor_does_not_count_or_offset(client):
+
+    records = factories.RecordFactory.create_batch(60)
+    url = reverse("api:record-list")
+
+    resp = client.get(url)
+    next_url = resp.json()["next"]
+
+    with CaptureQueriesContext(connection) as context:
+        resp = client.get(next_url)
+
+    assert len(resp.json()["results"]) == len(records) - 50
+    for query in context.captured_queries:
+        assert "COUNT(" not in query["sql"]
+        assert "OFFSET" not in query["sql"]
+
+
+@pytest.mark.django_db
+def test_list_records_invalid_cursor(client):
+
+    resp = client.get(reverse("api:record-list"), {"cursor": "foobar"})
+    assert resp.status_code == status.HTTP_404_NOT_FOUND, resp.content
+
+
+@pytest.mark.django_db
+def test_list_records_page_number(client):
+    factories.RecordFactory.create_batch(60)
+
+    resp = client.get(reverse("api:record-list"), {"page": 2})
+    assert resp.status_code == status.HTTP_200_OK, resp.content
+
+    body = resp.json()
+    assert body["count"] == 60
+    assert body["next"] is None
+    assert body["previous"] is not None
+    assert len(body["results"]) == 10
+
+
 @pytest.mark.django_db
 def test_get_active_record(client):
 
@@ -306,6 +469,65 @@ def test_get_active_record_missing(client):
     assert resp.status_code == status.HTTP_404_NOT_FOUND, resp.content
 
 
+def _events(content):
+    """Parse the server-sent events streamed by a response."""
+
+    result = []
+    for chunk in b"".join(content).decode().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in chunk.splitlines() if line
+        )
+        if "event" in fields:
+            result.append((fields["event"], json.loads(fields["data"])))
+    return result
+
+
+@pytest.mark.django_db
+def test_stream_active_record(client, settings):
+
+    settings.TRACK_EVENTS_HEARTBEAT_SECONDS = 0.05
+    settings.TRACK_EVENTS_STREAM_SECONDS = 0.5
+
+    record = factories.RecordFactory(stop_time_epoch=None)
+
+    resp = client.get(reverse("api:record-active-stream"))
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp["Content-Type"] == "text/event-stream"
+
+    # Stopped while the stream is open
+    threading.Timer(0.2, events.publish, args=(None,)).start()
+    received = _events(resp.streaming_content)
+
+    assert received[0] == (
+        "active",
+        {
+            "id": record.id,
+            "project": record.project.name,
+            "start_time": format_timestamp(record.start_time_epoch),
+        },
+    )
+    assert ("active", None) in received
+    assert {name for name, _ in received} == {"active", "heartbeat"}
+
+
+@pytest.mark.django_db
+def test_stream_active_record_does_not_poll(client, settings):
+
+    settings.TRACK_EVENTS_HEARTBEAT_SECONDS = 0.01
+    settings.TRACK_EVENTS_STREAM_SECONDS = 0.1
+
+    factories.RecordFactory(stop_time_epoch=None)
+    client.get(reverse("api:record-active"))
+
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get(reverse("api:record-active-stream"))
+        received = _events(resp.streaming_content)
+
+    assert len(queries) == 0
+    assert received[0][0] == "active"
+    assert received[-1][0] == "heartbeat"
+
+
 @pytest.mark.django_db
 def test_weekly_report(client, subtests):
 
@@ -478,3 +700,348 @@ def test_weekly_report(client, subtests):
         ]
 
         assert body["days"] == expected
+
+
+@pytest.mark.django_db
+def test_delete_record(client):
+    record = factories.RecordFactory()
+    url = reverse("api:record-detail", kwargs={"pk": record.pk})
+
+    resp = client.delete(url)
+    assert resp.status_code == status.HTTP_204_NO_CONTENT, resp.content
+    assert not DailyProjectTotal.objects.exists()
+
+
+@pytest.mark.django_db
+def test_period_report(client):
+
+    project = factories.ProjectFactory()
+    now = pendulum.datetime(2019, 7, 12, 16, 0, 0)
+
+    factories.RecordFactory(
+        project=project,
+        start_time_epoch=now.at(9).timestamp(),
+        stop_time_epoch=now.at(13).timestamp(),
+    )
+    factories.RecordFactory(
+        project=project,
+        start_time_epoch=now.add(months=1).at(9).timestamp(),
+        stop_time_epoch=now.add(months=1).at(10).timestamp(),
+    )
+
+    url = reverse("api:report-period")
+    resp = client.get(url, {"begin": "2019-01-01", "end": "2020-01-01"})
+    assert resp.status_code == status.HTTP_200_OK, resp.content
+
+    body = resp.json()
+    assert body["period"] == "month"
+    assert body["projects"] == [project.name]
+    assert len(body["periods"]) == 12
+    assert body["periods"][6] == {
+        "date": "2019-07-01",
+        "records": {project.name: 4 * 60 * 60},
+        "total": 4 * 60 * 60,
+    }
+    assert body["periods"][7]["total"] == 60 * 60
+
+
+@pytest.mark.django_db
+def test_period_report_invalid_range(client):
+
+    url = reverse("api:report-period")
+    resp = client.get(url, {"begin": "2020-01-01", "end": "2019-01-01"})
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST, resp.content
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+@pytest.mark.parametrize("period", PERIODS)
+@pytest.mark.django_db
+def test_period_report_end_of_time(client, settings, backend, period):
+
+    settings.TRACK_REPORT_BACKEND = backend
+    url = reverse("api:report-period")
+    resp = client.get(
+        url, {"begin": "9999-11-01", "end": "9999-12-31", "period": period}
+    )
+    assert resp.status_code == status.HTTP_200_OK, resp.content
+    assert resp.json()["periods"][-1]["total"] == 0
+
+
+@pytest.mark.django_db
+def test_create_second_running_record(client):
+
+    project = factories.ProjectFactory()
+    factories.RecordFactory(project=project, stop_time_epoch=None)
+
+    url = reverse("api:record-list")
+    body = {"project": project.name, "start_time": pendulum.now().isoformat()}
+
+    resp = client.post(url, data=body)
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST, resp.content
+
+
+@pytest.mark.django_db
+def test_bulk_create_records(client):
+
+    project = factories.ProjectFactory()
+    now = pendulum.datetime(2019, 7, 12, 16)
+
+    body = [
+        {
+            "project": project.name,
+            "start_time": now.subtract(hours=offset + 1).isoformat(),
+            "stop_time": now.subtract(hours=offset).isoformat(),
+        }
+        for offset in range(10)
+    ]
+    body[3]["project"] = "does-not-exist"
+    body[5]["start_time"] = "not-a-date"
+    body[7]["stop_time"] = now.subtract(days=1).isoformat()
+
+    resp = client.post(reverse("api:record-bulk"), data=body, format="json")
+    assert resp.status_code == status.HTTP_201_CREATED, resp.content
+
+    got = resp.json()
+    assert got["created"] == 7
+    assert sorted(got["errors"].keys()) == ["3", "5", "7"]
+    assert "start_time" in got["errors"]["5"]
+    assert got["errors"]["3"] == {
+        "non_field_errors": ["Project does-not-exist does not exist"]
+    }
+
+    assert Record.objects.count() == 7
+    assert DailyProjectTotal.objects.get(project=project).seconds == 7 * 3600
+
+
+@pytest.mark.django_db
+def test_bulk_create_records_field_errors(client):
+
+    project = factories.ProjectFactory()
+    body = [
+        {"project": project.name, "start_time": "2019-07-12T10:00:00"},
+        {
+            "project": project.name,
+            "start_time": "2019-07-11T10:00:00Z",
+            "stop_time": None,
+        },
+        {"start_time": "2019-07-12T10:00:00"},
+        {"project": "not a slug", "start_time": "2019-07-12T10:00:00"},
+        {"project": project.name, "start_time": None},
+        {"project": project.name, "start_time": 1562925600},
+        {
+            "project": project.name,
+            "start_time": "2019-07-12T09:00:00",
+            "stop_time": "2019-07-12T25:00:00",
+        },
+        "not-a-record",
+    ]
+
+    resp = client.post(reverse("api:record-bulk"), data=body, format="json")
+    assert resp.status_code == status.HTTP_201_CREATED, resp.content
+
+    got = resp.json()
+    assert got["created"] == 1
+    assert got["errors"]["1"] == {
+        "non_field_errors": ["Another record is already running"]
+    }
+    assert got["errors"]["2"] == {"project": ["This field is required."]}
+    assert list(got["errors"]["3"]) == ["project"]
+    assert got["errors"]["4"] == {
+        "start_time": ["This field may not be null."]
+    }
+    assert list(got["errors"]["5"]) == ["start_time"]
+    assert list(got["errors"]["6"]) == ["stop_time"]
+    assert list(got["errors"]["7"]) == ["non_field_errors"]
+
+    # Times without an offset are in the current time zone, like DRF reads
+    record = Record.objects.get()
+    assert (
+        record.start_time_epoch
+        == pendulum.datetime(2019, 7, 12, 10).int_timestamp
+    )
+    assert record.stop_time_epoch is None
+
+
+@pytest.mark.django_db
+def test_bulk_create_records_all_invalid(client):
+
+    resp = client.post(
+        reverse("api:record-bulk"),
+        data=[{"project": "does-not-exist", "start_time": "2019-07-12"}],
+        format="json",
+    )
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST, resp.content
+    assert resp.json()["created"] == 0
+
+    resp = client.post(
+        reverse("api:record-bulk"), data={"foo": "bar"}, format="json"
+    )
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST, resp.content
+
+
+@pytest.mark.django_db
+def test_export_records_ndjson(client):
+
+    project = factories.ProjectFactory()
+    start_time = pendulum.now().subtract(days=1)
+    for offset in range(5):
+        factories.RecordFactory(
+            project=project,
+            start_time_epoch=start_time.add(hours=offset).int_timestamp,
+            stop_time_epoch=start_time.add(hours=offset + 1).int_timestamp,
+        )
+    factories.RecordFactory(
+        project=project,
+        start_time_epoch=start_time.add(hours=6).int_timestamp,
+        stop_time_epoch=None,
+    )
+
+    resp = client.get(reverse("api:record-export"))
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.streaming
+    assert resp["Content-Type"] == "application/x-ndjson"
+
+    lines = b"".join(resp.streaming_content).decode().splitlines()
+    got = [json.loads(line) for line in lines]
+    assert [row.pop("id") for row in got] == list(
+        Record.objects.order_by("start_time_epoch").values_list(
+            "id", flat=True
+        )
+    )
+
+    # Rows are rendered exactly like the records list renders them
+    listed = client.get(reverse("api:record-list")).json()["results"]
+    assert got[:-1] == listed[:0:-1]
+    assert got[-1]["start_time"] == listed[0]["start_time"]
+    assert got[-1]["stop_time"] is None
+    assert got[-1]["elapsed"] >= 18 * 60 * 60
+
+
+@pytest.mark.django_db
+def test_export_records_csv(client):
+
+    project = factories.ProjectFactory()
+    factories.RecordFactory.create_batch(3, project=project)
+
+    resp = client.get(reverse("api:record-export"), {"output": "csv"})
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp["Content-Type"] == "text/csv"
+
+    rows = list(
+        csv.DictReader(
+            io.StringIO(b"".join(resp.streaming_content).decode())
+        )
+    )
+    assert len(rows) == 3
+    assert {row["project"] for row in rows} == {project.name}
+    assert [int(row["id"]) for row in rows] == list(
+        Record.objects.order_by("start_time_epoch").values_list(
+            "id", flat=True
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_export_records_filters(client):
+
+    project1 = factories.ProjectFactory()
+    project2 = factories.ProjectFactory()
+    category = factories.CategoryFactory()
+    category.projects.add(project2)
+    start_time = pendulum.datetime(2019, 7, 12, 9)
+
+    for offset in range(6):
+        begin = start_time.add(hours=offset)
+        factories.RecordFactory(
+            project=project1 if offset % 2 else project2,
+            start_time_epoch=begin.int_timestamp,
+            stop_time_epoch=begin.add(minutes=30).int_timestamp,
+        )
+
+    def export(**params):
+        resp = client.get(reverse("api:record-export"), params)
+        assert resp.status_code == status.HTTP_200_OK
+        return [
+            (row["project"], pendulum.parse(row["start_time"]).hour)
+            for row in map(
+                json.loads,
+                b"".join(resp.streaming_content).decode().splitlines(),
+            )
+        ]
+
+    assert export(project=project1.name) == [
+        (project1.name, 10),
+        (project1.name, 12),
+        (project1.name, 14),
+    ]
+    assert export(category=category.name) == [
+        (project2.name, 9),
+        (project2.name, 11),
+        (project2.name, 13),
+    ]
+    assert export(
+        begin=start_time.add(hours=2).isoformat(),
+        end=start_time.add(hours=4).isoformat(),
+    ) == [(project2.name, 11), (project1.name, 12)]
+
+
+@pytest.mark.django_db
+def test_export_records_is_lazy(client):
+
+    factories.RecordFactory.create_batch(3)
+
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get(reverse("api:record-export"))
+    assert len(queries) == 0
+
+    with CaptureQueriesContext(connection) as queries:
+        assert len(b"".join(resp.streaming_content).splitlines()) == 3
+    # The records and the archived records
+    assert len(queries) == 2
+
+
+@pytest.mark.django_db
+def test_export_records_invalid_output(client):
+
+    resp = client.get(reverse("api:record-export"), {"output": "xml"})
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_list_records_matches_record_serializer(client, monkeypatch):
+
+    project = factories.ProjectFactory()
+    factories.RecordFactory.create_batch(20, project=project)
+    factories.RecordFactory(
+        project=project,
+        start_time_epoch=pendulum.now().subtract(hours=1).int_timestamp,
+        stop_time_epoch=None,
+    )
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+
+    serializer = RecordViewSet.RecordSerializer(
+        Record.objects.order_by("-start_time_epoch", "-id"), many=True
+    )
+    expected = json.loads(json.dumps(serializer.data))
+
+    resp = client.get(reverse("api:record-list"))
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.json()["results"] == expected
+
+    resp = client.get(reverse("api:record-list"), {"page": 1})
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.json()["results"] == expected
+
+
+@pytest.mark.parametrize("zone", ["UTC", "Europe/Oslo", "America/New_York"])
+def test_format_timestamp_matches_datetime_field(zone, settings):
+
+    settings.TIME_ZONE = zone
+    field = serializers.DateTimeField()
+
+    # Covers the switch to daylight saving time in both zones
+    for epoch in range(1552204800, 1552204800 + 40 * 86400, 3917):
+        assert format_timestamp(epoch) == field.to_representation(
+            datetime.fromtimestamp(epoch)
+        )
@@ -6,7 +6,10 @@ from .views import (
     ProjectViewSet,
     RecordViewSet,
     ActiveRecordView,
+    ActiveRecordStreamView,
+    RecordExportView,
     ReportCategoryWeekView,
+    ReportPeriodView,
     ReportWeekView,
 )
 
@@ -19,6 +22,15 @@ router.register(r"records", RecordViewSet)
 
 urlpatterns = [
     path("records/active/", ActiveRecordView.as_view(), name="record-active"),
+    path(
+        "records/active/stream/",
+        ActiveRecordStreamView.as_view(),
+        name="record-active-stream",
+    ),
+    path(
+        "records/export/", RecordExportView.as_view(), name="record-export"
+    ),
+    path("reports/", ReportPeriodView.as_view(), name="report-period"),
     path(
         "reports/week/<int:year>/<int:week_number>/",
         ReportWeekView.as_view(),
@@ -1,23 +1,51 @@
+from datetime import datetime
 import logging
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework.generics import GenericAPIView
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework import serializers, status, viewsets
+from rest_framework.decorators import action
 
+from track import events
 from track.models import Category, Project, Record
 
-from track.selectors import get_active_record, get_entries_per_week
+from track.intervals import PERIODS
+from track.selectors import (
+    get_active_record,
+    get_entries_per_period,
+    get_entries_per_week,
+    get_records,
+    iter_records,
+)
 
 from track.services import (
     add_project_to_category,
+    bulk_create_records,
     create_category,
     create_project,
     create_record,
+    delete_category,
+    delete_project,
+    delete_record,
+    update_category,
+    update_project,
     update_record,
 )
 
+from .export import ENCODERS, format_timestamp
+from .pagination import RecordCursorPagination
+from .sse import EventStreamRenderer, EventStreamResponse
+
 
 log = logging.getLogger(__name__)
 
@@ -38,10 +66,24 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
             return create_category(**validated_data)
 
-    queryset = Category.objects.all().order_by("created")
+        def update(self, instance, validated_data):
+            return update_category(
+                category=instance,
+                name=validated_data.get("name", instance.name),
+                description=validated_data.get(
+                    "description", instance.description
+                ),
+            )
+
+    queryset = (
+        Category.objects.all().prefetch_related("projects").order_by("created")
+    )
     serializer_class = CategorySerializer
     lookup_field = "name"
 
+    def perform_destroy(self, instance):
+        delete_category(category=instance)
+
 
 class ProjectViewSet(viewsets.ModelViewSet):
     class ProjectSerializer(serializers.ModelSerializer):
@@ -63,10 +105,115 @@ class ProjectViewSet(viewsets.ModelViewSet):
 
             return project
 
-    queryset = Project.objects.all().order_by("created")
+        def update(self, instance, validated_data):
+            return update_project(
+                project=instance,
+                name=validated_data.get("name", instance.name),
+                description=validated_data.get(
+                    "description", instance.description
+                ),
+                categories=validated_data.get("categories"),
+            )
+
+    queryset = (
+        Project.objects.all()
+        .prefetch_related("categories")
+        .order_by("created")
+    )
     serializer_class = ProjectSerializer
     lookup_field = "name"
 
+    def perform_destroy(self, instance):
+        delete_project(project=instance)
+
+
+def _render_record(row: Dict[str, Any], now: int) -> Dict[str, Any]:
+    """Render a record row like `RecordViewSet.RecordSerializer` does."""
+
+    start, stop = row["start_time_epoch"], row["stop_time_epoch"]
+    return {
+        "project": row["project__name"],
+        "start_time": format_timestamp(start),
+        "stop_time": None if stop is None else format_timestamp(stop),
+        "elapsed": (now if stop is None else stop) - start,
+    }
+
+
+_SLUG = re.compile(r"^[-a-zA-Z0-9_]+$")
+
+_REQUIRED = str(serializers.Field.default_error_messages["required"])
+_NULL = str(serializers.Field.default_error_messages["null"])
+_INVALID_SLUG = str(serializers.SlugField.default_error_messages["invalid"])
+_INVALID_DATETIME = str(
+    serializers.DateTimeField.default_error_messages["invalid"]
+).format(format="YYYY-MM-DDThh:mm[:ss[.uuuuuu]][+HH:MM|-HH:MM|Z]")
+
+
+def _parse_datetime(value: Any) -> Optional[datetime]:
+    """Parse an ISO 8601 string like `serializers.DateTimeField` does."""
+
+    if not isinstance(value, str):
+        return None
+
+    value = value.strip()
+    parsed = None
+
+    # What `isoformat` writes, most of the input, parses much faster in C
+    if value[10:11] in ("T", " "):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            pass
+
+    if parsed is None:
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            return None
+
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _validate_bulk_item(
+    item: Any
+) -> Tuple[Dict[str, Any], Dict[str, List[str]]]:
+    """Validate an entry of a bulk create, returns its data and errors.
+
+    A serializer per entry takes most of the time of a large request, so
+    the fields are checked directly, with the messages DRF would give.
+    """
+
+    if not isinstance(item, dict):
+        message = serializers.Serializer.default_error_messages["invalid"]
+        datatype = type(item).__name__
+        return {}, {"non_field_errors": [message.format(datatype=datatype)]}
+
+    data: Dict[str, Any] = {}
+    errors: Dict[str, List[str]] = {}
+
+    project = item.get("project")
+    if project is None:
+        errors["project"] = [_REQUIRED if "project" not in item else _NULL]
+    elif not isinstance(project, str) or not _SLUG.match(project.strip()):
+        errors["project"] = [_INVALID_SLUG]
+    else:
+        data["project"] = project.strip()
+
+    for field, required in (("start_time", True), ("stop_time", False)):
+        value = item.get(field)
+        if value is None:
+            if required:
+                errors[field] = [_REQUIRED if field not in item else _NULL]
+            continue
+
+        data[field] = _parse_datetime(value)
+        if data[field] is None:
+            errors[field] = [_INVALID_DATETIME]
+
+    return data, errors
+
 
 class RecordViewSet(viewsets.ModelViewSet):
     class RecordSerializer(serializers.ModelSerializer):
@@ -85,22 +232,118 @@ class RecordViewSet(viewsets.ModelViewSet):
             if "stop_time" not in validated_data:
                 validated_data["stop_time"] = None
 
-            record = create_record(**validated_data)
+            try:
+                record = create_record(**validated_data)
+            except DjangoValidationError as e:
+                raise serializers.ValidationError(e.messages)
             return record
 
         @transaction.atomic
         def update(self, instance, validated_data):
 
-            record = update_record(
-                record=instance,
-                project=validated_data["project"],
-                start_time=validated_data["start_time"],
-                stop_time=validated_data.get("stop_time"),
-            )
+            try:
+                record = update_record(
+                    record=instance,
+                    project=validated_data["project"],
+                    start_time=validated_data["start_time"],
+                    stop_time=validated_data.get("stop_time"),
+                )
+            except DjangoValidationError as e:
+                raise serializers.ValidationError(e.messages)
             return record
 
-    queryset = Record.objects.all().order_by("-start_time_epoch")
+    queryset = (
+        Record.objects.all()
+        .select_related("project")
+        .order_by("-start_time_epoch")
+    )
     serializer_class = RecordSerializer
+    pagination_class = RecordCursorPagination
+
+    class FilterSerializer(serializers.Serializer):
+        start_after = serializers.DateTimeField(required=False)
+        start_before = serializers.DateTimeField(required=False)
+        project = serializers.SlugField(required=False)
+        category = serializers.SlugField(required=False)
+        open = serializers.NullBooleanField(required=False, source="running")
+        min_elapsed = serializers.IntegerField(required=False, min_value=0)
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        # Reading rows rather than model instances, the records of a page
+        # render several times faster with the same output.
+        queryset = self.filter_queryset(
+            get_records(**serializer.validated_data)
+        ).values("id", "project__name", "start_time_epoch", "stop_time_epoch")
+        now = int(time.time())
+
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response([_render_record(row, now) for row in queryset])
+
+        return self.get_paginated_response(
+            [_render_record(row, now) for row in page]
+        )
+
+    def perform_destroy(self, instance):
+        delete_record(record=instance)
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request: Request) -> Response:
+        if not isinstance(request.data, list):
+            raise serializers.ValidationError("Expected a list of records")
+
+        valid, indices = [], []
+        errors: Dict[int, Dict[str, Any]] = {}
+
+        for index, item in enumerate(request.data):
+            data, messages = _validate_bulk_item(item)
+            if messages:
+                errors[index] = messages
+            else:
+                valid.append(data)
+                indices.append(index)
+
+        created, rejected = bulk_create_records(records=valid)
+        for index, messages in rejected.items():
+            errors[indices[index]] = {"non_field_errors": messages}
+
+        content = {"created": created, "errors": dict(sorted(errors.items()))}
+
+        if not created:
+            return Response(content, status=status.HTTP_400_BAD_REQUEST)
+        return Response(content, status=status.HTTP_201_CREATED)
+
+
+class RecordExportView(GenericAPIView):
+    class InputSerializer(serializers.Serializer):
+        output = serializers.ChoiceField(
+            choices=sorted(ENCODERS), default="ndjson"
+        )
+        project = serializers.SlugField(required=False)
+        category = serializers.SlugField(required=False)
+        begin = serializers.DateTimeField(required=False)
+        end = serializers.DateTimeField(required=False)
+
+    def get(self, request: Request) -> StreamingHttpResponse:
+        serializer = self.InputSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        params = dict(serializer.validated_data)
+        encode, content_type = ENCODERS[params.pop("output")]
+        log.info("Export records for %s", params)
+
+        # Nothing is read from the database until the first chunk is sent
+        response = StreamingHttpResponse(
+            encode(iter_records(**params)), content_type=content_type
+        )
+        extension = serializer.validated_data["output"]
+        response["Content-Disposition"] = (
+            f'attachment; filename="records.{extension}"'
+        )
+        return response
 
 
 class ActiveRecordView(GenericAPIView):
@@ -157,6 +400,34 @@ class ActiveRecordView(GenericAPIView):
         )
 
 
+class ActiveRecordStreamView(GenericAPIView):
+    """Stream the changes of the active record as server-sent events."""
+
+    renderer_classes = [EventStreamRenderer]
+
+    def get(self, request: Request) -> EventStreamResponse:
+        events.watch()
+
+        # Taken before reading the record, so a change in between is sent
+        sequence, _ = events.notifier.current()
+        active = get_active_record()
+
+        event = None
+        if active is not None:
+            event = {
+                "id": active.id,
+                "project": active.project.name,
+                "start_time_epoch": active.start_time_epoch,
+            }
+
+        return EventStreamResponse(
+            sequence,
+            event,
+            heartbeat=settings.TRACK_EVENTS_HEARTBEAT_SECONDS,
+            duration=settings.TRACK_EVENTS_STREAM_SECONDS,
+        )
+
+
 class ReportWeekView(GenericAPIView):
     class OutputSerializer(serializers.Serializer):
         class DaySerializer(serializers.Serializer):
@@ -205,3 +476,41 @@ class ReportCategoryWeekView(GenericAPIView):
         content = self.OutputSerializer(data).data
 
         return Response(content, status=status.HTTP_200_OK)
+
+
+class ReportPeriodView(GenericAPIView):
+    class InputSerializer(serializers.Serializer):
+        begin = serializers.DateField()
+        end = serializers.DateField()
+        period = serializers.ChoiceField(choices=PERIODS, default="month")
+        category = serializers.SlugField(required=False)
+
+        def validate(self, data):
+            if data["end"] <= data["begin"]:
+                raise serializers.ValidationError("end must be after begin")
+            return data
+
+    class OutputSerializer(serializers.Serializer):
+        class PeriodSerializer(serializers.Serializer):
+            date = serializers.DateField(read_only=True)
+            records = serializers.DictField(
+                child=serializers.IntegerField(read_only=True), read_only=True
+            )
+            total = serializers.IntegerField(read_only=True)
+
+        begin = serializers.DateField(read_only=True)
+        end = serializers.DateField(read_only=True)
+        period = serializers.CharField(read_only=True)
+        category = serializers.CharField(read_only=True)
+        projects = serializers.ListField(read_only=True)
+        periods = PeriodSerializer(many=True, read_only=True)
+
+    def get(self, request: Request) -> Response:
+        serializer = self.InputSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        log.info("Get report for %s", serializer.validated_data)
+
+        data = get_entries_per_period(**serializer.validated_data)
+        content = self.OutputSerializer(data).data
+
+        return Response(content, status=status.HTTP_200_OK)
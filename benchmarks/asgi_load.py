@@ -0,0 +1,235 @@
+"""Measure mixed traffic served over WSGI and over ASGI.
+
+Run from the repository root with
+
+    python benchmarks/asgi_load.py --records 100000 --duration 20
+
+A file backed database is loaded with a synthetic dataset, then the
+server is started in a subprocess, once for every server:
+
+- `wsgi` is Django's threaded development server, one thread per
+  connection,
+- `asgi` is uvicorn running `track.asgi:application`, with its pool of
+  `TRACK_ASGI_THREADS` threads.
+
+While `--subscribers` clients hold the event stream of the active record
+open, `--pollers` clients poll the active record and `--reporters`
+clients request weekly reports over random ranges of a year, which miss
+the report cache. Requests per second and latencies are printed for both
+kinds of requests.
+"""
+
+import argparse
+from datetime import date, timedelta
+import http.client
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "track.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, connections  # noqa: E402
+
+from track import datasets  # noqa: E402
+
+SERVERS = {
+    "wsgi": [
+        sys.executable,
+        "manage.py",
+        "runserver",
+        "--noreload",
+        "127.0.0.1:{port}",
+    ],
+    "asgi": [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "track.asgi:application",
+        "--port",
+        "{port}",
+        "--log-level",
+        "warning",
+    ],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not listen on port {port}")
+
+
+def get(port: int, path: str) -> None:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"GET {path}: {response.status}")
+    finally:
+        connection.close()
+
+
+def poller(port: int, stop: threading.Event, latencies: List[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        get(port, "/api/records/active/")
+        latencies.append(time.perf_counter() - started)
+
+
+def reporter(
+    port: int, stop: threading.Event, latencies: List[float], seed: int
+) -> None:
+    rng = random.Random(seed)
+    today = date.today()
+
+    while not stop.is_set():
+        begin = today - timedelta(days=rng.randrange(365, 3 * 365))
+        end = begin + timedelta(days=365)
+        started = time.perf_counter()
+        get(port, f"/api/reports/?begin={begin}&end={end}&period=week")
+        latencies.append(time.perf_counter() - started)
+
+
+def subscribe(port: int) -> socket.socket:
+    """Open an event stream and wait for its first event."""
+
+    sock = socket.create_connection(("127.0.0.1", port), timeout=60)
+    sock.sendall(
+        b"GET /api/records/active/stream/ HTTP/1.1\r\n"
+        b"Host: localhost\r\nAccept: text/event-stream\r\n\r\n"
+    )
+    received = b""
+    while b"event: active" not in received:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise RuntimeError("event stream closed")
+        received += chunk
+    return sock
+
+
+def summary(name: str, latencies: List[float], duration: float) -> str:
+    if not latencies:
+        return f"{name:>10} {0:>9.1f} {'-':>9} {'-':>9}"
+
+    latencies = sorted(latencies)
+    return (
+        f"{name:>10} {len(latencies) / duration:>9.1f} "
+        f"{statistics.median(latencies) * 1000:>9.1f} "
+        f"{latencies[int(len(latencies) * 0.99)] * 1000:>9.1f}"
+    )
+
+
+def run(
+    server: str,
+    env: Dict[str, str],
+    *,
+    pollers: int,
+    reporters: int,
+    subscribers: int,
+    duration: float
+) -> None:
+    port = free_port()
+    command = [part.format(port=port) for part in SERVERS[server]]
+    process = subprocess.Popen(
+        command,
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(port)
+        streams = [subscribe(port) for _ in range(subscribers)]
+
+        stop = threading.Event()
+        polls: List[float] = []
+        reports: List[float] = []
+        threads = [
+            threading.Thread(target=poller, args=(port, stop, polls))
+            for _ in range(pollers)
+        ] + [
+            threading.Thread(target=reporter, args=(port, stop, reports, n))
+            for n in range(reporters)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        for sock in streams:
+            sock.close()
+    finally:
+        process.terminate()
+        process.wait()
+
+    print(f"{server}:")
+    print(summary("active", polls, duration))
+    print(summary("reports", reports, duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--pollers", type=int, default=8)
+    parser.add_argument("--reporters", type=int, default=4)
+    parser.add_argument("--subscribers", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "benchmark.sqlite3")
+        connection.settings_dict["TEST"]["NAME"] = database
+        connection.creation.create_test_db(verbosity=0)
+        datasets.generate_uniform(records=args.records)
+        connections.close_all()
+
+        # The servers share the dataset, and nothing else
+        env = dict(
+            os.environ,
+            DATABASE_NAME=database,
+            TRACK_RUN_DIR=directory,
+            DJANGO_LOG_LEVEL="ERROR",
+        )
+
+        print(f"{'':>10} {'req/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+        for server in SERVERS:
+            run(
+                server,
+                env,
+                pollers=args.pollers,
+                reporters=args.reporters,
+                subscribers=args.subscribers,
+                duration=args.duration,
+            )
+
+
+if __name__ == "__main__":
+    main()
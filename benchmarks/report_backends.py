@@ -0,0 +1,90 @@
+"""Compare the python and NumPy backends of `get_entries_per_period`.
+
+Run from the repository root with
+
+    python benchmarks/report_backends.py --sizes 1000 10000 100000
+
+Every size is loaded into a fresh in-memory test database, with records
+spread evenly over the requested number of years, and both backends build
+a per-week report over the whole range. The python backend reads the
+daily rollups, so its cost follows the number of days and projects, while
+the NumPy backend scans the records and its cost follows their number.
+"""
+
+import argparse
+from datetime import date, timedelta
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "track.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from track import datasets  # noqa: E402
+from track.selectors import get_entries_per_period  # noqa: E402
+
+
+def measure(backend, *, begin, end, repeat):
+    settings.TRACK_REPORT_BACKEND = backend
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        get_entries_per_period(begin=begin, end=end, period="week")
+        best = min(best, time.perf_counter() - started)
+
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 3000, 10000, 30000, 100000],
+    )
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    connection.creation.create_test_db(verbosity=0)
+
+    end = date.today() + timedelta(days=1)
+    begin = end - timedelta(days=args.years * 365 + 1)
+
+    print(f"{'records':>10} {'python (ms)':>12} {'numpy (ms)':>12}")
+
+    crossover = None
+    for size in args.sizes:
+        datasets.generate_uniform(
+            records=size,
+            years=args.years,
+            projects=args.projects,
+            seed=args.seed,
+        )
+        python = measure("python", begin=begin, end=end, repeat=args.repeat)
+        numpy = measure("numpy", begin=begin, end=end, repeat=args.repeat)
+
+        if crossover is None and numpy > python:
+            crossover = size
+
+        print(f"{size:>10} {python * 1000:>12.1f} {numpy * 1000:>12.1f}")
+
+    if crossover is None:
+        print("numpy was faster at every size")
+    else:
+        print(f"python was faster from {crossover} records on")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Measure how report readers hold up record writes on SQLite.
+
+Run from the repository root with
+
+    python benchmarks/sqlite_concurrency.py --records 100000 --readers 4
+
+A file backed database is loaded with a synthetic dataset. For every
+profile, reader threads then stream the record export and build long
+range reports in a loop, while a writer thread creates records and times
+every write. The `defaults` profile is SQLite's rollback journal as
+Django sets it up, `tuned` applies the `TRACK_SQLITE_PRAGMAS` of the
+settings, with its write-ahead log.
+"""
+
+import argparse
+from datetime import date, datetime, timedelta
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "track.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import OperationalError, connection, connections  # noqa: E402
+
+from track import datasets  # noqa: E402
+from track.models import Project  # noqa: E402
+from track.selectors import get_entries_per_period, iter_records  # noqa: E402
+from track.services import create_record  # noqa: E402
+
+PROFILES = {
+    "defaults": {"journal_mode": "DELETE", "synchronous": "FULL"},
+    "tuned": settings.TRACK_SQLITE_PRAGMAS,
+}
+
+
+def reader(stop: threading.Event, counts: list) -> None:
+    end = date.today() + timedelta(days=1)
+    begin = end - timedelta(days=3 * 365)
+
+    try:
+        while not stop.is_set():
+            for _ in iter_records():
+                pass
+            get_entries_per_period(begin=begin, end=end, period="week")
+            counts.append(1)
+    finally:
+        connection.close()
+
+
+def writer(stop: threading.Event, latencies: list, errors: list) -> None:
+    project = Project.objects.first()
+    start = datetime(2000, 1, 1)
+
+    try:
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                create_record(
+                    project=project,
+                    start_time=start,
+                    stop_time=start + timedelta(minutes=30),
+                )
+            except OperationalError as e:
+                errors.append(str(e))
+            latencies.append(time.perf_counter() - started)
+            start += timedelta(hours=1)
+    finally:
+        connection.close()
+
+
+def run(profile: str, *, readers: int, duration: float) -> None:
+    settings.TRACK_SQLITE_PRAGMAS = PROFILES[profile]
+    connections.close_all()
+
+    stop = threading.Event()
+    counts: list = []
+    latencies: list = []
+    errors: list = []
+
+    threads = [
+        threading.Thread(target=reader, args=(stop, counts))
+        for _ in range(readers)
+    ]
+    threads.append(
+        threading.Thread(target=writer, args=(stop, latencies, errors))
+    )
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    print(
+        f"{profile:>10} {len(latencies) / duration:>9.1f} "
+        f"{statistics.median(latencies) * 1000:>9.1f} "
+        f"{latencies[int(len(latencies) * 0.99)] * 1000:>9.1f} "
+        f"{latencies[-1] * 1000:>9.1f} {len(errors):>7} "
+        f"{len(counts) / duration:>10.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    # Slow reads are expected here, keep them out of the output
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(
+            directory, "benchmark.sqlite3"
+        )
+        connection.creation.create_test_db(verbosity=0)
+        datasets.generate_uniform(records=args.records)
+
+        print(
+            f"{'profile':>10} {'writes/s':>9} {'p50 (ms)':>9} "
+            f"{'p99 (ms)':>9} {'max (ms)':>9} {'errors':>7} "
+            f"{'reports/s':>10}"
+        )
+        for profile in PROFILES:
+            run(profile, readers=args.readers, duration=args.duration)
+
+        connections.close_all()
+
+
+if __name__ == "__main__":
+    main()
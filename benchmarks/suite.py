@@ -0,0 +1,319 @@
+"""Time the selectors and API endpoints on a synthetic dataset.
+
+Run from the repository root with
+
+    python benchmarks/suite.py --records 100000 --output results.json
+
+The dataset is loaded into a fresh in-memory test database, then every
+case runs `--repeat` times. Cases ending in `:cold` clear the cache before
+every run, the others are measured with a warm cache. The timings are
+printed and, with `--output`, written as JSON along with the dataset and
+the environment. Passing the JSON of an earlier run with `--compare`
+prints how every case changed.
+"""
+
+import argparse
+from base64 import urlsafe_b64encode
+from datetime import date, datetime, timedelta, timezone
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "track.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import cache  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from track import datasets  # noqa: E402
+from track.models import Category, Project, Record  # noqa: E402
+from track.selectors import (  # noqa: E402
+    get_elapsed_time,
+    get_entries_per_week,
+)
+from track.services import bulk_create_records  # noqa: E402
+
+Case = Tuple[str, Callable[[], object], bool]
+
+# Records created by every run of the bulk cases
+BULK_SIZE = 10_000
+
+
+def get(client: Client, url: str, **params) -> Callable[[], object]:
+    def run():
+        response = client.get(url, params)
+        assert response.status_code == 200, response.content
+        return response
+
+    return run
+
+
+def rolled_back(func: Callable[[], object]) -> Callable[[], object]:
+    """Run `func` in a transaction rolled back afterwards.
+
+    Cases that write leave the dataset as they found it, so every run and
+    every later case sees the same data.
+    """
+
+    def run():
+        with transaction.atomic():
+            result = func()
+            transaction.set_rollback(True)
+        return result
+
+    return run
+
+
+def post_json(client: Client, url: str, data: object) -> Callable[[], object]:
+    body = json.dumps(data)
+
+    def run():
+        response = client.post(url, body, content_type="application/json")
+        assert response.status_code == 201, response.content
+        return response
+
+    return run
+
+
+def cases() -> List[Case]:
+    """Return (name, function, cold) for every benchmark."""
+
+    client = Client()
+    project = Project.objects.order_by("id").first()
+    category = Category.objects.order_by("id").first()
+
+    latest = Record.objects.order_by("-start_time_epoch").first()
+    today = datetime.fromtimestamp(latest.start_time_epoch).date()
+    year, week, _ = today.isocalendar()
+    week_number = f"{year}-W{week:02}"
+    begin = date(today.year - 1, 1, 1)
+
+    # A cursor to a page half way through the history
+    start, pk = Record.objects.order_by(
+        "-start_time_epoch", "-id"
+    ).values_list("start_time_epoch", "id")[Record.objects.count() // 2]
+    cursor = urlsafe_b64encode(json.dumps([start, pk, False]).encode())
+
+    # Hour long records following the latest one, as an import would send
+    after = datetime.fromtimestamp(
+        latest.start_time_epoch, timezone.utc
+    ) + timedelta(days=1)
+    bulk = [
+        {
+            "project": project.name,
+            "start_time": (after + timedelta(hours=2 * n)).isoformat(),
+            "stop_time": (after + timedelta(hours=2 * n + 1)).isoformat(),
+        }
+        for n in range(BULK_SIZE)
+    ]
+    bulk_parsed = [
+        dict(
+            item,
+            start_time=datetime.fromisoformat(item["start_time"]),
+            stop_time=datetime.fromisoformat(item["stop_time"]),
+        )
+        for item in bulk
+    ]
+
+    result: List[Case] = []
+    for cold in (True, False):
+        suffix = ":cold" if cold else ""
+        result += [
+            (
+                f"selectors.get_entries_per_week{suffix}",
+                lambda: get_entries_per_week(week_number=week_number),
+                cold,
+            ),
+            (
+                f"selectors.get_entries_per_week.category{suffix}",
+                lambda: get_entries_per_week(
+                    week_number=week_number, category=category.name
+                ),
+                cold,
+            ),
+            (
+                f"api.report-week{suffix}",
+                get(
+                    client,
+                    reverse("api:report-week", args=(year, week)),
+                ),
+                cold,
+            ),
+            (
+                f"api.report-period.month{suffix}",
+                get(
+                    client,
+                    reverse("api:report-period"),
+                    begin=begin,
+                    end=today + timedelta(days=1),
+                    period="month",
+                ),
+                cold,
+            ),
+        ]
+
+    result += [
+        (
+            "selectors.get_elapsed_time",
+            lambda: get_elapsed_time(project=project),
+            False,
+        ),
+        (
+            "selectors.get_elapsed_time.week",
+            lambda: get_elapsed_time(
+                project=project,
+                begin=datetime.combine(today, datetime.min.time())
+                - timedelta(days=7),
+                end=datetime.combine(today, datetime.min.time()),
+            ),
+            False,
+        ),
+        ("api.record-list", get(client, reverse("api:record-list")), False),
+        (
+            "api.record-list.deep",
+            get(client, reverse("api:record-list"), cursor=cursor.decode()),
+            False,
+        ),
+        (
+            "api.record-list.page",
+            get(client, reverse("api:record-list"), page=10),
+            False,
+        ),
+        (
+            "api.record-active",
+            get(client, reverse("api:record-active")),
+            False,
+        ),
+        (
+            "services.bulk_create_records",
+            rolled_back(lambda: bulk_create_records(records=bulk_parsed)),
+            False,
+        ),
+        (
+            "api.record-bulk",
+            rolled_back(post_json(client, reverse("api:record-bulk"), bulk)),
+            False,
+        ),
+    ]
+    return result
+
+
+def measure(func: Callable[[], object], *, cold: bool, repeat: int) -> Dict:
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "runs": repeat,
+    }
+
+
+def environment() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+
+    return {
+        "commit": commit,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "machine": platform.machine(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--filter", default="", help="Only run cases containing this text."
+    )
+    parser.add_argument("--output", help="Write the results to this file.")
+    parser.add_argument("--compare", help="Results of an earlier run.")
+    args = parser.parse_args()
+
+    # Keep the request logging out of the timings and the output
+    logging.disable(logging.INFO)
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+    started = time.perf_counter()
+    params = datasets.generate_uniform(
+        records=args.records,
+        projects=args.projects,
+        categories=args.categories,
+        years=args.years,
+        seed=args.seed,
+    )
+    print(f"loaded dataset in {time.perf_counter() - started:.1f}s")
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    print(f"{'case':<46} {'median (ms)':>12} {'min (ms)':>10}")
+    for name, func, cold in cases():
+        if args.filter not in name:
+            continue
+
+        results[name] = measure(func, cold=cold, repeat=args.repeat)
+
+        line = (
+            f"{name:<46} {results[name]['median'] * 1000:>12.2f} "
+            f"{results[name]['min'] * 1000:>10.2f}"
+        )
+        if name in baseline:
+            change = results[name]["median"] / baseline[name]["median"] - 1
+            line += f" {change:>+8.1%}"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "environment": environment(),
+                    "dataset": params,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+from django.core.cache import cache
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Start every test with an empty cache."""
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def events_path(tmp_path, settings):
+    """Keep the events written by a test to itself."""
+    settings.TRACK_EVENTS_PATH = str(tmp_path / "events.json")
+    return settings.TRACK_EVENTS_PATH
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class TrackConfig(AppConfig):
+    name = "track"
+
+    def ready(self):
+        from . import cache, slowlog, sqlite  # noqa: F401
+
+        slowlog.connect()
+        sqlite.connect()
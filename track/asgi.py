@@ -0,0 +1,23 @@
+"""
+ASGI config for track project.
+
+It exposes the ASGI callable as a module-level variable named
+``application``, serve it with
+
+    uvicorn track.asgi:application
+
+Django 2.2 has no ASGI support of its own, see track.handlers.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+from track.handlers import ASGIHandler
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "track.settings")
+
+application = ASGIHandler(
+    get_wsgi_application(), threads=settings.TRACK_ASGI_THREADS
+)
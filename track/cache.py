@@ -0,0 +1,166 @@
+"""Versioned caching of report data.
+
+Cached values are keyed on the generation of every scope they depend on,
+for example the week they cover or the category they are filtered on.
+Writes bump the generation of the scopes they affect, which invalidates
+every cached value depending on them without having to track the keys
+themselves. Stale entries are left to expire from the cache backend.
+
+The counters only invalidate the caches of other processes if they share
+the backend, see `check_shared_cache`.
+"""
+
+from datetime import date, datetime, timedelta
+import hashlib
+import time
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .routers import read_database
+
+T = TypeVar("T")
+
+# Scope every report depends on, bumped when projects or categories are
+# renamed or deleted, or when the daily totals are rebuilt.
+REPORTS = "reports"
+
+# Scope of the records which are still running.
+RUNNING = "running"
+
+# Backends keeping their entries in the memory of each process
+PROCESS_LOCAL_BACKENDS = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+def is_process_local() -> bool:
+    """Return whether the default cache is local to this process."""
+    return settings.CACHES["default"]["BACKEND"] in PROCESS_LOCAL_BACKENDS
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs) -> List[checks.CheckMessage]:
+    """Warn when the processes of a server cannot share generations."""
+
+    if not is_process_local():
+        return []
+
+    return [
+        checks.Warning(
+            "The default cache is local to every process, writes only "
+            "invalidate the reports cached by the process making them.",
+            hint="Use a shared backend such as memcached or filecache "
+            "when serving with more than one process.",
+            id="track.W001",
+        )
+    ]
+
+
+def week_scope(day: date) -> str:
+    """Return the scope of the week containing `day`."""
+    monday = day - timedelta(days=day.weekday())
+    return f"week:{monday.isoformat()}"
+
+
+def category_scope(name: str) -> str:
+    """Return the scope of the category called `name`."""
+    return f"category:{name}"
+
+
+def week_scopes(
+    start_time_epoch: int, stop_time_epoch: Optional[int]
+) -> List[str]:
+    """Return the scopes of every week a record overlaps.
+
+    Records which are still running only touch the week they started in,
+    their elapsed time is not cached.
+    """
+
+    first = datetime.fromtimestamp(start_time_epoch).date()
+    last = first
+    if stop_time_epoch is not None:
+        last = datetime.fromtimestamp(stop_time_epoch).date()
+
+    first -= timedelta(days=first.weekday())
+    return [
+        week_scope(first + timedelta(weeks=n))
+        for n in range((last - first).days // 7 + 1)
+    ]
+
+
+def _key(kind: str, value: str) -> str:
+    """Return the cache key of `value`, of any length and characters.
+
+    Memcached rejects keys longer than 250 characters or holding spaces
+    and control characters, which project and category names may bring
+    along, so `value` is hashed behind a short readable label.
+    """
+
+    label = value.split(":", 1)[0][:32]
+    digest = hashlib.sha1(value.encode()).hexdigest()
+    return f"track:{kind}:{label}:{digest}"
+
+
+def _generation_key(scope: str) -> str:
+    return _key("generation", scope)
+
+
+def get_generations(scopes: Iterable[str]) -> List[int]:
+    """Return the current generation of each scope."""
+
+    scopes = list(scopes)
+    keys = [_generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+
+    for key in keys:
+        if key not in generations:
+            # Seed missing counters from the clock, so a counter which was
+            # evicted never comes back at a value used before.
+            cache.add(key, time.time_ns(), timeout=None)
+            generations[key] = cache.get(key)
+
+    return [generations[key] for key in keys]
+
+
+def bump(*scopes: str) -> None:
+    """Invalidate every cached value depending on one of `scopes`."""
+
+    for scope in set(scopes):
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def get_or_compute(
+    name: str, scopes: Iterable[str], compute: Callable[[], T]
+) -> T:
+    """Return the cached value of `name`, computing it when missing.
+
+    The value is cached for `TRACK_REPORT_CACHE_TIMEOUT` seconds, or until
+    the generation of any of `scopes` is bumped. Values read from a replica
+    may miss the writes which bumped the generations, they are only cached
+    for `TRACK_REPLICA_LAG_SECONDS`.
+    """
+
+    scopes = sorted(scopes)
+    generations = get_generations(scopes)
+    key = _key(
+        "report",
+        "{}:{}".format(
+            name, ":".join(f"{s}={g}" for s, g in zip(scopes, generations))
+        ),
+    )
+
+    value = cache.get(key)
+    if value is None:
+        timeout = settings.TRACK_REPORT_CACHE_TIMEOUT
+        if read_database() != DEFAULT_DB_ALIAS:
+            timeout = min(timeout, settings.TRACK_REPLICA_LAG_SECONDS)
+        value = compute()
+        cache.set(key, value, timeout=timeout)
+
+    return value
@@ -0,0 +1,245 @@
+"""Synthetic datasets, for the `seed` command and the benchmarks.
+
+Everything is written with `bulk_create` in batches, so millions of records
+load in minutes rather than the hours `RecordFactory` would take, and the
+daily rollups are rebuilt once at the end.
+
+- `generate_sessions` follows a working week: sessions between morning
+  and evening with a lunch break, on weekdays mostly, a few projects
+  getting most of the time.
+- `generate_uniform` spreads records uniformly over the last years, which
+  makes a dataset of an exact size.
+"""
+
+from datetime import date, datetime, time, timedelta
+import random
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.db import transaction
+
+from .models import (
+    ArchivedRecord,
+    Category,
+    DailyProjectTotal,
+    Project,
+    Record,
+)
+from .services import BATCH_SIZE, rebuild_daily_totals
+
+# Records are handed to bulk_create this many at a time, which splits them
+# further into batches SQLite accepts.
+CHUNK_SIZE = 50_000
+
+# Odds of working on a given Saturday or Sunday
+WEEKEND_ODDS = 0.05
+
+
+def clear() -> None:
+    """Delete every record, project and category."""
+
+    DailyProjectTotal.objects.all().delete()
+    Record.objects.all().delete()
+    ArchivedRecord.objects.all().delete()
+    Project.objects.all().delete()
+    Category.objects.all().delete()
+
+
+def create_projects(
+    rng: random.Random, *, projects: int, categories: int, memberships: int
+) -> List[int]:
+    """Create numbered projects and categories, returns the project ids.
+
+    Every project belongs to one to `memberships` random categories.
+    """
+
+    Category.objects.bulk_create(
+        [Category(name=f"category-{n}") for n in range(categories)]
+    )
+    Project.objects.bulk_create(
+        [Project(name=f"project-{n}") for n in range(projects)]
+    )
+    category_ids = list(
+        Category.objects.order_by("id").values_list("id", flat=True)
+    )
+    project_ids = list(
+        Project.objects.order_by("id").values_list("id", flat=True)
+    )
+
+    if category_ids:
+        Membership = Project.categories.through
+        Membership.objects.bulk_create(
+            [
+                Membership(project_id=project_id, category_id=category_id)
+                for project_id in project_ids
+                for category_id in rng.sample(
+                    category_ids,
+                    min(len(category_ids), rng.randint(1, memberships)),
+                )
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+    return project_ids
+
+
+def _insert(records: List[Record]) -> int:
+    Record.objects.bulk_create(records, batch_size=BATCH_SIZE)
+    count = len(records)
+    records.clear()
+    return count
+
+
+def _hours(rng: random.Random, mean: float, deviation: float) -> timedelta:
+    return timedelta(hours=rng.gauss(mean, deviation))
+
+
+def _sessions(
+    rng: random.Random, day: date, *, session_minutes: int
+) -> Iterator[Tuple[int, int]]:
+    """Yield the (start, stop) epochs of the work sessions of a day."""
+
+    midnight = datetime.combine(day, time())
+    begin = midnight + _hours(rng, 8.5, 0.75)
+    end = midnight + _hours(rng, 17, 1)
+    lunch = midnight + _hours(rng, 12, 0.5)
+    lunch_end = lunch + timedelta(minutes=rng.randint(30, 60))
+
+    start = begin
+    while start < end:
+        minutes = rng.lognormvariate(0, 0.6) * session_minutes
+        stop = min(start + timedelta(minutes=max(minutes, 5)), end)
+
+        if start < lunch < stop:
+            stop = lunch
+        yield int(start.timestamp()), int(stop.timestamp())
+
+        # A short break between sessions, or the lunch break
+        start = stop + timedelta(minutes=rng.randint(0, 15))
+        if lunch <= start < lunch_end or stop == lunch:
+            start = max(start, lunch_end)
+
+
+@transaction.atomic
+def generate_sessions(
+    *,
+    days: int,
+    projects: int,
+    categories: int,
+    session_minutes: int,
+    seed: int = 0,
+    progress: Optional[Callable[[int, date], None]] = None
+) -> int:
+    """Add `days` days of work sessions up to today to the database.
+
+    Records never overlap and the latest one is left running. `progress`
+    is called with the number of records inserted so far and the day they
+    reach. Returns the number of records created.
+    """
+
+    rng = random.Random(seed)
+    project_ids = create_projects(
+        rng, projects=projects, categories=categories, memberships=3
+    )
+
+    # A few projects get most of the time, as they tend to in practice
+    weights = [rng.paretovariate(1.2) for _ in project_ids]
+
+    today = date.today()
+    created = 0
+    batch: List[Record] = []
+    for day in (today - timedelta(days=n) for n in range(days, 0, -1)):
+        if day.weekday() >= 5 and rng.random() > WEEKEND_ODDS:
+            continue
+
+        project_id = rng.choices(project_ids, weights)[0]
+        for start, stop in _sessions(
+            rng, day, session_minutes=session_minutes
+        ):
+            # Switch project now and again rather than every session
+            if rng.random() < 0.4:
+                project_id = rng.choices(project_ids, weights)[0]
+            batch.append(
+                Record(
+                    project_id=project_id,
+                    start_time_epoch=start,
+                    stop_time_epoch=stop,
+                )
+            )
+
+        if len(batch) >= CHUNK_SIZE:
+            created += _insert(batch)
+            if progress is not None:
+                progress(created, day)
+
+    # The record being worked on right now
+    now = int(datetime.now().timestamp())
+    batch.append(
+        Record(
+            project_id=rng.choices(project_ids, weights)[0],
+            start_time_epoch=now - rng.randint(5 * 60, 90 * 60),
+            stop_time_epoch=None,
+        )
+    )
+    created += _insert(batch)
+
+    rebuild_daily_totals()
+    return created
+
+
+@transaction.atomic
+def generate_uniform(
+    *,
+    records: int,
+    projects: int = 20,
+    categories: int = 5,
+    years: int = 3,
+    seed: int = 0
+) -> Dict[str, int]:
+    """Replace the data in the database with `records` random records.
+
+    Records are spread uniformly over the last `years` years and last
+    between five minutes and eight hours. Every project belongs to one or
+    two random categories and the most recent record is left running.
+    Returns the parameters of the dataset.
+    """
+
+    clear()
+    rng = random.Random(seed)
+    project_ids = create_projects(
+        rng, projects=projects, categories=categories, memberships=2
+    )
+
+    end = int(datetime.now().timestamp())
+    begin = end - years * 365 * 24 * 60 * 60
+
+    # Sorted starts make it easy to leave only the latest record running
+    starts = sorted(
+        rng.randint(begin, end - 8 * 60 * 60) for _ in range(records)
+    )
+
+    batch: List[Record] = []
+    for n, start in enumerate(starts, 1):
+        stop = None
+        if n < records:
+            stop = start + rng.randint(5 * 60, 8 * 60 * 60)
+
+        batch.append(
+            Record(
+                project_id=rng.choice(project_ids),
+                start_time_epoch=start,
+                stop_time_epoch=stop,
+            )
+        )
+        if len(batch) == CHUNK_SIZE:
+            _insert(batch)
+    _insert(batch)
+
+    rebuild_daily_totals()
+
+    return {
+        "records": records,
+        "projects": projects,
+        "categories": categories,
+        "years": years,
+        "seed": seed,
+    }
@@ -0,0 +1,194 @@
+"""Notifications of the changes of the active record.
+
+`publish` hands the new state of the active record to every subscriber of
+this process through `notifier`, which only keeps the latest state:
+subscribers waiting on it are woken up together and a slow one simply
+skips to the newest state. Threads wait for it with `Notifier.wait`,
+coroutines with `Notifier.wait_async`.
+
+Other processes learn about it through `TRACK_EVENTS_PATH`, a file the
+state is written to. A thread in every process with subscribers checks
+the file every `TRACK_EVENTS_POLL_SECONDS` and republishes what other
+processes wrote, which costs a `stat()` rather than a query.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+# The active record as `{"id", "project", "start_time_epoch"}`, or None
+# when no record is running.
+Event = Optional[Dict[str, Any]]
+
+# Inode, modification time and size of the events file
+Stat = Tuple[int, int, int]
+
+
+class Notifier:
+    """Hands the latest event to every waiting thread."""
+
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.event: Event = None
+        # Called on every event, for example to wake up the coroutines
+        # waiting from an event loop
+        self.callbacks: Set[Callable[[], None]] = set()
+
+    def publish(self, event: Event) -> None:
+        with self.condition:
+            self.sequence += 1
+            self.event = event
+            self.condition.notify_all()
+            for callback in self.callbacks:
+                callback()
+
+    def current(self) -> Tuple[int, Event]:
+        with self.condition:
+            return self.sequence, self.event
+
+    def wait(self, sequence: int, timeout: float) -> Tuple[int, Event]:
+        """Wait until an event newer than `sequence` is published.
+
+        Returns the current sequence and event, which are still those of
+        `sequence` when `timeout` seconds went by without any.
+        """
+
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.sequence != sequence, timeout=timeout
+            )
+            return self.sequence, self.event
+
+    async def wait_async(
+        self, sequence: int, timeout: float
+    ) -> Tuple[int, Event]:
+        """Like `wait`, without blocking the thread of the event loop."""
+
+        loop = asyncio.get_running_loop()
+        published = asyncio.Event()
+
+        def callback() -> None:
+            loop.call_soon_threadsafe(published.set)
+
+        with self.condition:
+            if self.sequence != sequence:
+                return self.sequence, self.event
+            self.callbacks.add(callback)
+
+        try:
+            await asyncio.wait_for(published.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.condition:
+                self.callbacks.discard(callback)
+
+        return self.current()
+
+
+notifier = Notifier()
+
+_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+
+# Token of the latest event this process published or received
+_token: Optional[str] = None
+
+
+def _write(path: str, message: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Readers must never see a partially written file, and the threads of
+    # a process publishing together must not write the same one
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(message, f)
+    os.replace(temporary, path)
+
+
+def publish(event: Event) -> None:
+    """Notify the subscribers of every process of `event`."""
+    global _token
+
+    token = f"{os.getpid()}:{time.time_ns()}"
+    with _lock:
+        _token = token
+    notifier.publish(event)
+
+    try:
+        _write(settings.TRACK_EVENTS_PATH, {"token": token, "event": event})
+    except OSError:
+        # The change is committed already, the other processes only miss
+        # it until the next one.
+        log.exception("could not write %s", settings.TRACK_EVENTS_PATH)
+
+
+def _stat(path: str) -> Optional[Stat]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _relay(path: str, last: Optional[Stat]) -> Optional[Stat]:
+    """Publish the event another process wrote to `path` since `last`.
+
+    Returns the state of the file, to pass as `last` the next time.
+    """
+    global _token
+
+    current = _stat(path)
+    if current is None or current == last:
+        return current
+
+    try:
+        with open(path) as f:
+            message = json.load(f)
+    except (OSError, ValueError):
+        log.warning("could not read %s", path, exc_info=True)
+        return current
+
+    with _lock:
+        if message["token"] == _token:
+            return current
+        _token = message["token"]
+    notifier.publish(message["event"])
+
+    return current
+
+
+def _watch() -> None:
+    path = settings.TRACK_EVENTS_PATH
+    last = _stat(path)
+    while True:
+        time.sleep(settings.TRACK_EVENTS_POLL_SECONDS)
+
+        if settings.TRACK_EVENTS_PATH != path:
+            path = settings.TRACK_EVENTS_PATH
+            last = _stat(path)
+
+        last = _relay(path, last)
+
+
+def watch() -> None:
+    """Start relaying the events of the other processes, once."""
+    global _watcher
+
+    with _lock:
+        if _watcher is not None:
+            return
+
+        _watcher = threading.Thread(
+            target=_watch, name="track-events", daemon=True
+        )
+        _watcher.start()
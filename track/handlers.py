@@ -0,0 +1,254 @@
+"""Serving the Django application over ASGI.
+
+Django 2.2 predates its own ASGI support, so `ASGIHandler` adapts its WSGI
+handler. Requests are handled on a pool of `TRACK_ASGI_THREADS` threads,
+where the views and their synchronous ORM work cannot block the event
+loop, while the event loop holds the connections:
+
+- the body of a streaming response, such as the record export, is pulled
+  from the pool one chunk at a time, so a thread is only busy while a
+  chunk is produced and never while a slow client reads it,
+- a response with an `async_streaming_content`, such as the event stream
+  of the active record, is consumed on the event loop and holds no thread
+  at all.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import sys
+import tempfile
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+Scope = Dict[str, Any]
+Message = Dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+Headers = List[Tuple[str, str]]
+
+
+def build_environ(scope: Scope, body: Any) -> Dict[str, Any]:
+    """Return the WSGI environ of an ASGI HTTP request."""
+
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        # WSGI carries paths as the latin-1 decoding of their bytes
+        "SCRIPT_NAME": scope.get("root_path", "")
+        .encode("utf-8")
+        .decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "REMOTE_ADDR": client[0],
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+
+        if name not in ("CONTENT_LENGTH", "CONTENT_TYPE"):
+            name = f"HTTP_{name}"
+        if name in environ:
+            separator = "; " if name == "HTTP_COOKIE" else ","
+            value = environ[name] + separator + value
+        environ[name] = value
+
+    return environ
+
+
+class _Offloaded:
+    """Pulls the chunks of a synchronous iterable from a thread pool."""
+
+    def __init__(self, iterable: Iterable[bytes], executor) -> None:
+        self.iterator = iter(iterable)
+        self.executor = executor
+        self.pending: Optional[asyncio.Future] = None
+
+    def __aiter__(self) -> "_Offloaded":
+        return self
+
+    async def __anext__(self) -> bytes:
+        loop = asyncio.get_running_loop()
+        self.pending = loop.run_in_executor(
+            self.executor, next, self.iterator, None
+        )
+        # Cancelling the wait must not abandon the chunk being produced,
+        # the iterable is closed once it is done.
+        chunk = await asyncio.shield(self.pending)
+        if chunk is None:
+            raise StopAsyncIteration
+        return chunk
+
+    async def aclose(self) -> None:
+        if self.pending is not None:
+            await asyncio.wait([self.pending])
+
+
+class ASGIHandler:
+    """ASGI application running a WSGI application on a thread pool."""
+
+    def __init__(self, application: Callable, *, threads: int) -> None:
+        self.application = application
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="track-asgi"
+        )
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope {scope['type']!r}")
+
+    async def lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Large bodies are spooled to disk, the way Django handles uploads
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                body.close()
+                return
+            body.write(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body.seek(0)
+
+        loop = asyncio.get_running_loop()
+        try:
+            status, headers, content, response = await loop.run_in_executor(
+                self.executor, self.respond, build_environ(scope, body)
+            )
+        finally:
+            body.close()
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                # Django prefixes the cookies it sets with a space
+                "headers": [
+                    (name.encode("latin-1"), value.strip().encode("latin-1"))
+                    for name, value in headers
+                ],
+            }
+        )
+
+        if response is None:
+            await send({"type": "http.response.body", "body": content})
+            return
+
+        chunks = getattr(response, "async_streaming_content", None)
+        if chunks is None:
+            chunks = _Offloaded(response, self.executor)
+
+        try:
+            await self.stream(chunks, receive, send)
+        finally:
+            await chunks.aclose()
+            # Fires request_finished, which may close database connections
+            await loop.run_in_executor(self.executor, response.close)
+
+    def respond(
+        self, environ: Dict[str, Any]
+    ) -> Tuple[str, Headers, bytes, Optional[Any]]:
+        """Run the WSGI application, in a thread of the pool.
+
+        Returns the status and headers along with either the content of
+        the response, or the response itself when it is streamed.
+        """
+
+        started: List[Tuple[str, Headers]] = []
+
+        def start_response(status, headers, exc_info=None):
+            started.append((status, headers))
+
+        response = self.application(environ, start_response)
+        status, headers = started[0]
+
+        if getattr(response, "streaming", False):
+            return status, headers, b"", response
+
+        try:
+            return status, headers, b"".join(response), None
+        finally:
+            if hasattr(response, "close"):
+                response.close()
+
+    async def stream(
+        self, chunks: AsyncIterator[bytes], receive: Receive, send: Send
+    ) -> None:
+        """Send `chunks` until they run out or the client goes away."""
+
+        async def disconnected() -> None:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        gone = asyncio.ensure_future(disconnected())
+        try:
+            while True:
+                chunk = asyncio.ensure_future(chunks.__anext__())
+                await asyncio.wait(
+                    [chunk, gone], return_when=asyncio.FIRST_COMPLETED
+                )
+                if not chunk.done():
+                    chunk.cancel()
+                    await asyncio.wait([chunk])
+                    log.debug("client went away, stream aborted")
+                    return
+
+                try:
+                    data = chunk.result()
+                except StopAsyncIteration:
+                    break
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": data,
+                        "more_body": True,
+                    }
+                )
+
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            gone.cancel()
@@ -0,0 +1,144 @@
+"""Clip time intervals against a sequence of bucket boundaries.
+
+Records are stored as half-open intervals `[start_time_epoch,
+stop_time_epoch)`. Reports need to know how much of each interval falls
+into a given day, week or month, so a record crossing midnight is split
+between the days it covers instead of being attributed entirely to the
+day it started in.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import (
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+K = TypeVar("K", bound=Hashable)
+
+PERIODS = ("day", "week", "month")
+
+
+def timestamps(days: Sequence[date]) -> List[int]:
+    """Return the local midnight timestamp at the start of every day."""
+
+    return [int(datetime.timestamp(datetime.combine(d, time()))) for d in days]
+
+
+def day_boundaries(begin: date, end: date) -> List[int]:
+    """Return the local midnight timestamps of every day in [begin, end].
+
+    The result holds one boundary more than there are days, so day `n`
+    covers `[boundaries[n], boundaries[n + 1])`.
+    """
+
+    return timestamps(
+        [begin + timedelta(days=n) for n in range((end - begin).days + 1)]
+    )
+
+
+def period_boundaries(begin: date, end: date, period: str) -> List[date]:
+    """Return the first day of every `period` overlapping [begin, end).
+
+    Weeks start on Monday and months on their first day. The last entry is
+    the first day following the final period, so the result always holds
+    one boundary more than there are periods.
+    """
+
+    if period == "day":
+        edges = [begin]
+    elif period == "week":
+        edges = [begin - timedelta(days=begin.weekday())]
+    elif period == "month":
+        edges = [begin.replace(day=1)]
+    else:
+        raise ValueError(f"Unknown period {period}")
+
+    while edges[-1] < end or len(edges) < 2:
+        current = edges[-1]
+        try:
+            if period == "day":
+                edges.append(current + timedelta(days=1))
+            elif period == "week":
+                edges.append(current + timedelta(weeks=1))
+            else:
+                edges.append(
+                    date(
+                        current.year + current.month // 12,
+                        current.month % 12 + 1,
+                        1,
+                    )
+                )
+        except (OverflowError, ValueError):
+            # Past the end of year 9999, which no date can hold. `end` is
+            # a date too, so the final period still covers all of it.
+            edges.append(date.max)
+
+    return edges
+
+
+def clip(
+    start: int, stop: Optional[int], begin: int, end: int, *, now: int
+) -> int:
+    """Return the number of seconds `[start, stop)` overlaps `[begin, end)`.
+
+    Open intervals (where `stop` is None) are considered to stop at `now`.
+    """
+
+    if stop is None:
+        stop = now
+
+    return max(0, min(stop, end) - max(start, begin))
+
+
+def split(
+    intervals: Iterable[Tuple[K, int, Optional[int]]],
+    boundaries: Sequence[int],
+    *,
+    now: int,
+) -> Dict[Tuple[int, K], int]:
+    """Split keyed intervals over the buckets delimited by `boundaries`.
+
+    `intervals` yields `(key, start, stop)` tuples and `boundaries` must be
+    sorted in ascending order. The result maps `(bucket index, key)` to the
+    number of seconds of all intervals with that key falling inside the
+    bucket. Anything outside `[boundaries[0], boundaries[-1])` is dropped.
+
+    The intervals are sorted by start and swept once against the
+    boundaries, so the cost is O(n log n + buckets + pieces), where pieces
+    is the number of (interval, bucket) overlaps produced.
+    """
+
+    result: Dict[Tuple[int, K], int] = defaultdict(int)
+
+    if len(boundaries) < 2:
+        return result
+
+    last = len(boundaries) - 1
+    bucket = 0
+
+    for key, start, stop in sorted(intervals, key=lambda i: i[1]):
+        if stop is None:
+            stop = now
+
+        # Starts are visited in ascending order, so the first bucket an
+        # interval can fall into never moves backwards.
+        while bucket < last and boundaries[bucket + 1] <= start:
+            bucket += 1
+
+        current = bucket
+        while current < last and boundaries[current] < stop:
+            seconds = min(stop, boundaries[current + 1]) - max(
+                start, boundaries[current]
+            )
+            if seconds > 0:
+                result[(current, key)] += seconds
+            current += 1
+
+    return result
@@ -0,0 +1,48 @@
+from datetime import date
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from track.services import ARCHIVE_CHUNK_SIZE, archive_records
+
+
+class Command(BaseCommand):
+    help = "Move the records stopped before a day to the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            required=True,
+            help="Archive the records stopped before this day, YYYY-MM-DD.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=ARCHIVE_CHUNK_SIZE,
+            help="Records moved per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            before = date.fromisoformat(options["before"])
+        except ValueError:
+            raise CommandError(f"Invalid day {options['before']!r}")
+
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        started = time.perf_counter()
+        archived = 0
+
+        # One transaction per chunk, so writers are never held up for long
+        while True:
+            moved = archive_records(before=before, limit=options["chunk_size"])
+            if not moved:
+                break
+            archived += moved
+            self.stderr.write(f"{archived} records archived")
+
+        self.stdout.write(
+            f"Archived {archived} records stopped before {before} in "
+            f"{time.perf_counter() - started:.1f}s."
+        )
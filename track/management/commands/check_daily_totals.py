@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from track.selectors import get_daily_totals_discrepancies
+from track.services import rebuild_daily_totals
+
+
+class Command(BaseCommand):
+    help = "Compare the daily project totals against a full recompute."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Rebuild the daily totals when they are inconsistent.",
+        )
+
+    def handle(self, *args, **options):
+        discrepancies = get_daily_totals_discrepancies()
+
+        for entry in discrepancies:
+            self.stderr.write(
+                "{day} project={project_id}: expected {expected}, "
+                "got {actual}".format(**entry)
+            )
+
+        if not discrepancies:
+            self.stdout.write("Daily totals are consistent.")
+            return
+
+        if not options["repair"]:
+            raise CommandError(
+                f"{len(discrepancies)} inconsistent daily totals found"
+            )
+
+        rebuild_daily_totals()
+        self.stdout.write("Daily totals rebuilt.")
@@ -0,0 +1,290 @@
+import contextlib
+import csv
+import gzip
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from track.models import Category, Project
+from track.services import (
+    add_project_to_category,
+    bulk_create_records,
+    create_category,
+    create_project,
+)
+
+FORMATS = ("csv", "jsonl")
+
+# A row of the file, or the error which made it unreadable
+Row = Union[Dict[str, Any], ValueError]
+
+# Relaxed durability for the duration of the import.  A crash may lose the
+# transaction in flight, which the checkpoint lets us redo.
+SQLITE_PRAGMAS = {"synchronous": "OFF", "cache_size": "-65536"}
+
+
+def _open(path: str) -> TextIO:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="")
+    return open(path, newline="")
+
+
+def _detect_format(path: str) -> str:
+    name = path[: -len(".gz")] if path.endswith(".gz") else path
+    extension = os.path.splitext(name)[1].lstrip(".")
+    if extension == "ndjson":
+        return "jsonl"
+    if extension not in FORMATS:
+        raise CommandError(f"Cannot tell the format of {path}, use --format")
+    return extension
+
+
+def _read(stream: TextIO, fmt: str) -> Iterator[Row]:
+    if fmt == "jsonl":
+        for line in stream:
+            if not line.strip():
+                continue
+            # Unreadable lines are yielded too, to be reported and counted
+            # along with the other rows
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield ValueError(f"invalid JSON: {e}")
+                continue
+            if not isinstance(row, dict):
+                yield ValueError("expected a JSON object")
+                continue
+            yield row
+        return
+
+    for row in csv.DictReader(stream):
+        # Several categories are separated by a semicolon within a column
+        categories = row.get("categories")
+        if categories is not None:
+            row["categories"] = [c for c in categories.split(";") if c]
+        yield row
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if value is None or value == "":
+        return None
+
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"invalid timestamp {value!r}")
+    return parsed
+
+
+@contextlib.contextmanager
+def _sqlite_pragmas() -> Iterator[None]:
+    # SQLite refuses to change the safety level within a transaction
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        yield
+        return
+
+    with connection.cursor() as cursor:
+        previous = {}
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}")
+            previous[pragma] = cursor.fetchone()[0]
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for pragma, value in previous.items():
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+
+
+class Command(BaseCommand):
+    help = "Import records from CSV or JSONL files, optionally gzipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import records from.")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Format of the file, guessed from its extension by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of rows validated and inserted at once.",
+        )
+        parser.add_argument(
+            "--commit-every",
+            type=int,
+            default=100_000,
+            help="Number of rows imported per transaction and checkpoint.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="File recording the progress, defaults to PATH.checkpoint.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and import from the start.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or _detect_format(path)
+        batch_size = options["batch_size"]
+        commit_every = max(options["commit_every"], batch_size)
+        checkpoint = options["checkpoint"] or f"{path}.checkpoint"
+
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+
+        done = 0
+        if os.path.exists(checkpoint) and not options["restart"]:
+            with open(checkpoint) as f:
+                done = json.load(f)["rows"]
+            self.stderr.write(f"Resuming after row {done}")
+
+        self._create_projects(path, fmt)
+
+        imported, skipped = 0, 0
+        started = time.monotonic()
+
+        with _open(path) as stream, _sqlite_pragmas():
+            rows = itertools.islice(enumerate(_read(stream, fmt)), done, None)
+
+            while True:
+                chunk = list(itertools.islice(rows, commit_every))
+                if not chunk:
+                    break
+
+                with transaction.atomic():
+                    for offset in range(0, len(chunk), batch_size):
+                        batch = chunk[offset:][:batch_size]
+                        created, errors = self._import(batch)
+                        imported += created
+                        skipped += errors
+
+                done = chunk[-1][0] + 1
+                self._save_checkpoint(checkpoint, done)
+
+                elapsed = time.monotonic() - started
+                self.stderr.write(
+                    f"{done} rows read, {imported} imported, "
+                    f"{skipped} skipped ({imported / elapsed:.0f} rows/s)"
+                )
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(f"Imported {imported} records, skipped {skipped}.")
+
+    def _create_projects(self, path: str, fmt: str) -> None:
+        """Create the projects and categories the file refers to."""
+
+        # Invalid rows are left to be reported when they are imported
+        projects: Dict[str, Set[str]] = {}
+        with _open(path) as stream:
+            for row in _read(stream, fmt):
+                if isinstance(row, ValueError) or "project" not in row:
+                    continue
+                categories = projects.setdefault(row["project"], set())
+                categories.update(row.get("categories") or ())
+
+        existing = set(
+            Project.objects.filter(name__in=projects).values_list(
+                "name", flat=True
+            )
+        )
+        for name in sorted(projects.keys() - existing):
+            self.stderr.write(f"Creating project {name}")
+            try:
+                create_project(name=name)
+            except ValidationError as e:
+                # Its rows are skipped, as their project does not exist
+                self.stderr.write(f"Project {name}: {'; '.join(e.messages)}")
+                del projects[name]
+
+        names = set().union(*projects.values())
+        categories = Category.objects.in_bulk(names, field_name="name")
+        for name in sorted(names - categories.keys()):
+            self.stderr.write(f"Creating category {name}")
+            try:
+                categories[name] = create_category(name=name)
+            except ValidationError as e:
+                self.stderr.write(f"Category {name}: {'; '.join(e.messages)}")
+                names.discard(name)
+
+        linked = set(
+            Category.projects.through.objects.filter(
+                category__name__in=names
+            ).values_list("category__name", "project__name")
+        )
+        for project_name, category_names in sorted(projects.items()):
+            project = None
+            for category_name in sorted(category_names & names):
+                if (category_name, project_name) in linked:
+                    continue
+                project = project or Project.objects.get(name=project_name)
+                add_project_to_category(
+                    project=project, category=categories[category_name]
+                )
+
+    def _import(self, rows: List) -> Tuple[int, int]:
+        """Insert a batch of (line, row) pairs, returns (created, skipped)."""
+
+        records, lines = [], []
+        skipped = 0
+        for line, row in rows:
+            try:
+                if isinstance(row, ValueError):
+                    raise row
+
+                start_time = _parse_time(row["start_time"])
+                if start_time is None:
+                    raise ValueError("missing start time")
+
+                records.append(
+                    {
+                        "project": row["project"],
+                        "start_time": start_time,
+                        "stop_time": _parse_time(row.get("stop_time")),
+                    }
+                )
+                lines.append(line)
+            except KeyError as e:
+                self.stderr.write(f"Row {line + 1}: missing {e}")
+                skipped += 1
+            except ValueError as e:
+                self.stderr.write(f"Row {line + 1}: {e}")
+                skipped += 1
+
+        created, errors = bulk_create_records(records=records)
+        for index, messages in errors.items():
+            message = "; ".join(messages)
+            self.stderr.write(f"Row {lines[index] + 1}: {message}")
+
+        return created, skipped + len(errors)
+
+    def _save_checkpoint(self, checkpoint: str, rows: int) -> None:
+        # Written to the side and renamed, so it is never left half written
+        with open(f"{checkpoint}.tmp", "w") as f:
+            json.dump({"rows": rows}, f)
+        os.replace(f"{checkpoint}.tmp", checkpoint)
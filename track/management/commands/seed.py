@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from track import datasets
+from track.models import Category, Project
+
+
+class Command(BaseCommand):
+    help = "Fill the database with realistic time tracking data."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=5 * 365,
+            help="Number of days of history up to today.",
+        )
+        parser.add_argument("--projects", type=int, default=50)
+        parser.add_argument("--categories", type=int, default=8)
+        parser.add_argument(
+            "--session-minutes",
+            type=int,
+            default=75,
+            help="Typical length of a record.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--flush",
+            action="store_true",
+            help="Delete the existing records, projects and categories.",
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        if options["projects"] < 1:
+            raise CommandError("At least one project is needed")
+
+        if Project.objects.exists() or Category.objects.exists():
+            if not options["flush"]:
+                raise CommandError("The database is not empty, use --flush")
+            self.stderr.write("Deleting the existing data")
+            datasets.clear()
+
+        created = datasets.generate_sessions(
+            days=options["days"],
+            projects=options["projects"],
+            categories=options["categories"],
+            session_minutes=options["session_minutes"],
+            seed=options["seed"],
+            progress=lambda count, day: self.stderr.write(
+                f"{count} records up to {day}"
+            ),
+        )
+
+        self.stdout.write(
+            f"Created {options['projects']} projects and {created} records."
+        )
@@ -0,0 +1,230 @@
+"""Request metrics in the Prometheus text exposition format.
+
+`MetricsMiddleware` records, for every URL name, the number of requests,
+a histogram of their latency and the number and duration of the SQL
+queries they run. `metrics_view` renders them for scraping.
+
+Every thread keeps its own counters, so recording a request never waits
+on a lock; the counters of all threads are only summed up when they are
+scraped. When a thread exits, its counters are folded into those of the
+threads gone before it, so servers starting a thread per request keep a
+bounded number of them. Metrics are kept per process, every worker of a
+multi-process server is scraped on its own.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+import contextlib
+import threading
+import time
+from typing import Callable, DefaultDict, List, Set, Tuple
+import weakref
+
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Label of requests which did not resolve to a view
+UNRESOLVED = "<unresolved>"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Stats:
+    """Counters written by a single thread."""
+
+    def __init__(self) -> None:
+        self.requests: DefaultDict[Tuple[str, str, str], int] = defaultdict(
+            int
+        )
+        self.buckets: DefaultDict[str, List[int]] = defaultdict(
+            lambda: [0] * (len(BUCKETS) + 1)
+        )
+        self.seconds: DefaultDict[str, float] = defaultdict(float)
+        self.queries: DefaultDict[str, int] = defaultdict(int)
+        self.query_seconds: DefaultDict[str, float] = defaultdict(float)
+
+    def add(self, other: "_Stats") -> None:
+        """Add the counters of `other`, which may be written meanwhile."""
+
+        # Copying a dict is atomic, its thread may be writing to it
+        for key, count in dict(other.requests).items():
+            self.requests[key] += count
+        for view, counts in dict(other.buckets).items():
+            for index, count in enumerate(list(counts)):
+                self.buckets[view][index] += count
+        for name in ("seconds", "queries", "query_seconds"):
+            totals = getattr(self, name)
+            for view, value in dict(getattr(other, name)).items():
+                totals[view] += value
+
+
+class _Owner:
+    """Kept by a single thread, released when the thread exits."""
+
+
+# A thread exiting can release its owner while another thread holds the lock
+_lock = threading.RLock()
+# Counters of the running threads
+_shards: Set[_Stats] = set()
+# Counters of the threads which have exited
+_retired = _Stats()
+_local = threading.local()
+
+
+def _retire(stats: _Stats) -> None:
+    with _lock:
+        _shards.discard(stats)
+        _retired.add(stats)
+
+
+def _stats() -> _Stats:
+    stats = getattr(_local, "stats", None)
+    if stats is None:
+        stats = _local.stats = _Stats()
+        _local.owner = _Owner()
+        with _lock:
+            _shards.add(stats)
+        weakref.finalize(_local.owner, _retire, stats)
+    return stats
+
+
+def observe(
+    *,
+    view: str,
+    method: str,
+    status: int,
+    seconds: float,
+    queries: int,
+    query_seconds: float
+) -> None:
+    """Record a request handled by the current thread."""
+
+    stats = _stats()
+    stats.requests[(view, method, str(status))] += 1
+    stats.buckets[view][bisect_left(BUCKETS, seconds)] += 1
+    stats.seconds[view] += seconds
+    stats.queries[view] += queries
+    stats.query_seconds[view] += query_seconds
+
+
+class QueryTimer:
+    """Execute wrapper counting the queries and the time spent in them."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        timer = QueryTimer()
+        started = time.perf_counter()
+
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        observe(
+            view=match.view_name if match is not None else UNRESOLVED,
+            method=request.method or "",
+            status=response.status_code,
+            seconds=time.perf_counter() - started,
+            queries=timer.count,
+            query_seconds=timer.seconds,
+        )
+        return response
+
+
+def _label(value: str) -> str:
+    escaped = value.replace("\\", r"\\").replace('"', r"\"")
+    return escaped.replace("\n", r"\n")
+
+
+def _labels(**labels: str) -> str:
+    pairs = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+    return "{" + pairs + "}"
+
+
+def _collect() -> _Stats:
+    """Sum the counters of every thread."""
+
+    totals = _Stats()
+    with _lock:
+        totals.add(_retired)
+        shards = list(_shards)
+
+    for shard in shards:
+        totals.add(shard)
+    return totals
+
+
+def render() -> str:
+    """Render every metric in the text exposition format."""
+
+    totals = _collect()
+    lines = [
+        "# HELP track_http_requests_total Requests handled.",
+        "# TYPE track_http_requests_total counter",
+    ]
+    for (view, method, status), count in sorted(totals.requests.items()):
+        labels = _labels(view=view, method=method, status=status)
+        lines.append(f"track_http_requests_total{labels} {count}")
+
+    lines += [
+        "# HELP track_http_request_duration_seconds Time to respond.",
+        "# TYPE track_http_request_duration_seconds histogram",
+    ]
+    for view, counts in sorted(totals.buckets.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _labels(view=view, le=le)
+            lines.append(
+                f"track_http_request_duration_seconds_bucket{labels} "
+                f"{cumulative}"
+            )
+        labels = _labels(view=view)
+        lines += [
+            f"track_http_request_duration_seconds_sum{labels} "
+            f"{totals.seconds[view]}",
+            f"track_http_request_duration_seconds_count{labels} "
+            f"{cumulative}",
+        ]
+
+    lines += [
+        "# HELP track_db_queries_total SQL queries run by requests.",
+        "# TYPE track_db_queries_total counter",
+    ]
+    for view, count in sorted(totals.queries.items()):
+        lines.append(f"track_db_queries_total{_labels(view=view)} {count}")
+
+    lines += [
+        "# HELP track_db_query_seconds_total Time spent in SQL queries.",
+        "# TYPE track_db_query_seconds_total counter",
+    ]
+    for view, seconds in sorted(totals.query_seconds.items()):
+        labels = _labels(view=view)
+        lines.append(f"track_db_query_seconds_total{labels} {seconds}")
+
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,83 @@
+# Generated by Django 2.2.28 on 2026-10-16 22:19
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def elapsed_per_day(start, stop):
+    # Frozen copy of track.rollups.elapsed_per_day, so later changes to the
+    # rollups do not change what this migration does. Records are split
+    # between the local days they cover, running ones count nothing yet.
+    if stop is None:
+        return {}
+
+    result = {}
+    day = datetime.fromtimestamp(start).date()
+    while True:
+        begin = int(datetime.timestamp(datetime.combine(day, time())))
+        if begin >= stop:
+            return result
+        end = int(
+            datetime.timestamp(
+                datetime.combine(day + timedelta(days=1), time())
+            )
+        )
+        seconds = min(stop, end) - max(start, begin)
+        if seconds > 0:
+            result[day] = seconds
+        day += timedelta(days=1)
+
+
+def populate_daily_totals(apps, schema_editor):
+    Record = apps.get_model('track', 'Record')
+    DailyProjectTotal = apps.get_model('track', 'DailyProjectTotal')
+
+    seconds = defaultdict(int)
+    counts = defaultdict(int)
+    rows = Record.objects.values_list(
+        'project_id', 'start_time_epoch', 'stop_time_epoch'
+    ).iterator()
+    for project_id, start, stop in rows:
+        for day, elapsed in elapsed_per_day(start, stop).items():
+            seconds[(day, project_id)] += elapsed
+            counts[(day, project_id)] += 1
+
+    DailyProjectTotal.objects.bulk_create(
+        [
+            DailyProjectTotal(
+                day=day,
+                project_id=project_id,
+                seconds=seconds[(day, project_id)],
+                record_count=counts[(day, project_id)],
+            )
+            for day, project_id in seconds
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('track', '0003_auto_20190709_1423'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProjectTotal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('seconds', models.IntegerField(default=0)),
+                ('record_count', models.IntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_totals', to='track.Project')),
+            ],
+            options={
+                'unique_together': {('day', 'project')},
+            },
+        ),
+        migrations.RunPython(populate_daily_totals, migrations.RunPython.noop),
+    ]
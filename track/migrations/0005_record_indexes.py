@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-16 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('track', '0004_dailyprojecttotal'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['project', 'start_time_epoch'], name='record_project_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['start_time_epoch'], name='record_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(condition=models.Q(stop_time_epoch__isnull=True), fields=['stop_time_epoch'], name='record_running_idx'),
+        ),
+    ]
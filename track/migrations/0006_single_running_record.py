@@ -0,0 +1,39 @@
+# Generated by Django 2.2.28 on 2026-10-16 22:41
+
+from django.db import migrations
+from django.db.models import F
+
+
+def stop_extra_running_records(apps, schema_editor):
+    # Only the latest running record is kept running. The others are
+    # stopped as they started: running records count nothing in the daily
+    # totals, and empty ones neither, rather than time nobody recorded.
+    Record = apps.get_model('track', 'Record')
+    running = Record.objects.filter(stop_time_epoch__isnull=True)
+    latest = running.order_by('-start_time_epoch', '-id').first()
+    if latest is not None:
+        running.exclude(pk=latest.pk).update(
+            stop_time_epoch=F('start_time_epoch')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('track', '0005_record_indexes'),
+    ]
+
+    # Unique on a constant for the running records, so there can never be
+    # more than one of them.  Django 2.2 cannot express an index on an
+    # expression, hence the raw SQL.
+    operations = [
+        migrations.RunPython(
+            stop_extra_running_records, migrations.RunPython.noop
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX record_single_running '
+            'ON track_record ((stop_time_epoch IS NULL)) '
+            'WHERE stop_time_epoch IS NULL',
+            'DROP INDEX record_single_running',
+        ),
+    ]
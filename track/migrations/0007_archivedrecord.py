@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-16 23:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('track', '0006_single_running_record'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('start_time_epoch', models.PositiveIntegerField()),
+                ('stop_time_epoch', models.PositiveIntegerField()),
+                ('created', models.DateTimeField()),
+                ('modified', models.DateTimeField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_records', to='track.Project')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedrecord',
+            index=models.Index(fields=['project', 'start_time_epoch'], name='archived_project_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedrecord',
+            index=models.Index(fields=['start_time_epoch'], name='archived_start_idx'),
+        ),
+    ]
@@ -31,6 +31,21 @@ class Record(TimeStampedModel):
     start_time_epoch = models.PositiveIntegerField()
     stop_time_epoch = models.PositiveIntegerField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["project", "start_time_epoch"],
+                name="record_project_start_idx",
+            ),
+            models.Index(fields=["start_time_epoch"], name="record_start_idx"),
+            # Only the running records, of which there are very few
+            models.Index(
+                fields=["stop_time_epoch"],
+                condition=models.Q(stop_time_epoch__isnull=True),
+                name="record_running_idx",
+            ),
+        ]
+
     @property
     def start_time(self):
         return datetime.fromtimestamp(self.start_time_epoch)
@@ -54,9 +69,73 @@ class Record(TimeStampedModel):
         ):
             raise ValidationError("Stop time cannot be before start time")
 
+        if (
+            self.stop_time_epoch is None
+            and Record.objects.filter(stop_time_epoch__isnull=True)
+            .exclude(pk=self.pk)
+            .exists()
+        ):
+            raise ValidationError("Another record is already running")
+
     def save(self, *args, **kwargs):
         self.full_clean()
         return super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.project.name} [{self.start_time.iso_format()}]"
+
+
+class DailyProjectTotal(models.Model):
+    """Running total of the closed records of a project on a single day.
+
+    Maintained by `track.services` whenever a record is written, so that
+    reports can be built from a handful of rows instead of scanning every
+    `Record` in the requested range.
+    """
+
+    day = models.DateField()
+    project = models.ForeignKey(
+        Project, on_delete=models.CASCADE, related_name="daily_totals"
+    )
+    seconds = models.IntegerField(default=0)
+    record_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("day", "project")
+
+    def __str__(self):
+        return f"{self.project.name} [{self.day.isoformat()}]"
+
+
+class ArchivedRecord(models.Model):
+    """A closed record moved out of the `Record` table.
+
+    Old records are archived by `track.services.archive_records`, which
+    keeps their id and timestamps. Their time is still part of the
+    `DailyProjectTotal` rollups, and the selectors summing up records read
+    both tables.
+    """
+
+    id = models.IntegerField(primary_key=True)
+    project = models.ForeignKey(
+        Project, on_delete=models.CASCADE, related_name="archived_records"
+    )
+    start_time_epoch = models.PositiveIntegerField()
+    stop_time_epoch = models.PositiveIntegerField()
+    created = models.DateTimeField()
+    modified = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["project", "start_time_epoch"],
+                name="archived_project_start_idx",
+            ),
+            models.Index(
+                fields=["start_time_epoch"], name="archived_start_idx"
+            ),
+        ]
+
+    def __str__(self):
+        start = datetime.fromtimestamp(self.start_time_epoch)
+        return f"{self.project.name} [{start.isoformat()}]"
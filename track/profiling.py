@@ -0,0 +1,119 @@
+"""Profiling of single requests on demand.
+
+With `TRACK_PROFILING` enabled, a staff user adding `?_profile=cprofile`
+to a request, or sending an `X-Profile: cprofile` header, gets it run
+under cProfile. The profile is written to `TRACK_PROFILE_DIR` as a
+pstats file, along with a text report listing the slowest functions and
+every SQL query the request ran. The name of the files is returned in an
+`X-Profile` response header.
+"""
+
+import contextlib
+import cProfile
+from datetime import datetime
+import io
+import logging
+import os
+import pstats
+import re
+import time
+from typing import Callable, List, Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+log = logging.getLogger(__name__)
+
+QUERY_PARAM = "_profile"
+HEADER = "HTTP_X_PROFILE"
+
+# Number of functions listed in the text report
+REPORT_LINES = 60
+
+
+class QueryLog:
+    """Execute wrapper keeping every query along with its duration."""
+
+    def __init__(self) -> None:
+        self.queries: List[Tuple[float, str, object]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - started, sql, params))
+
+
+def _requested(request: HttpRequest) -> bool:
+    mode = request.GET.get(QUERY_PARAM) or request.META.get(HEADER)
+    if mode != "cprofile":
+        return False
+
+    user = getattr(request, "user", None)
+    return user is not None and user.is_active and user.is_staff
+
+
+def _basename(request: HttpRequest) -> str:
+    match = request.resolver_match
+    name = match.view_name if match is not None else "unresolved"
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S.%f")
+    return re.sub(r"[^\w.-]", "_", f"{name}-{stamp}")
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not settings.TRACK_PROFILING or not _requested(request):
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        queries = QueryLog()
+
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+
+            profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+
+        basename = self.save(request, profile, queries)
+        response["X-Profile"] = basename
+        return response
+
+    def save(
+        self,
+        request: HttpRequest,
+        profile: cProfile.Profile,
+        queries: QueryLog,
+    ) -> str:
+        directory = settings.TRACK_PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+
+        basename = _basename(request)
+        path = os.path.join(directory, basename)
+        profile.dump_stats(f"{path}.prof")
+
+        report = io.StringIO()
+        report.write(f"{request.method} {request.get_full_path()}\n\n")
+        stats = pstats.Stats(profile, stream=report)
+        stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+
+        total = sum(duration for duration, _, _ in queries.queries)
+        report.write(
+            f"{len(queries.queries)} queries in {total * 1000:.1f}ms\n"
+        )
+        for duration, sql, params in queries.queries:
+            report.write(f"\n[{duration * 1000:.2f}ms] {sql}\n{params!r}\n")
+
+        with open(f"{path}.txt", "w") as f:
+            f.write(report.getvalue())
+
+        log.info("profile written to %s", path)
+        return basename
@@ -0,0 +1,55 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from .intervals import day_boundaries, split
+
+Bucket = Tuple[date, int]
+
+
+def elapsed_per_day(
+    start_time_epoch: int, stop_time_epoch: Optional[int]
+) -> Dict[date, int]:
+    """Return the elapsed time a record contributes to each day.
+
+    A record crossing midnight is split between the days it covers.
+    Records which are still running do not contribute anything yet, as
+    their elapsed time keeps growing until they are stopped.
+    """
+
+    if stop_time_epoch is None:
+        return {}
+
+    first = datetime.fromtimestamp(start_time_epoch).date()
+    last = datetime.fromtimestamp(stop_time_epoch).date()
+
+    pieces = split(
+        [(None, start_time_epoch, stop_time_epoch)],
+        day_boundaries(first, last + timedelta(days=1)),
+        now=stop_time_epoch,
+    )
+
+    return {
+        first + timedelta(days=index): seconds
+        for (index, _), seconds in pieces.items()
+    }
+
+
+def compute_daily_totals(
+    rows: Iterable[Tuple[int, int, Optional[int]]],
+) -> Dict[Bucket, Tuple[int, int]]:
+    """Fold (project_id, start, stop) rows into per-day totals.
+
+    The result maps every (day, project_id) bucket to a tuple of the total
+    seconds and the number of records contributing to it.
+    """
+
+    seconds: Dict[Bucket, int] = defaultdict(int)
+    counts: Dict[Bucket, int] = defaultdict(int)
+
+    for project_id, start, stop in rows:
+        for day, elapsed in elapsed_per_day(start, stop).items():
+            seconds[(day, project_id)] += elapsed
+            counts[(day, project_id)] += 1
+
+    return {key: (seconds[key], counts[key]) for key in seconds}
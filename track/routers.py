@@ -0,0 +1,91 @@
+"""Routing of reads to a replica database.
+
+With `TRACK_READ_DATABASE` naming a database alias, `ReplicaRouter` sends
+reads there while every write goes to the default database. Reads are
+kept on the default database:
+
+- within a transaction on the default database,
+- for the rest of the request or thread once it has written anything,
+- for `TRACK_REPLICA_LAG_SECONDS` after a client wrote, so that it reads
+  its own writes while the replica catches up. `ReplicaPinMiddleware`
+  remembers this with a cookie.
+"""
+
+import threading
+from typing import Callable
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest, HttpResponse
+
+COOKIE = "track_primary"
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+_state = threading.local()
+
+
+def pin() -> None:
+    """Send the reads of the current thread to the default database."""
+    _state.pinned = True
+
+
+def unpin() -> None:
+    _state.pinned = False
+    _state.wrote = False
+
+
+def is_pinned() -> bool:
+    return getattr(_state, "pinned", False)
+
+
+def read_database() -> str:
+    """Return the alias the current thread reads from."""
+
+    replica = settings.TRACK_READ_DATABASE
+    if (
+        not replica
+        or is_pinned()
+        or connections[DEFAULT_DB_ALIAS].in_atomic_block
+    ):
+        return DEFAULT_DB_ALIAS
+    return replica
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints) -> str:
+        return read_database()
+
+    def db_for_write(self, model, **hints) -> str:
+        pin()
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        # The replica holds the same data as the default database
+        return True
+
+
+class ReplicaPinMiddleware:
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        unpin()
+        if COOKIE in request.COOKIES:
+            pin()
+
+        try:
+            response = self.get_response(request)
+            wrote = getattr(_state, "wrote", False)
+        finally:
+            unpin()
+
+        if wrote or request.method not in SAFE_METHODS:
+            response.set_cookie(
+                COOKIE,
+                "1",
+                max_age=settings.TRACK_REPLICA_LAG_SECONDS,
+                httponly=True,
+            )
+        return response
@@ -1,112 +1,542 @@
+from bisect import bisect_right
+from collections import defaultdict
+from copy import copy
 from datetime import datetime, date, time, timedelta
+import heapq
+import itertools
 import logging
-from typing import Any, Dict, Optional, Set
-
-from django.db.models import Q
+from time import monotonic
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import (
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    Q,
+    QuerySet,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest, Least
 import pendulum
 
-from .models import Category, Project, Record
+from . import cache, events
+from .intervals import day_boundaries, period_boundaries, split
+from .models import (
+    ArchivedRecord,
+    Category,
+    DailyProjectTotal,
+    Project,
+    Record,
+)
+from .rollups import compute_daily_totals
 
 
 log = logging.getLogger(__name__)
 
 
+# The running record along with the generations it was read at and the
+# time the memo expires, shared by every thread of this process.
+_active_record: Optional[Tuple[List[int], float, Optional[Record]]] = None
+
+# Seconds the active record is kept in memory when
+# `TRACK_ACTIVE_RECORD_TTL_SECONDS` is unset. A shared cache bumps the
+# generations for every process, the timeout is only a safety net and
+# outlasts the polling of dashboards. With a process local cache nothing
+# else bounds how long the writes of other processes go unnoticed.
+ACTIVE_RECORD_TTL_SHARED = 60.0
+ACTIVE_RECORD_TTL_LOCAL = 1.0
+
+
+def _active_record_ttl() -> float:
+    ttl = settings.TRACK_ACTIVE_RECORD_TTL_SECONDS
+    if ttl is not None:
+        return ttl
+    if cache.is_process_local():
+        return ACTIVE_RECORD_TTL_LOCAL
+    return ACTIVE_RECORD_TTL_SHARED
+
+
 def get_active_record() -> Optional[Record]:
+    """Return the record which is still running, if any.
+
+    The record is kept in memory until a write bumps the generation of the
+    running records, so polling for it does not hit the database. A change
+    relayed from another process drops it too, and it is read again after
+    `TRACK_ACTIVE_RECORD_TTL_SECONDS` in any case.
+    """
+    global _active_record
+
+    generations = cache.get_generations([cache.REPORTS, cache.RUNNING])
+    now = monotonic()
+
+    memo = _active_record
+    if memo is None or memo[0] != generations or memo[1] <= now:
+        # Read from the default database, a lagging replica would have the
+        # memo hold a stale record under the generations of a write.
+        query = Q(stop_time_epoch__isnull=True)
+        record = (
+            Record.objects.using(DEFAULT_DB_ALIAS)
+            .select_related("project")
+            .filter(query)
+            .first()
+        )
 
-    query = Q(stop_time_epoch__isnull=True)
+        expires = now + _active_record_ttl()
+        memo = _active_record = (generations, expires, record)
 
-    try:
-        return Record.objects.get(query)
-    except Record.DoesNotExist:
-        return None
+    # Callers may modify the record, so never hand out the shared instance
+    return copy(memo[2])
 
 
-def get_elapsed_time(
+def forget_active_record() -> None:
+    """Drop the active record kept in memory by `get_active_record`."""
+    global _active_record
+
+    _active_record = None
+
+
+events.notifier.callbacks.add(forget_active_record)
+
+
+def _epoch(dt: datetime) -> Value:
+    return Value(int(datetime.timestamp(dt)), output_field=IntegerField())
+
+
+def get_records(
     *,
-    project: Project,
+    start_after: Optional[datetime] = None,
+    start_before: Optional[datetime] = None,
+    project: Optional[str] = None,
+    category: Optional[str] = None,
+    running: Optional[bool] = None,
+    min_elapsed: Optional[int] = None,
+    now: Optional[datetime] = None
+) -> QuerySet:
+    """Return the records matching every given filter, newest first.
+
+    Records starting within `[start_after, start_before)` are included.
+    Every filter narrows down an index of `Record`, so a short range never
+    scans the table. `min_elapsed` keeps the records lasting at least that
+    many seconds, running ones up until `now`, through their annotated
+    `elapsed_seconds`. None of them can have started less than
+    `min_elapsed` before `now`, which also bounds the start time.
+    """
+
+    if now is None:
+        now = datetime.now()
+
+    query = Q()
+    if start_after is not None:
+        query &= Q(start_time_epoch__gte=int(datetime.timestamp(start_after)))
+    if start_before is not None:
+        query &= Q(start_time_epoch__lt=int(datetime.timestamp(start_before)))
+    if project is not None:
+        query &= Q(project__name=project)
+    if category is not None:
+        projects = Project.objects.filter(categories__name=category)
+        query &= Q(project__in=projects.values("id"))
+    if running is not None:
+        query &= Q(stop_time_epoch__isnull=running)
+
+    queryset = Record.objects.all()
+    if min_elapsed is not None:
+        latest = int(datetime.timestamp(now)) - min_elapsed
+        queryset = queryset.annotate(
+            elapsed_seconds=ExpressionWrapper(
+                Coalesce(F("stop_time_epoch"), _epoch(now))
+                - F("start_time_epoch"),
+                output_field=IntegerField(),
+            )
+        )
+        query &= Q(start_time_epoch__lte=latest)
+        query &= Q(elapsed_seconds__gte=min_elapsed)
+
+    return queryset.filter(query).order_by("-start_time_epoch", "-id")
+
+
+def _sum_elapsed(
+    query: Q,
     begin: Optional[datetime] = None,
-    end: Optional[datetime] = None
+    end: Optional[datetime] = None,
+    now: Optional[datetime] = None
 ) -> int:
+    """Sum the time records matching `query` spend in [begin, end).
 
-    query = Q(project=project)
+    Records are clipped to the range in the database, so a record crossing
+    one of the bounds only counts for the part inside of it. Records which
+    are still running are counted up until `now`, which defaults to the
+    current time. Archived records are included.
+    """
+
+    if now is None:
+        now = datetime.now()
+
+    start = F("start_time_epoch")
+    stop = Coalesce(F("stop_time_epoch"), _epoch(now))
 
     if begin is not None:
-        query &= Q(start_time_epoch__gte=datetime.timestamp(begin))
+        start = Greatest(start, _epoch(begin))
+        query &= Q(stop_time_epoch__gt=datetime.timestamp(begin)) | Q(
+            stop_time_epoch__isnull=True
+        )
 
     if end is not None:
+        stop = Least(stop, _epoch(end))
         query &= Q(start_time_epoch__lt=datetime.timestamp(end))
 
-    records = Record.objects.filter(query).all()
+    elapsed = Greatest(stop - start, Value(0), output_field=IntegerField())
 
-    if records is None:
-        return 0
+    total = 0
+    for model in (Record, ArchivedRecord):
+        aggregate = model.objects.filter(query).aggregate(total=Sum(elapsed))
+        total += aggregate["total"] or 0
 
-    total = sum([int(r.elapsed) for r in records])
     return total
 
 
+def get_elapsed_time(
+    *,
+    project: Project,
+    begin: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    now: Optional[datetime] = None
+) -> int:
+
+    return _sum_elapsed(Q(project=project), begin=begin, end=end, now=now)
+
+
 def get_elapsed_time_per_category(
     *,
     category: Category,
     begin: Optional[datetime] = None,
-    end: Optional[datetime] = None
+    end: Optional[datetime] = None,
+    now: Optional[datetime] = None
 ) -> int:
 
-    if category.projects.count() == 0:
-        return 0
+    return _sum_elapsed(
+        Q(project__categories=category), begin=begin, end=end, now=now
+    )
+
+
+def _timestamp(day: date) -> int:
+    """Return the epoch timestamp of local midnight at the start of `day`."""
+    return int(datetime.timestamp(datetime.combine(day, time())))
+
+
+def _get_closed_totals_per_day(
+    *, begin: date, end: date, category: Optional[str] = None
+) -> Dict[date, Dict[str, int]]:
+    """Read the daily totals of the closed records in [begin, end)."""
+
+    totals = DailyProjectTotal.objects.filter(day__gte=begin, day__lt=end)
+
+    if category is not None:
+        totals = totals.filter(project__categories__name=category)
+
+    result: Dict[date, Dict[str, int]] = {}
+
+    for day, name, seconds in totals.values_list(
+        "day", "project__name", "seconds"
+    ):
+        result.setdefault(day, {})[name] = seconds
 
-    return sum(
-        [
-            get_elapsed_time(project=p, begin=begin, end=end)
-            for p in category.projects.all()
-        ]
+    return result
+
+
+def _get_running_records(
+    *, category: Optional[str] = None
+) -> List[Tuple[str, int, None]]:
+    """Return (project name, start, stop) of the records still running."""
+
+    running = Record.objects.filter(stop_time_epoch__isnull=True)
+
+    if category is not None:
+        running = running.filter(project__categories__name=category)
+
+    return list(
+        running.values_list(
+            "project__name", "start_time_epoch", "stop_time_epoch"
+        )
     )
 
 
-def get_entries_per_day(
-    *, day: date, category: Optional[str] = None
-) -> Dict[Project, int]:
+def _add_running_records(
+    closed: Dict[date, Dict[str, int]],
+    running: List[Tuple[str, int, None]],
+    *,
+    begin: date,
+    end: date,
+) -> Dict[date, Dict[str, int]]:
+    """Split the running records over the days in [begin, end).
+
+    Returns a copy of the closed totals with their time added.
+    """
+
+    result: Dict[date, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    for day, totals in closed.items():
+        result[day].update(totals)
+
+    now = int(datetime.now().timestamp())
+    pieces = split(running, day_boundaries(begin, end), now=now)
+    for (index, name), seconds in pieces.items():
+        result[begin + timedelta(days=index)][name] += seconds
 
-    range_begin = datetime.timestamp(datetime.combine(day, time()))
-    range_end = datetime.timestamp(
-        datetime.combine(day, time()) + timedelta(days=1)
+    return result
+
+
+def _get_totals_per_day(
+    *, begin: date, end: date, category: Optional[str] = None
+) -> Dict[date, Dict[str, int]]:
+    """Sum the elapsed time per project name for each day in [begin, end).
+
+    Closed records are read from the `DailyProjectTotal` rollups, and the
+    records which are still running are split over the days they cover on
+    top, so the cost depends on the number of days and projects in the
+    range rather than on the number of records.
+    """
+
+    return _add_running_records(
+        _get_closed_totals_per_day(begin=begin, end=end, category=category),
+        _get_running_records(category=category),
+        begin=begin,
+        end=end,
     )
 
-    in_range_query = Q(start_time_epoch__gte=range_begin) & Q(
-        start_time_epoch__lte=range_end
+
+def _get_totals_per_period(
+    *, begin: date, end: date, period: str, category: Optional[str] = None
+) -> Dict[date, Dict[str, int]]:
+    """Sum the elapsed time per project name for each period in a range.
+
+    The result is keyed on the first day of every period overlapping
+    [begin, end). The per-day totals are rolled up further in Python.
+    """
+
+    edges = period_boundaries(begin, end, period)
+    per_day = _get_totals_per_day(
+        begin=edges[0], end=edges[-1], category=category
     )
-    records_in_range = Record.objects.filter(in_range_query).all()
+
+    result: Dict[date, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for day, totals in per_day.items():
+        bucket = edges[bisect_right(edges, day) - 1]
+        for name, seconds in totals.items():
+            result[bucket][name] += seconds
+
+    return result
+
+
+def _get_report_backend() -> Callable[..., Dict[date, Dict[str, int]]]:
+    """Return the implementation of `_get_totals_per_period` to use."""
+
+    if settings.TRACK_REPORT_BACKEND == "numpy":
+        from . import vectorized
+
+        if vectorized.np is not None:
+            return vectorized.get_totals_per_period
+
+        log.warning("NumPy is not installed, using the python report backend")
+
+    return _get_totals_per_period
+
+
+def get_entries_per_period(
+    *,
+    begin: date,
+    end: date,
+    period: str = "month",
+    category: Optional[str] = None
+) -> Dict:
+    """Report the time spent on every project per period in [begin, end).
+
+    Meant for long ranges such as yearly or multi-year reports, it is
+    computed by the backend selected with the `TRACK_REPORT_BACKEND`
+    setting.
+    """
+
+    totals = _get_report_backend()(
+        begin=begin, end=end, period=period, category=category
+    )
+
+    result: Dict[str, Any] = {
+        "begin": begin,
+        "end": end,
+        "period": period,
+        "periods": [],
+    }
 
     if category is not None:
-        cat = Category.objects.get(name=category)
-        records_in_range = records_in_range.filter(
-            project__in=cat.projects.all()
-        )
+        result["category"] = category
+
+    included_projects: Set[str] = set()
 
-    projects_in_range = set([r.project for r in records_in_range])
+    for bucket in period_boundaries(begin, end, period)[:-1]:
+        entries = totals.get(bucket, {})
+        included_projects.update(entries.keys())
 
-    result = {}
-    for project in projects_in_range:
-        with_project = Q(project=project)
-        total = sum(
-            [
-                int(r.elapsed)
-                for r in records_in_range.filter(with_project).all()
-            ]
+        result["periods"].append(
+            {
+                "date": bucket,
+                "records": dict(entries),
+                "total": sum(entries.values()),
+            }
         )
 
-        result[project] = total
+    result["projects"] = sorted(included_projects)
 
     return result
 
 
+def get_daily_totals_discrepancies() -> List[Dict[str, Any]]:
+    """Compare the `DailyProjectTotal` rollups against a full recompute.
+
+    Returns one entry for every (day, project) bucket where the stored
+    seconds or record count differ from what the records add up to.
+    """
+
+    fields = ("project_id", "start_time_epoch", "stop_time_epoch")
+    rows = itertools.chain(
+        Record.objects.values_list(*fields).iterator(),
+        ArchivedRecord.objects.values_list(*fields).iterator(),
+    )
+    expected = compute_daily_totals(rows)
+
+    actual = {
+        (day, project_id): (seconds, count)
+        for day, project_id, seconds, count in (
+            DailyProjectTotal.objects.values_list(
+                "day", "project_id", "seconds", "record_count"
+            ).iterator()
+        )
+    }
+
+    return [
+        {
+            "day": day,
+            "project_id": project_id,
+            "expected": expected.get((day, project_id), (0, 0)),
+            "actual": actual.get((day, project_id), (0, 0)),
+        }
+        for day, project_id in sorted(set(expected) | set(actual))
+        if expected.get((day, project_id)) != actual.get((day, project_id))
+    ]
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+ExportRow = Tuple[int, str, int, Optional[int]]
+
+
+def _iter_pages(queryset: QuerySet, chunk_size: int) -> Iterator[ExportRow]:
+    """Yield the rows of `queryset` ordered by start time and id.
+
+    Every page of `chunk_size` rows is a query of its own, starting after
+    the last row of the previous one. No cursor is left open between
+    pages, so the rows may be consumed from any thread, and long exports
+    do not keep a read transaction open.
+    """
+
+    page = queryset
+    while True:
+        rows = list(page[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+
+        pk, _, start, _ = rows[-1]
+        after = Q(start_time_epoch=start, id__gt=pk)
+        page = queryset.filter(Q(start_time_epoch__gt=start) | after)
+
+
+def iter_records(
+    *,
+    project: Optional[str] = None,
+    category: Optional[str] = None,
+    begin: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE
+) -> Iterator[ExportRow]:
+    """Yield `(id, project, start, stop)` rows ordered by start time.
+
+    Only records starting within `[begin, end)` are included, archived
+    ones too.  Rows are fetched `chunk_size` at a time, so memory use does
+    not depend on how many records match.
+    """
+
+    query = Q()
+    if project is not None:
+        query &= Q(project__name=project)
+    if category is not None:
+        query &= Q(project__categories__name=category)
+    if begin is not None:
+        query &= Q(start_time_epoch__gte=int(datetime.timestamp(begin)))
+    if end is not None:
+        query &= Q(start_time_epoch__lt=int(datetime.timestamp(end)))
+
+    hot, archived = (
+        _iter_pages(
+            model.objects.filter(query)
+            .order_by("start_time_epoch", "id")
+            .values_list(
+                "id", "project__name", "start_time_epoch", "stop_time_epoch"
+            ),
+            chunk_size,
+        )
+        for model in (Record, ArchivedRecord)
+    )
+    return heapq.merge(archived, hot, key=lambda row: (row[2], row[0]))
+
+
+def get_entries_per_day(
+    *, day: date, category: Optional[str] = None
+) -> Dict[Project, int]:
+
+    totals = _get_totals_per_day(
+        begin=day, end=day + timedelta(days=1), category=category
+    ).get(day, {})
+
+    projects = Project.objects.in_bulk(list(totals.keys()), field_name="name")
+    return {projects[name]: total for name, total in totals.items()}
+
+
 def get_entries_per_week(
     *, week_number: str, category: Optional[str] = None
 ) -> Dict:
     range_begin = pendulum.parse(week_number).start_of("week")
     range_end = pendulum.parse(week_number).end_of("week")
 
-    period = pendulum.period(range_begin, range_end)
+    # A hack to convert between pendulum date object and datetime.date
+    days = [
+        datetime.fromtimestamp(dt.timestamp()).date()
+        for dt in pendulum.period(range_begin, range_end).range("days")
+    ]
+
+    begin, end = days[0], days[-1] + timedelta(days=1)
+
+    # Only the closed records are cached, the running ones are added on
+    # top as their elapsed time keeps growing.
+    scopes = [cache.REPORTS]
+    if category is not None:
+        scopes.append(cache.category_scope(category))
+
+    closed = cache.get_or_compute(
+        f"closed-per-day:{begin.isoformat()}:{category}",
+        scopes + [cache.week_scope(begin)],
+        lambda: _get_closed_totals_per_day(
+            begin=begin, end=end, category=category
+        ),
+    )
+    running = cache.get_or_compute(
+        f"running:{category}",
+        scopes + [cache.RUNNING],
+        lambda: _get_running_records(category=category),
+    )
+    totals = _add_running_records(closed, running, begin=begin, end=end)
+
     result: Dict[str, Any] = {"week_number": week_number, "days": []}
 
     if category is not None:
@@ -114,28 +544,19 @@ def get_entries_per_week(
 
     included_projects: Set[str] = set()
 
-    for dt in period.range("days"):
-
-        # A hack to convert between pendulum date object and datetime.date
-        python_date = datetime.fromtimestamp(dt.timestamp()).date()
-
-        entries_per_day = get_entries_per_day(
-            day=python_date, category=category
-        )
-        included_projects = included_projects.union(
-            {k.name for k in entries_per_day.keys()}
-        )
-
-        log.debug("included projects now %s", included_projects)
+    for python_date in days:
+        entries_per_day = totals.get(python_date, {})
+        included_projects.update(entries_per_day.keys())
 
         result["days"].append(
             {
                 "date": python_date,
-                "records": {k.name: v for k, v in entries_per_day.items()},
+                "records": dict(entries_per_day),
                 "total": sum(entries_per_day.values()),
             }
         )
 
-    result["projects"] = sorted(list(included_projects))
+    log.debug("included projects %s", included_projects)
+    result["projects"] = sorted(included_projects)
 
     return result
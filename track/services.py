@@ -1,12 +1,40 @@
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime, time
+import itertools
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 import logging
 
-from .models import Category, Project, Record
+from django.db import transaction
+from django.db.models import F
+
+from . import cache, events
+from .models import (
+    ArchivedRecord,
+    Category,
+    DailyProjectTotal,
+    Project,
+    Record,
+)
+from .rollups import Bucket, compute_daily_totals, elapsed_per_day
 
 log = logging.getLogger(__name__)
 
+# Number of rows written per query by the bulk operations.  SQLite limits
+# the number of terms of the compound statement Django inserts them with.
+BATCH_SIZE = 500
+
+# Number of records moved to the archive per transaction
+ARCHIVE_CHUNK_SIZE = 10000
+
 
 def create_category(
     *, name: str, description: Optional[str] = None
@@ -31,6 +59,63 @@ def create_project(*, name: str, description: Optional[str] = None) -> Project:
     return project
 
 
+def _invalidate_reports(*scopes: str) -> None:
+    """Invalidate the cached reports depending on any of `scopes`."""
+
+    # Bump right away so the rest of this transaction reads fresh reports,
+    # and again once committed so that reports computed concurrently from
+    # the previous state are not cached under the new generation.
+    cache.bump(*scopes)
+    transaction.on_commit(lambda: cache.bump(*scopes))
+
+
+def _publish_active_record() -> None:
+    """Notify the subscribers of the active record once committed."""
+
+    def publish():
+        active = (
+            Record.objects.filter(stop_time_epoch__isnull=True)
+            .values_list("id", "project__name", "start_time_epoch")
+            .first()
+        )
+        events.publish(
+            None
+            if active is None
+            else dict(zip(("id", "project", "start_time_epoch"), active))
+        )
+
+    transaction.on_commit(publish)
+
+
+def _apply_to_reports(*, record: Record, sign: int) -> None:
+    """Credit (sign=1) or debit (sign=-1) a record to the daily totals.
+
+    Also invalidates the cached reports of every week the record covers.
+    """
+
+    scopes = cache.week_scopes(record.start_time_epoch, record.stop_time_epoch)
+    if record.stop_time_epoch is None:
+        scopes.append(cache.RUNNING)
+    _invalidate_reports(*scopes)
+
+    for day, elapsed in elapsed_per_day(
+        record.start_time_epoch, record.stop_time_epoch
+    ).items():
+        total, _ = DailyProjectTotal.objects.get_or_create(
+            day=day, project_id=record.project_id
+        )
+        DailyProjectTotal.objects.filter(pk=total.pk).update(
+            seconds=F("seconds") + sign * elapsed,
+            record_count=F("record_count") + sign,
+        )
+
+    if sign < 0:
+        DailyProjectTotal.objects.filter(
+            project_id=record.project_id, record_count__lte=0
+        ).delete()
+
+
+@transaction.atomic
 def create_record(
     *, project: Project, start_time: datetime, stop_time: Optional[datetime]
 ) -> Record:
@@ -56,9 +141,15 @@ def create_record(
     record.full_clean()
     record.save()
 
+    _apply_to_reports(record=record, sign=1)
+
+    if record.stop_time_epoch is None:
+        _publish_active_record()
+
     return record
 
 
+@transaction.atomic
 def update_record(
     *,
     record: Record,
@@ -81,6 +172,12 @@ def update_record(
     if stop_time is not None:
         stop_time_epoch = datetime.timestamp(stop_time)
 
+    # Debit what is stored rather than what the caller read, which may be
+    # a stale copy such as the active record kept in memory.
+    stored = Record.objects.select_for_update().get(pk=record.pk)
+    was_running = stored.stop_time_epoch is None
+    _apply_to_reports(record=stored, sign=-1)
+
     record.project = project
     record.start_time_epoch = start_time_epoch
     record.stop_time_epoch = stop_time_epoch
@@ -88,11 +185,315 @@ def update_record(
     record.full_clean()
     record.save()
 
+    _apply_to_reports(record=record, sign=1)
+
+    if was_running or record.stop_time_epoch is None:
+        _publish_active_record()
+
     return record
 
 
+@transaction.atomic
+def delete_record(*, record: Record) -> None:
+    """Delete a record."""
+    log.info("record %s will be deleted", record.id)
+
+    _apply_to_reports(record=record, sign=-1)
+    record.delete()
+
+    if record.stop_time_epoch is None:
+        _publish_active_record()
+
+
+def _credit_daily_totals(totals: Dict[Bucket, Tuple[int, int]]) -> None:
+    """Add (seconds, record count) to many daily totals at once."""
+
+    existing = {
+        (total.day, total.project_id): total
+        for total in DailyProjectTotal.objects.filter(
+            day__in={day for day, _ in totals},
+            project_id__in={project_id for _, project_id in totals},
+        )
+    }
+
+    updated, created = [], []
+    for (day, project_id), (seconds, count) in totals.items():
+        total = existing.get((day, project_id))
+        if total is None:
+            created.append(
+                DailyProjectTotal(
+                    day=day,
+                    project_id=project_id,
+                    seconds=seconds,
+                    record_count=count,
+                )
+            )
+        else:
+            total.seconds = F("seconds") + seconds
+            total.record_count = F("record_count") + count
+            updated.append(total)
+
+    DailyProjectTotal.objects.bulk_update(
+        updated, ["seconds", "record_count"], batch_size=BATCH_SIZE
+    )
+    DailyProjectTotal.objects.bulk_create(created, batch_size=BATCH_SIZE)
+
+
+@transaction.atomic
+def bulk_create_records(
+    *, records: Sequence[Dict[str, Any]], batch_size: int = BATCH_SIZE
+) -> Tuple[int, Dict[int, List[str]]]:
+    """Create many records at once.
+
+    Every entry of `records` holds the name of a `project`, a `start_time`
+    and an optional `stop_time`. The entries are validated in memory and
+    the valid ones are inserted in batches, while the invalid ones are
+    skipped. Returns the number of records created along with the errors
+    of every skipped entry, keyed on its index.
+    """
+    log.info("bulk create %d records", len(records))
+
+    names = {entry["project"] for entry in records}
+    projects = dict(
+        Project.objects.filter(name__in=names).values_list("name", "id")
+    )
+    running = Record.objects.filter(stop_time_epoch__isnull=True).exists()
+
+    valid: List[Record] = []
+    errors: Dict[int, List[str]] = {}
+
+    for index, entry in enumerate(records):
+        start_time_epoch = int(datetime.timestamp(entry["start_time"]))
+
+        stop_time_epoch = None
+        if entry.get("stop_time") is not None:
+            stop_time_epoch = int(datetime.timestamp(entry["stop_time"]))
+
+        messages = []
+        if entry["project"] not in projects:
+            messages.append(f"Project {entry['project']} does not exist")
+
+        # Epochs are stored unsigned, like full_clean checks for one record
+        if start_time_epoch < 0:
+            messages.append("Start time cannot be before 1970")
+
+        if stop_time_epoch is not None and stop_time_epoch < 0:
+            messages.append("Stop time cannot be before 1970")
+
+        if stop_time_epoch is not None and stop_time_epoch < start_time_epoch:
+            messages.append("Stop time cannot be before start time")
+
+        if stop_time_epoch is None and running:
+            messages.append("Another record is already running")
+
+        if messages:
+            errors[index] = messages
+            continue
+
+        running = running or stop_time_epoch is None
+        valid.append(
+            Record(
+                project_id=projects[entry["project"]],
+                start_time_epoch=start_time_epoch,
+                stop_time_epoch=stop_time_epoch,
+            )
+        )
+
+    Record.objects.bulk_create(valid, batch_size=batch_size)
+
+    rows = [
+        (r.project_id, r.start_time_epoch, r.stop_time_epoch) for r in valid
+    ]
+    _credit_daily_totals(compute_daily_totals(rows))
+
+    scopes: Set[str] = set()
+    for _, start_time_epoch, stop_time_epoch in rows:
+        scopes.update(cache.week_scopes(start_time_epoch, stop_time_epoch))
+        if stop_time_epoch is None:
+            scopes.add(cache.RUNNING)
+    _invalidate_reports(*scopes)
+
+    if cache.RUNNING in scopes:
+        _publish_active_record()
+
+    return len(valid), errors
+
+
+@transaction.atomic
+def rebuild_daily_totals() -> None:
+    """Recompute the daily totals of every project from scratch."""
+    log.info("rebuilding daily totals")
+
+    fields = ("project_id", "start_time_epoch", "stop_time_epoch")
+    rows = itertools.chain(
+        Record.objects.values_list(*fields).iterator(),
+        ArchivedRecord.objects.values_list(*fields).iterator(),
+    )
+
+    DailyProjectTotal.objects.all().delete()
+    DailyProjectTotal.objects.bulk_create(
+        [
+            DailyProjectTotal(
+                day=day,
+                project_id=project_id,
+                seconds=seconds,
+                record_count=count,
+            )
+            for (day, project_id), (seconds, count) in compute_daily_totals(
+                rows
+            ).items()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+    _invalidate_reports(cache.REPORTS)
+
+
+@transaction.atomic
+def archive_records(*, before: date, limit: int = ARCHIVE_CHUNK_SIZE) -> int:
+    """Move closed records stopped before `before` to the archive.
+
+    At most `limit` records are moved, the oldest first. Returns how many
+    were, so callers archive a range one chunk at a time until none are
+    left. The daily totals already include the archived records, reports
+    are not affected.
+    """
+
+    cutoff = int(datetime.timestamp(datetime.combine(before, time())))
+
+    # A record starts before it stops, which lets the index on the start
+    # time narrow the candidates down.
+    records = list(
+        Record.objects.filter(
+            start_time_epoch__lt=cutoff, stop_time_epoch__lt=cutoff
+        ).order_by("id")[:limit]
+    )
+    if not records:
+        return 0
+
+    log.info("archive %d records stopped before %s", len(records), before)
+
+    ArchivedRecord.objects.bulk_create(
+        [
+            ArchivedRecord(
+                id=record.id,
+                project_id=record.project_id,
+                start_time_epoch=record.start_time_epoch,
+                stop_time_epoch=record.stop_time_epoch,
+                created=record.created,
+                modified=record.modified,
+            )
+            for record in records
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+    # Exactly the records read above, without listing their ids
+    Record.objects.filter(
+        start_time_epoch__lt=cutoff,
+        stop_time_epoch__lt=cutoff,
+        id__lte=records[-1].id,
+    ).delete()
+
+    return len(records)
+
+
+@transaction.atomic
+def update_category(
+    *, category: Category, name: str, description: Optional[str]
+) -> Category:
+    """Update one or more fields on an existing category."""
+    log.info(
+        "category %s will be updated with name %s and description: '%s'",
+        category.id,
+        name,
+        description,
+    )
+
+    if name != category.name:
+        _invalidate_reports(cache.category_scope(category.name))
+        _invalidate_reports(cache.category_scope(name))
+
+    category.name = name
+    category.description = description
+
+    category.full_clean()
+    category.save()
+
+    return category
+
+
+@transaction.atomic
+def delete_category(*, category: Category) -> None:
+    """Delete a category."""
+    log.info("category %s will be deleted", category.id)
+
+    _invalidate_reports(cache.category_scope(category.name))
+    category.delete()
+
+
+@transaction.atomic
+def update_project(
+    *,
+    project: Project,
+    name: str,
+    description: Optional[str],
+    categories: Optional[Iterable[Category]] = None
+) -> Project:
+    """Update one or more fields on an existing project.
+
+    When `categories` is given, the project is added to or removed from
+    categories so it ends up in exactly those.
+    """
+    log.info(
+        "project %s will be updated with name %s and description: '%s'",
+        project.id,
+        name,
+        description,
+    )
+
+    if name != project.name:
+        _invalidate_reports(cache.REPORTS)
+
+    project.name = name
+    project.description = description
+
+    project.full_clean()
+    project.save()
+
+    if categories is not None:
+        wanted = set(categories)
+        current = set(project.categories.all())
+
+        for category in wanted - current:
+            add_project_to_category(project=project, category=category)
+
+        for category in current - wanted:
+            remove_project_from_category(project=project, category=category)
+
+    return project
+
+
+@transaction.atomic
+def delete_project(*, project: Project) -> None:
+    """Delete a project along with all of its records."""
+    log.info("project %s will be deleted", project.id)
+
+    running = Record.objects.filter(
+        project=project, stop_time_epoch__isnull=True
+    ).exists()
+
+    _invalidate_reports(cache.REPORTS)
+    project.delete()
+
+    # Its records go along with it, the running one included
+    if running:
+        _publish_active_record()
+
+
 def add_project_to_category(*, project: Project, category: Category) -> None:
     """Adds the given project to a category."""
+    _invalidate_reports(cache.category_scope(category.name))
     category.projects.add(project)
 
 
@@ -100,4 +501,5 @@ def remove_project_from_category(
     *, project: Project, category: Category
 ) -> None:
     """Removes the given project from a category."""
+    _invalidate_reports(cache.category_scope(category.name))
     category.projects.remove(project)
@@ -11,13 +11,26 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import environ
+import hashlib
 import os
+import tempfile
 
 env = environ.Env()
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Runtime state shared by the processes of a server, kept out of the
+# source tree. The default is a temporary directory of its own for every
+# checkout.
+RUN_DIR = env(
+    "TRACK_RUN_DIR",
+    default=os.path.join(
+        tempfile.gettempdir(),
+        "track-" + hashlib.sha1(BASE_DIR.encode()).hexdigest()[:12],
+    ),
+)
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -46,11 +59,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "track.metrics.MetricsMiddleware",
+    "track.routers.ReplicaPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "track.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -75,6 +91,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "track.wsgi.application"
 
+# Threads of the pool track.asgi runs the views on, per process.  Event
+# streams do not take one of them.
+TRACK_ASGI_THREADS = env.int("TRACK_ASGI_THREADS", default=8)
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -82,10 +102,76 @@ WSGI_APPLICATION = "track.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        "NAME": env(
+            "DATABASE_NAME", default=os.path.join(BASE_DIR, "db.sqlite3")
+        ),
+        # Keep connections open between requests rather than reopening
+        # and reconfiguring one for every request.
+        "CONN_MAX_AGE": env.int("DATABASE_CONN_MAX_AGE", default=600),
+        "OPTIONS": {
+            # Seconds to wait for a lock held by another connection
+            "timeout": env.float("SQLITE_BUSY_TIMEOUT", default=5)
+        },
     }
 }
 
+# A copy of the default database which reads are sent to, see
+# track.routers.  Locally it can be a second SQLite file refreshed with
+# `sqlite3 db.sqlite3 ".backup replica.sqlite3"`.
+if env("DATABASE_REPLICA_NAME", default=None):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": env("DATABASE_REPLICA_NAME"),
+    }
+
+DATABASE_ROUTERS = ["track.routers.ReplicaRouter"]
+
+TRACK_READ_DATABASE = "replica" if "replica" in DATABASES else None
+
+# How far the replica may lag behind, in seconds.  Clients read from the
+# default database for as long after they wrote.
+TRACK_REPLICA_LAG_SECONDS = env.int("TRACK_REPLICA_LAG_SECONDS", default=5)
+
+# Pragmas applied to every new SQLite connection, see track.sqlite.  With
+# a write-ahead log readers no longer block writers nor the other way round.
+TRACK_SQLITE_PRAGMAS = {
+    "journal_mode": env("SQLITE_JOURNAL_MODE", default="WAL"),
+    "synchronous": env("SQLITE_SYNCHRONOUS", default="NORMAL"),
+    # Negative sizes are in KiB, 64MiB of page cache per connection
+    "cache_size": env.int("SQLITE_CACHE_SIZE", default=-64 * 1024),
+    "mmap_size": env.int("SQLITE_MMAP_SIZE", default=256 * 1024 * 1024),
+    "temp_store": env("SQLITE_TEMP_STORE", default="MEMORY"),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+# Writes invalidate cached reports by bumping generation counters kept in
+# this cache, so every process of a server must share it. A process local
+# backend such as locmemcache:// keeps serving stale reports from the other
+# processes, the `track.W001` check warns about it. Memcached is the best
+# fit for production, its counters are atomic.
+CACHES = {
+    "default": env.cache(
+        "CACHE_URL", default=f"filecache://{os.path.join(RUN_DIR, 'cache')}"
+    )
+}
+
+# How long computed reports are kept in the cache, in seconds.  Cached
+# reports are also invalidated whenever a record they include is written.
+TRACK_REPORT_CACHE_TIMEOUT = env.int(
+    "TRACK_REPORT_CACHE_TIMEOUT", default=24 * 60 * 60
+)
+
+# How long a process keeps the active record in memory at most, in
+# seconds, even when no write it knows of invalidated it.  Unset, it is a
+# minute when the cache is shared, whose generations already invalidate it
+# in every process, and a second with a process local cache.
+TRACK_ACTIVE_RECORD_TTL_SECONDS = env.float(
+    "TRACK_ACTIVE_RECORD_TTL_SECONDS", default=None
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -130,6 +216,39 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 50,
 }
 
+# Implementation used for long range reports, either "python" or "numpy".
+# The NumPy backend falls back to "python" when NumPy is not installed.
+TRACK_REPORT_BACKEND = env("TRACK_REPORT_BACKEND", default="python")
+
+# Let staff users profile a request with ?_profile=cprofile, the profiles
+# are written to TRACK_PROFILE_DIR.
+TRACK_PROFILING = env.bool("TRACK_PROFILING", default=False)
+TRACK_PROFILE_DIR = env(
+    "TRACK_PROFILE_DIR", default=os.path.join(RUN_DIR, "profiles")
+)
+
+# Queries taking longer than this many seconds are logged to the
+# track.slowlog logger along with their plan, 0 disables the log.
+TRACK_SLOW_QUERY_SECONDS = env.float("TRACK_SLOW_QUERY_SECONDS", default=0.5)
+
+# Changes of the active record are streamed to the clients, and relayed
+# between the processes of a server through TRACK_EVENTS_PATH, see
+# track.events.  Streams send a heartbeat every
+# TRACK_EVENTS_HEARTBEAT_SECONDS and end after TRACK_EVENTS_STREAM_SECONDS,
+# when clients reconnect.
+TRACK_EVENTS_PATH = env(
+    "TRACK_EVENTS_PATH", default=os.path.join(RUN_DIR, "events.json")
+)
+TRACK_EVENTS_POLL_SECONDS = env.float(
+    "TRACK_EVENTS_POLL_SECONDS", default=0.25
+)
+TRACK_EVENTS_HEARTBEAT_SECONDS = env.float(
+    "TRACK_EVENTS_HEARTBEAT_SECONDS", default=15
+)
+TRACK_EVENTS_STREAM_SECONDS = env.float(
+    "TRACK_EVENTS_STREAM_SECONDS", default=300
+)
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
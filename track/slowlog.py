@@ -0,0 +1,108 @@
+"""Logging of slow SQL queries.
+
+Every database connection gets an execute wrapper timing its queries.
+Those taking longer than `TRACK_SLOW_QUERY_SECONDS` are logged to the
+`track.slowlog` logger along with their parameters, the application frames
+which issued them and, for reads, the plan the database chose.
+"""
+
+import logging
+import threading
+import time
+import traceback
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.backends.signals import connection_created
+
+log = logging.getLogger(__name__)
+
+# Number of application frames logged along with a slow query
+STACK_DEPTH = 8
+
+
+def _call_site() -> List[str]:
+    """Summarize the frames of the application leading to the query."""
+
+    frames = [
+        frame
+        for frame in traceback.extract_stack()[:-3]
+        if frame.filename.startswith(settings.BASE_DIR)
+        and "site-packages" not in frame.filename
+    ]
+    return [
+        f"{frame.filename}:{frame.lineno} in {frame.name}"
+        for frame in frames[-STACK_DEPTH:]
+    ]
+
+
+class SlowQueryLog:
+    """Execute wrapper logging the queries slower than the threshold."""
+
+    def __init__(self) -> None:
+        self.local = threading.local()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - started
+
+        threshold = settings.TRACK_SLOW_QUERY_SECONDS
+        if not threshold or duration < threshold:
+            return result
+
+        # Queries run while explaining another one are not reported
+        if not getattr(self.local, "explaining", False):
+            self.report(sql, params, many, context, duration)
+
+        return result
+
+    def explain(self, sql: str, params: Any, context: Dict) -> List[str]:
+        connection = context["connection"]
+        if not connection.features.supports_explaining_query_execution:
+            return []
+
+        self.local.explaining = True
+        try:
+            # A cursor of its own, the results of the query are still unread
+            with connection.cursor() as cursor:
+                prefix = connection.ops.explain_query_prefix()
+                cursor.execute(f"{prefix} {sql}", params)
+                return [" ".join(map(str, row)) for row in cursor.fetchall()]
+        except DatabaseError as e:
+            return [f"EXPLAIN failed: {e}"]
+        finally:
+            self.local.explaining = False
+
+    def report(self, sql, params, many, context, duration: float) -> None:
+        plan = []
+        if not many and sql.lstrip()[:6].upper() == "SELECT":
+            plan = self.explain(sql, params, context)
+
+        log.warning(
+            "slow query (%.1fms): %s\nparams: %r\ncalled from:\n  %s\n"
+            "plan:\n  %s",
+            duration * 1000,
+            sql,
+            params,
+            "\n  ".join(_call_site()),
+            "\n  ".join(plan),
+            extra={"duration": duration, "sql": sql, "plan": plan},
+        )
+
+
+def install(sender, connection, **kwargs) -> None:
+    """Add the slow query log to a new database connection."""
+
+    wrappers = connection.execute_wrappers
+    if any(isinstance(wrapper, SlowQueryLog) for wrapper in wrappers):
+        return
+
+    # Connections are often opened within an `execute_wrapper()` block,
+    # which removes the last wrapper when it exits.
+    wrappers.insert(0, SlowQueryLog())
+
+
+def connect() -> None:
+    connection_created.connect(install, dispatch_uid="track.slowlog")
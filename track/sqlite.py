@@ -0,0 +1,37 @@
+"""Configuration of SQLite connections.
+
+Applies `TRACK_SQLITE_PRAGMAS` to every new SQLite connection. Together
+with `CONN_MAX_AGE` this happens once per connection rather than once per
+request.
+"""
+
+import logging
+import re
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+log = logging.getLogger(__name__)
+
+# Pragma values are interpolated, so only accept plain words and numbers
+_VALUE = re.compile(r"^-?\w+$")
+
+
+def apply_pragmas(sender, connection, **kwargs) -> None:
+    if connection.vendor != "sqlite":
+        return
+
+    pragmas = getattr(settings, "TRACK_SQLITE_PRAGMAS", {})
+    with connection.cursor() as cursor:
+        for pragma, value in pragmas.items():
+            if value is None or value == "":
+                continue
+            if not _VALUE.match(str(value)):
+                raise ValueError(f"Invalid value for PRAGMA {pragma}: {value}")
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+
+    log.debug("applied %s to %s", pragmas, connection.alias)
+
+
+def connect() -> None:
+    connection_created.connect(apply_pragmas, dispatch_uid="track.sqlite")
@@ -4,6 +4,7 @@ import random
 import factory
 
 from track.models import Category, Project, Record
+from track.services import create_record
 
 
 class CategoryFactory(factory.DjangoModelFactory):
@@ -41,3 +42,16 @@ class RecordFactory(factory.DjangoModelFactory):
 
     class Meta:
         model = Record
+
+    @classmethod
+    def _create(cls, model_class, project, start_time_epoch, stop_time_epoch):
+        # Go through the service layer so the daily totals stay consistent
+        stop_time = None
+        if stop_time_epoch is not None:
+            stop_time = datetime.fromtimestamp(stop_time_epoch)
+
+        return create_record(
+            project=project,
+            start_time=datetime.fromtimestamp(start_time_epoch),
+            stop_time=stop_time,
+        )
@@ -0,0 +1,31 @@
+import warnings
+
+from django.core.cache.backends.base import CacheKeyWarning
+
+from track import cache
+
+
+def test_shared_cache_check(settings):
+
+    assert cache.check_shared_cache(None) == []
+
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    assert [message.id for message in cache.check_shared_cache(None)] == [
+        "track.W001"
+    ]
+
+
+def test_keys_are_valid_for_memcached():
+
+    # Long enough to go past the 250 characters memcached accepts
+    scope = cache.category_scope("x" * 300 + " with spaces\n")
+    key = cache._generation_key(scope)
+    assert key.startswith("track:generation:category:")
+    assert len(key) < 100
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", CacheKeyWarning)
+        cache.bump(scope)
+        assert cache.get_or_compute(scope, [scope], lambda: 1) == 1
@@ -0,0 +1,217 @@
+from datetime import datetime
+import gzip
+import io
+import json
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+import pytest
+
+from track.models import ArchivedRecord, Category, Project, Record
+from track.selectors import get_daily_totals_discrepancies
+
+from . import factories
+
+
+def _import(path, **options):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    call_command(
+        "import_records", str(path), stdout=stdout, stderr=stderr, **options
+    )
+    return stdout.getvalue(), stderr.getvalue()
+
+
+@pytest.mark.django_db
+def test_import_records_csv_gzip(tmp_path):
+
+    existing = factories.ProjectFactory(name="existing")
+
+    path = tmp_path / "records.csv.gz"
+    with gzip.open(path, "wt") as f:
+        f.write(
+            "project,start_time,stop_time,categories\n"
+            "existing,2019-07-12T09:00:00Z,2019-07-12T10:00:00Z,\n"
+            "new,2019-07-12T10:00:00Z,2019-07-12T12:00:00Z,work;home\n"
+            "new,2019-07-12T13:00:00Z,2019-07-12T12:00:00Z,work\n"
+            "new,yesterday,,\n"
+            "new,2019-07-12T14:00:00Z,,\n"
+        )
+
+    stdout, stderr = _import(path)
+
+    assert "Imported 3 records, skipped 2." in stdout
+    assert "Row 3: Stop time cannot be before start time" in stderr
+    assert "Row 4: invalid timestamp 'yesterday'" in stderr
+    assert "rows/s" in stderr
+
+    new = Project.objects.get(name="new")
+    assert set(new.categories.values_list("name", flat=True)) == {
+        "home",
+        "work",
+    }
+    assert Category.objects.count() == 2
+    assert Record.objects.filter(project=existing).count() == 1
+    assert Record.objects.filter(project=new).count() == 2
+    assert Record.objects.filter(stop_time_epoch__isnull=True).count() == 1
+    assert get_daily_totals_discrepancies() == []
+
+    assert not (tmp_path / "records.csv.gz.checkpoint").exists()
+
+
+@pytest.mark.django_db
+def test_import_records_jsonl_resumes_from_checkpoint(tmp_path):
+
+    path = tmp_path / "records.jsonl"
+    with open(path, "w") as f:
+        for hour in range(10):
+            row = {
+                "project": "imported",
+                "start_time": f"2019-07-12T{hour:02}:00:00Z",
+                "stop_time": f"2019-07-12T{hour:02}:30:00Z",
+            }
+            f.write(json.dumps(row) + "\n")
+
+    checkpoint = tmp_path / "progress"
+    with open(checkpoint, "w") as f:
+        json.dump({"rows": 6}, f)
+
+    stdout, stderr = _import(
+        path, checkpoint=str(checkpoint), batch_size=2, commit_every=2
+    )
+
+    assert "Resuming after row 6" in stderr
+    assert "Imported 4 records, skipped 0." in stdout
+    assert sorted(
+        Record.objects.values_list("start_time_epoch", flat=True)
+    ) == [1562889600 + hour * 3600 for hour in range(6, 10)]
+    assert not checkpoint.exists()
+
+
+@pytest.mark.django_db
+def test_import_records_skips_invalid_rows(tmp_path):
+
+    path = tmp_path / "records.jsonl"
+    path.write_text(
+        '{"project": "valid", "start_time": "2019-07-12T09:00:00Z",'
+        ' "stop_time": "2019-07-12T10:00:00Z", "categories": ["a b"]}\n'
+        '{"project": "valid", "start_time": \n'
+        '["not", "an", "object"]\n'
+        '{"start_time": "2019-07-12T11:00:00Z"}\n'
+        '{"project": "not a slug", "start_time": "2019-07-12T12:00:00Z"}\n'
+    )
+
+    stdout, stderr = _import(path)
+
+    assert "Imported 1 records, skipped 4." in stdout
+    assert "Row 2: invalid JSON" in stderr
+    assert "Row 3: expected a JSON object" in stderr
+    assert "Row 4: missing 'project'" in stderr
+    assert "Project not a slug: " in stderr
+    assert "Row 5: Project not a slug does not exist" in stderr
+    assert "Category a b: " in stderr
+
+    assert list(Project.objects.values_list("name", flat=True)) == ["valid"]
+    assert not Category.objects.exists()
+    assert Record.objects.count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_records_restores_sqlite_pragmas(tmp_path):
+
+    path = tmp_path / "records.csv"
+    path.write_text("project,start_time,stop_time\n")
+
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA synchronous")
+        before = cursor.fetchone()[0]
+
+    stdout, _ = _import(path)
+    assert "Imported 0 records, skipped 0." in stdout
+
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA synchronous")
+        assert cursor.fetchone()[0] == before
+
+
+def _seed(**options):
+    stdout = io.StringIO()
+    call_command("seed", stdout=stdout, stderr=io.StringIO(), **options)
+    return stdout.getvalue()
+
+
+@pytest.mark.django_db
+def test_seed():
+
+    stdout = _seed(days=60, projects=5, categories=3, seed=1)
+    assert "Created 5 projects" in stdout
+
+    assert Project.objects.count() == 5
+    assert Category.objects.count() == 3
+    assert not Project.objects.filter(categories__isnull=True).exists()
+    assert Record.objects.filter(stop_time_epoch__isnull=True).count() == 1
+    assert get_daily_totals_discrepancies() == []
+
+    # Records never overlap, each one starts after the previous one stopped
+    times = list(
+        Record.objects.order_by("start_time_epoch").values_list(
+            "start_time_epoch", "stop_time_epoch"
+        )
+    )
+    for (_, stop), (start, _) in zip(times, times[1:]):
+        assert stop <= start
+
+
+@pytest.mark.django_db
+def test_seed_is_repeatable():
+
+    def records():
+        return list(
+            Record.objects.order_by("start_time_epoch").values_list(
+                "project__name", "start_time_epoch", "stop_time_epoch"
+            )
+        )
+
+    _seed(days=30, projects=3, seed=7)
+    first = records()
+
+    with pytest.raises(CommandError, match="use --flush"):
+        _seed(days=30, projects=3, seed=7)
+
+    _seed(days=30, projects=3, seed=7, flush=True)
+    # Only the running record depends on the current time
+    assert records()[:-1] == first[:-1]
+
+
+@pytest.mark.django_db
+def test_archive_records():
+
+    for day in range(1, 6):
+        factories.RecordFactory(
+            start_time_epoch=datetime.timestamp(datetime(2019, 7, day, 9)),
+            stop_time_epoch=datetime.timestamp(datetime(2019, 7, day, 17)),
+        )
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    call_command(
+        "archive_records",
+        before="2019-07-04",
+        chunk_size=2,
+        stdout=stdout,
+        stderr=stderr,
+    )
+
+    assert ArchivedRecord.objects.count() == 3
+    assert Record.objects.count() == 2
+    assert "Archived 3 records stopped before 2019-07-04" in stdout.getvalue()
+    assert stderr.getvalue().splitlines() == [
+        "2 records archived",
+        "3 records archived",
+    ]
+    assert get_daily_totals_discrepancies() == []
+
+
+@pytest.mark.django_db
+def test_archive_records_invalid_day():
+
+    with pytest.raises(CommandError):
+        call_command("archive_records", before="last week")
@@ -0,0 +1,22 @@
+import pytest
+
+from track import datasets
+from track.models import Category, Project, Record
+from track.selectors import get_daily_totals_discrepancies
+
+from . import factories
+
+
+@pytest.mark.django_db
+def test_generate_uniform_replaces_the_data():
+    factories.RecordFactory.create_batch(3)
+
+    params = datasets.generate_uniform(records=100, projects=4, categories=2)
+
+    assert params["records"] == 100
+    assert Record.objects.count() == 100
+    assert Project.objects.count() == 4
+    assert Category.objects.count() == 2
+    assert not Project.objects.filter(categories__isnull=True).exists()
+    assert Record.objects.filter(stop_time_epoch__isnull=True).count() == 1
+    assert get_daily_totals_discrepancies() == []
@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+import json
+import threading
+from typing import List
+
+import pytest
+
+from track import events
+from track.services import (
+    create_record,
+    delete_project,
+    delete_record,
+    update_record,
+)
+
+from . import factories
+
+
+def test_notifier_wakes_every_subscriber():
+
+    notifier = events.Notifier()
+    sequence, _ = notifier.current()
+    received = []
+
+    def subscribe():
+        received.append(notifier.wait(sequence, timeout=5))
+
+    threads = [threading.Thread(target=subscribe) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    notifier.publish({"id": 1})
+    for thread in threads:
+        thread.join()
+
+    assert received == [(sequence + 1, {"id": 1})] * 10
+
+
+def test_notifier_wait_times_out():
+
+    notifier = events.Notifier()
+    notifier.publish({"id": 1})
+
+    assert notifier.wait(1, timeout=0.01) == (1, {"id": 1})
+
+
+def test_events_of_other_processes(events_path):
+
+    last = events._stat(events_path)
+    sequence, _ = events.notifier.current()
+
+    with open(events_path, "w") as f:
+        json.dump({"token": "other:1", "event": {"id": 1}}, f)
+    last = events._relay(events_path, last)
+    assert events.notifier.current() == (sequence + 1, {"id": 1})
+
+    # Relayed once, and never the events of this process
+    assert events._relay(events_path, last) == last
+    events.publish({"id": 2})
+    events._relay(events_path, last)
+    assert events.notifier.current() == (sequence + 2, {"id": 2})
+
+
+def test_watch(events_path, settings):
+
+    settings.TRACK_EVENTS_POLL_SECONDS = 0.01
+    events.watch()
+    events.watch()
+
+    watchers = [
+        thread
+        for thread in threading.enumerate()
+        if thread.name == "track-events"
+    ]
+    assert len(watchers) == 1
+
+
+def test_publish_writes_events_path(settings, tmp_path):
+
+    # The directory is created along with the file
+    events_path = str(tmp_path / "run" / "events.json")
+    settings.TRACK_EVENTS_PATH = events_path
+    sequence, _ = events.notifier.current()
+    events.publish(None)
+
+    assert events.notifier.current() == (sequence + 1, None)
+    with open(events_path) as f:
+        assert json.load(f)["event"] is None
+
+
+def test_threads_write_events_path_together(events_path):
+
+    failures: List[BaseException] = []
+
+    def write(n: int) -> None:
+        try:
+            for sequence in range(200):
+                message = {"token": f"{n}:{sequence}", "event": None}
+                events._write(events_path, message)
+        except BaseException as error:
+            failures.append(error)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    with open(events_path) as f:
+        assert json.load(f)["token"].endswith(":199")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_services_publish_active_record(monkeypatch):
+
+    published: List[events.Event] = []
+    monkeypatch.setattr(events, "publish", published.append)
+
+    project = factories.ProjectFactory()
+    start_time = datetime(2019, 7, 9, 9)
+
+    # Closed records leave the active record alone
+    create_record(
+        project=project,
+        start_time=start_time - timedelta(hours=2),
+        stop_time=start_time - timedelta(hours=1),
+    )
+    assert published == []
+
+    first = create_record(
+        project=project, start_time=start_time, stop_time=None
+    )
+    update_record(
+        record=first,
+        project=project,
+        start_time=start_time,
+        stop_time=start_time + timedelta(hours=1),
+    )
+    second = create_record(
+        project=project, start_time=start_time, stop_time=None
+    )
+    second_id = second.id
+    delete_record(record=second)
+
+    def active(pk):
+        return {
+            "id": pk,
+            "project": project.name,
+            "start_time_epoch": int(datetime.timestamp(start_time)),
+        }
+
+    assert published == [active(first.id), None, active(second_id), None]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_delete_project_publishes_active_record(monkeypatch):
+
+    published: List[events.Event] = []
+    monkeypatch.setattr(events, "publish", published.append)
+
+    idle = factories.ProjectFactory()
+    factories.RecordFactory(project=idle)
+    delete_project(project=idle)
+    assert published == []
+
+    project = factories.ProjectFactory()
+    factories.RecordFactory(project=project, stop_time_epoch=None)
+    published.clear()
+    delete_project(project=project)
+    assert published == [None]
@@ -0,0 +1,190 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from track.handlers import ASGIHandler, build_environ
+
+
+def _scope(**scope):
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "query_string": b"",
+        "headers": [],
+        **scope,
+    }
+
+
+class _Client:
+    """Feeds a request to an ASGI application and records its messages."""
+
+    def __init__(self, body=b"") -> None:
+        self.messages: List[Dict[str, Any]] = []
+        self.requests = [
+            {"type": "http.request", "body": body, "more_body": False}
+        ]
+        self.disconnect: Optional[asyncio.Event] = None
+
+    async def receive(self):
+        if self.requests:
+            return self.requests.pop(0)
+        if self.disconnect is None:
+            self.disconnect = asyncio.Event()
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.messages.append(message)
+
+    @property
+    def body(self):
+        return b"".join(
+            message["body"]
+            for message in self.messages
+            if message["type"] == "http.response.body"
+        )
+
+
+class _Response:
+    def __init__(self, chunks, streaming=False) -> None:
+        self.chunks = chunks
+        self.streaming = streaming
+        self.threads: List[str] = []
+        self.closed = False
+        self.async_streaming_content: Optional[AsyncIterator[bytes]] = None
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.threads.append(threading.current_thread().name)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def _application(response, bodies=None):
+    def application(environ, start_response):
+        if bodies is not None:
+            bodies.append(environ["wsgi.input"].read())
+        start_response("200 OK", [("Set-Cookie", " a=1; Path=/")])
+        return response
+
+    return application
+
+
+def test_build_environ():
+
+    environ = build_environ(
+        _scope(
+            method="POST",
+            path="/api/café/",
+            query_string=b"a=1",
+            headers=[
+                (b"content-type", b"application/json"),
+                (b"x-profile", b"cprofile"),
+                (b"cookie", b"a=1"),
+                (b"cookie", b"b=2"),
+            ],
+            server=("example.com", 8000),
+            client=("10.0.0.1", 1234),
+        ),
+        None,
+    )
+
+    assert environ["REQUEST_METHOD"] == "POST"
+    assert environ["PATH_INFO"] == "/api/cafÃ©/"
+    assert environ["QUERY_STRING"] == "a=1"
+    assert environ["CONTENT_TYPE"] == "application/json"
+    assert environ["HTTP_X_PROFILE"] == "cprofile"
+    assert environ["HTTP_COOKIE"] == "a=1; b=2"
+    assert environ["SERVER_NAME"] == "example.com"
+    assert environ["SERVER_PORT"] == "8000"
+    assert environ["REMOTE_ADDR"] == "10.0.0.1"
+
+
+def test_response_runs_on_the_pool():
+
+    response = _Response([b"hello ", b"world"])
+    bodies: List[bytes] = []
+    handler = ASGIHandler(_application(response, bodies), threads=2)
+    client = _Client(body=b"request body")
+
+    asyncio.run(handler(_scope(method="POST"), client.receive, client.send))
+
+    assert client.messages[0] == {
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"Set-Cookie", b"a=1; Path=/")],
+    }
+    assert client.body == b"hello world"
+    assert bodies == [b"request body"]
+    assert response.threads[0].startswith("track-asgi")
+    assert response.closed
+
+
+def test_streaming_response_pulled_a_chunk_at_a_time():
+
+    response = _Response([b"a", b"b", b"c"], streaming=True)
+    handler = ASGIHandler(_application(response), threads=2)
+    client = _Client()
+
+    asyncio.run(handler(_scope(), client.receive, client.send))
+
+    assert [m.get("more_body", False) for m in client.messages[1:]] == [
+        True,
+        True,
+        True,
+        False,
+    ]
+    assert client.body == b"abc"
+    assert all(name.startswith("track-asgi") for name in response.threads)
+    assert response.closed
+
+
+def test_async_streaming_response_stops_on_disconnect():
+
+    waiting = []
+
+    async def chunks():
+        yield b"first"
+        waiting.append(True)
+        await asyncio.Event().wait()
+        yield b"never"
+
+    response = _Response([], streaming=True)
+    response.async_streaming_content = chunks()
+    handler = ASGIHandler(_application(response), threads=1)
+    client = _Client()
+
+    async def run():
+        served = asyncio.ensure_future(
+            handler(_scope(), client.receive, client.send)
+        )
+        while not waiting:
+            await asyncio.sleep(0.01)
+        assert client.disconnect is not None
+        client.disconnect.set()
+        await asyncio.wait_for(served, timeout=5)
+
+    asyncio.run(run())
+
+    assert client.body == b"first"
+    assert response.closed
+
+
+def test_lifespan():
+
+    handler = ASGIHandler(_application(None), threads=1)
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(handler({"type": "lifespan"}, receive, send))
+
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
@@ -0,0 +1,79 @@
+from datetime import date, datetime
+
+import pytest
+
+from track.intervals import clip, day_boundaries, period_boundaries, split
+
+
+def test_day_boundaries():
+    boundaries = day_boundaries(date(2019, 7, 8), date(2019, 7, 10))
+
+    assert boundaries == [
+        datetime.timestamp(datetime(2019, 7, 8)),
+        datetime.timestamp(datetime(2019, 7, 9)),
+        datetime.timestamp(datetime(2019, 7, 10)),
+    ]
+
+
+@pytest.mark.parametrize(
+    "period, expected",
+    [
+        ("day", [date(2019, 12, 30), date(2019, 12, 31), date(2020, 1, 1)]),
+        ("week", [date(2019, 12, 30), date(2020, 1, 6)]),
+        ("month", [date(2019, 12, 1), date(2020, 1, 1)]),
+    ],
+)
+def test_period_boundaries(period, expected):
+    begin, end = date(2019, 12, 30), date(2020, 1, 1)
+    assert period_boundaries(begin, end, period) == expected
+
+
+@pytest.mark.parametrize("period", ["day", "week", "month"])
+def test_period_boundaries_end_of_time(period):
+    edges = period_boundaries(date(9999, 11, 15), date.max, period)
+    assert edges[-1] == date.max
+    assert edges == sorted(set(edges))
+
+
+def test_period_boundaries_unknown_period():
+    with pytest.raises(ValueError):
+        period_boundaries(date(2019, 12, 30), date(2020, 1, 1), "year")
+
+
+@pytest.mark.parametrize(
+    "start, stop, expected",
+    [
+        (0, 5, 0),
+        (5, 15, 5),
+        (12, 18, 6),
+        (15, 25, 5),
+        (5, 25, 10),
+        (20, 30, 0),
+        (15, None, 3),
+    ],
+)
+def test_clip(start, stop, expected):
+    assert clip(start, stop, 10, 20, now=18) == expected
+
+
+def test_split():
+    boundaries = [0, 10, 20, 30]
+    intervals = [
+        ("b", 15, 35),
+        ("a", -5, 5),
+        ("a", 2, 28),
+        ("a", 25, None),
+        ("b", 40, 50),
+    ]
+
+    assert split(intervals, boundaries, now=27) == {
+        (0, "a"): 5 + 8,
+        (1, "a"): 10,
+        (1, "b"): 5,
+        (2, "a"): 8 + 2,
+        (2, "b"): 10,
+    }
+
+
+def test_split_without_buckets():
+    assert split([("a", 0, 10)], [5], now=10) == {}
@@ -0,0 +1,150 @@
+import re
+import threading
+
+from django.test import Client
+from django.urls import reverse
+import pytest
+
+from track import metrics
+
+from . import factories
+
+
+def _scrape(client):
+    response = client.get(reverse("metrics"))
+    assert response.status_code == 200
+    assert response["Content-Type"] == metrics.CONTENT_TYPE
+
+    samples = {}
+    for line in response.content.decode().splitlines():
+        if line.startswith("#"):
+            continue
+        name, value = line.rsplit(" ", 1)
+        samples[name] = float(value)
+    return samples
+
+
+def _delta(before, after, name):
+    return after.get(name, 0) - before.get(name, 0)
+
+
+@pytest.mark.django_db
+def test_metrics_per_view():
+
+    client = Client()
+    factories.RecordFactory.create_batch(3)
+    view = 'view="api:record-list"'
+
+    before = _scrape(client)
+    for _ in range(2):
+        assert client.get(reverse("api:record-list")).status_code == 200
+    assert client.get("/api/does-not-exist/").status_code == 404
+    after = _scrape(client)
+
+    assert (
+        _delta(
+            before,
+            after,
+            f'track_http_requests_total{{{view},method="GET",status="200"}}',
+        )
+        == 2
+    )
+    assert (
+        _delta(
+            before,
+            after,
+            'track_http_requests_total{view="<unresolved>",method="GET",'
+            'status="404"}',
+        )
+        == 1
+    )
+    assert (
+        _delta(
+            before,
+            after,
+            f'track_http_request_duration_seconds_bucket{{{view},le="+Inf"}}',
+        )
+        == 2
+    )
+    assert (
+        _delta(
+            before,
+            after,
+            f"track_http_request_duration_seconds_count{{{view}}}",
+        )
+        == 2
+    )
+    # The page of records is read with a single query
+    assert _delta(before, after, f"track_db_queries_total{{{view}}}") == 2
+    assert _delta(before, after, f"track_db_query_seconds_total{{{view}}}") > 0
+
+
+def test_histogram_buckets_are_cumulative():
+
+    for seconds in (0.001, 0.03, 0.03, 20):
+        metrics.observe(
+            view="test:buckets",
+            method="GET",
+            status=200,
+            seconds=seconds,
+            queries=1,
+            query_seconds=0.001,
+        )
+
+    rendered = metrics.render()
+    buckets = re.findall(
+        r'_bucket\{view="test:buckets",le="([^"]+)"\} (\d+)', rendered
+    )
+    assert buckets[0] == ("0.005", "1")
+    assert ("0.05", "3") in buckets
+    assert buckets[-2] == ("10.0", "3")
+    assert buckets[-1] == ("+Inf", "4")
+
+
+def test_metrics_from_every_thread_are_collected():
+
+    def observe():
+        for _ in range(100):
+            metrics.observe(
+                view="test:threads",
+                method="GET",
+                status=200,
+                seconds=0.01,
+                queries=2,
+                query_seconds=0.001,
+            )
+
+    threads = [threading.Thread(target=observe) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    rendered = metrics.render()
+    assert 'track_db_queries_total{view="test:threads"} 800' in rendered
+    assert (
+        'track_http_requests_total{view="test:threads",method="GET",'
+        'status="200"} 400'
+    ) in rendered
+
+
+def test_metrics_of_exited_threads_are_kept_without_their_shard():
+
+    def observe():
+        metrics.observe(
+            view="test:exited",
+            method="GET",
+            status=200,
+            seconds=0.01,
+            queries=1,
+            query_seconds=0.001,
+        )
+
+    shards = len(metrics._shards)
+    for _ in range(50):
+        thread = threading.Thread(target=observe)
+        thread.start()
+        thread.join()
+
+    assert len(metrics._shards) == shards
+    assert 'track_db_queries_total{view="test:exited"} 50' in metrics.render()
@@ -0,0 +1,51 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+import pytest
+
+BEFORE = [("track", "0005_record_indexes")]
+AFTER = [("track", "0006_single_running_record")]
+
+
+@pytest.fixture
+def migrator():
+    """Migrate the test database, then back to the latest migrations."""
+
+    def migrate(targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    yield migrate
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes("track"))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_single_running_record_stops_the_others(migrator):
+
+    apps = migrator(BEFORE)
+    Project = apps.get_model("track", "Project")
+    Record = apps.get_model("track", "Record")
+    DailyProjectTotal = apps.get_model("track", "DailyProjectTotal")
+
+    project = Project.objects.create(name="project")
+    stopped = Record.objects.create(
+        project=project, start_time_epoch=1000, stop_time_epoch=2000
+    )
+    older = Record.objects.create(project=project, start_time_epoch=3000)
+    tied = Record.objects.create(project=project, start_time_epoch=5000)
+    latest = Record.objects.create(project=project, start_time_epoch=5000)
+
+    apps = migrator(AFTER)
+    Record = apps.get_model("track", "Record")
+
+    stop_times = dict(Record.objects.values_list("id", "stop_time_epoch"))
+    assert stop_times == {
+        stopped.id: 2000,
+        older.id: 3000,
+        tied.id: 5000,
+        latest.id: None,
+    }
+    # The stopped records are empty, the daily totals stay as they were
+    assert not DailyProjectTotal.objects.exists()
@@ -0,0 +1,84 @@
+import os
+import pstats
+
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+import pytest
+
+from . import factories
+
+
+@pytest.fixture
+def profiling(settings, tmp_path):
+    settings.TRACK_PROFILING = True
+    settings.TRACK_PROFILE_DIR = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def staff_client():
+    client = Client()
+    client.force_login(
+        User.objects.create_user("staff", password="secret", is_staff=True)
+    )
+    return client
+
+
+@pytest.mark.django_db
+def test_profile_request(profiling, staff_client):
+
+    factories.RecordFactory.create_batch(3)
+
+    response = staff_client.get(
+        reverse("api:record-list"), {"_profile": "cprofile"}
+    )
+    assert response.status_code == 200
+
+    basename = response["X-Profile"]
+    assert basename.startswith("api_record-list-")
+    assert sorted(os.listdir(profiling)) == [
+        f"{basename}.prof",
+        f"{basename}.txt",
+    ]
+
+    stats = pstats.Stats(str(profiling / f"{basename}.prof"))
+    # Stats.stats is not in the stubs, but it is how pstats exposes them
+    assert any(name == "list" for _, _, name in stats.stats)  # type: ignore
+
+    report = (profiling / f"{basename}.txt").read_text()
+    assert "GET /api/records/?_profile=cprofile" in report
+    assert 'FROM "track_record"' in report
+
+
+@pytest.mark.django_db
+def test_profile_request_with_header(profiling, staff_client):
+
+    response = staff_client.get(
+        reverse("api:record-active"), HTTP_X_PROFILE="cprofile"
+    )
+    assert response["X-Profile"].startswith("api_record-active-")
+
+
+@pytest.mark.django_db
+def test_profile_requires_staff(profiling):
+
+    client = Client()
+    client.force_login(User.objects.create_user("user", password="secret"))
+
+    response = client.get(reverse("api:record-list"), {"_profile": "cprofile"})
+    assert response.status_code == 200
+    assert "X-Profile" not in response
+    assert os.listdir(profiling) == []
+
+
+@pytest.mark.django_db
+def test_profile_disabled(profiling, staff_client, settings):
+
+    settings.TRACK_PROFILING = False
+
+    response = staff_client.get(
+        reverse("api:record-list"), {"_profile": "cprofile"}
+    )
+    assert "X-Profile" not in response
+    assert os.listdir(profiling) == []
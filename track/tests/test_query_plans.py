@@ -0,0 +1,177 @@
+"""Make sure the selectors never fall back to a full scan of `Record`.
+
+Every query run by a selector, or by the list of records as the API serves
+it, is fed to `EXPLAIN QUERY PLAN` and the plan must access the records
+table through one of its indexes.
+"""
+
+from base64 import urlsafe_b64encode
+from datetime import date, datetime, timedelta
+import json
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+import pytest
+
+from track import selectors, vectorized
+from track.models import Record
+
+from . import factories
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != "sqlite", reason="EXPLAIN QUERY PLAN is SQLite only"
+)
+
+FULL_SCAN = re.compile(r"\bSCAN (TABLE )?track_record\b(?! USING)")
+
+
+def _query_plans(func):
+    with CaptureQueriesContext(connection) as context:
+        func()
+
+    assert context.captured_queries, "no queries were run"
+
+    with connection.cursor() as cursor:
+        for query in context.captured_queries:
+            cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+            yield query["sql"], [row[-1] for row in cursor.fetchall()]
+
+
+@pytest.fixture
+def records():
+    category = factories.CategoryFactory()
+    projects = factories.ProjectFactory.create_batch(3)
+
+    for project in projects:
+        category.projects.add(project)
+        factories.RecordFactory.create_batch(5, project=project)
+
+    factories.RecordFactory(project=projects[0], stop_time_epoch=None)
+
+    return category, projects
+
+
+def _list_records(client, **params):
+    """Return a function listing records through the API."""
+
+    def run():
+        response = client.get(reverse("api:record-list"), params)
+        assert response.status_code == 200, response.content
+
+    return run
+
+
+def _cursor(record, reverse=False):
+    position = [record.start_time_epoch, record.id, reverse]
+    return urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+@pytest.mark.parametrize(
+    "selector",
+    [
+        "get_active_record",
+        "get_elapsed_time",
+        "get_elapsed_time_in_range",
+        "get_elapsed_time_per_category",
+        "get_entries_per_day",
+        "get_entries_per_week",
+        "get_entries_per_week_for_category",
+        "get_entries_per_period",
+        "get_entries_per_period_numpy",
+        "list_records",
+        "list_records_next",
+        "list_records_previous",
+        "list_records_filtered",
+        "list_records_for_category",
+        "get_records_in_range",
+        "get_records_for_project",
+        "get_records_for_category",
+        "get_records_open",
+        "get_records_min_elapsed",
+    ],
+)
+@pytest.mark.django_db
+def test_no_full_scan_of_records(selector, records, client):
+    category, projects = records
+    now = datetime.now()
+    middle = Record.objects.order_by("start_time_epoch")[7]
+
+    if selector == "get_entries_per_period_numpy" and vectorized.np is None:
+        pytest.skip("NumPy is not installed")
+
+    func = {
+        "get_active_record": selectors.get_active_record,
+        "get_elapsed_time": lambda: selectors.get_elapsed_time(
+            project=projects[0]
+        ),
+        "get_elapsed_time_in_range": lambda: selectors.get_elapsed_time(
+            project=projects[0], begin=now - timedelta(days=7), end=now
+        ),
+        "get_elapsed_time_per_category": (
+            lambda: selectors.get_elapsed_time_per_category(
+                category=category, begin=now - timedelta(days=7), end=now
+            )
+        ),
+        "get_entries_per_day": lambda: selectors.get_entries_per_day(
+            day=now.date()
+        ),
+        "get_entries_per_week": lambda: selectors.get_entries_per_week(
+            week_number=now.strftime("%G-W%V")
+        ),
+        "get_entries_per_week_for_category": (
+            lambda: selectors.get_entries_per_week(
+                week_number=now.strftime("%G-W%V"), category=category.name
+            )
+        ),
+        "get_entries_per_period": lambda: selectors.get_entries_per_period(
+            begin=date(2019, 1, 1), end=now.date()
+        ),
+        "get_entries_per_period_numpy": (
+            lambda: vectorized.get_totals_per_period(
+                begin=now.date() - timedelta(days=60),
+                end=now.date(),
+                period="week",
+            )
+        ),
+        "list_records": _list_records(client),
+        "list_records_next": _list_records(client, cursor=_cursor(middle)),
+        "list_records_previous": _list_records(
+            client, cursor=_cursor(middle, reverse=True)
+        ),
+        "list_records_filtered": _list_records(
+            client,
+            cursor=_cursor(middle),
+            project=projects[0].name,
+            start_after=(now - timedelta(days=30)).isoformat(),
+            start_before=now.isoformat(),
+            open="false",
+            min_elapsed=60,
+        ),
+        "list_records_for_category": _list_records(
+            client, cursor=_cursor(middle), category=category.name
+        ),
+        "get_records_in_range": lambda: list(
+            selectors.get_records(
+                start_after=now - timedelta(days=8),
+                start_before=now - timedelta(days=7),
+            )[:50]
+        ),
+        "get_records_for_project": lambda: list(
+            selectors.get_records(project=projects[0].name)[:50]
+        ),
+        "get_records_for_category": lambda: list(
+            selectors.get_records(category=category.name)[:50]
+        ),
+        "get_records_open": lambda: list(
+            selectors.get_records(running=True)[:50]
+        ),
+        "get_records_min_elapsed": lambda: list(
+            selectors.get_records(min_elapsed=3600)[:50]
+        ),
+    }[selector]
+
+    for sql, plan in _query_plans(func):
+        scans = [step for step in plan if FULL_SCAN.search(step)]
+        assert not scans, f"{sql} scans the records table: {plan}"
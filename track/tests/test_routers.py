@@ -0,0 +1,134 @@
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+import pytest
+
+from track import cache, routers
+from track.models import Project
+from track.selectors import get_active_record
+from track.services import create_project
+
+from . import factories
+
+
+@pytest.fixture
+def replica(tmp_path, settings, django_db_blocker):
+    """Add a `replica` database, a SQLite file of its own."""
+
+    connections.databases["replica"] = {
+        **connections.databases["default"],
+        "NAME": str(tmp_path / "replica.sqlite3"),
+        "TEST": {},
+    }
+    settings.TRACK_READ_DATABASE = "replica"
+    routers.unpin()
+
+    with django_db_blocker.unblock():
+        call_command("migrate", database="replica", verbosity=0)
+        yield connections["replica"]
+        connections["replica"].close()
+
+    routers.unpin()
+    del connections.databases["replica"]
+    del connections._connections.replica
+
+
+def test_reads_from_replica(settings):
+
+    settings.TRACK_READ_DATABASE = "replica"
+    routers.unpin()
+
+    assert Project.objects.all().db == "replica"
+
+    routers.pin()
+    assert Project.objects.all().db == "default"
+    routers.unpin()
+
+
+def test_writes_pin_reads_to_default(settings):
+
+    settings.TRACK_READ_DATABASE = "replica"
+    routers.unpin()
+
+    assert routers.ReplicaRouter().db_for_write(Project) == "default"
+    assert Project.objects.all().db == "default"
+    routers.unpin()
+
+
+def test_no_replica(settings):
+
+    settings.TRACK_READ_DATABASE = None
+    routers.unpin()
+
+    assert Project.objects.all().db == "default"
+
+
+@pytest.mark.django_db
+def test_reads_in_transaction_from_default(settings):
+
+    settings.TRACK_READ_DATABASE = "replica"
+    routers.unpin()
+
+    # Every test runs in a transaction on the default database
+    assert Project.objects.all().db == "default"
+
+
+def test_replica_reports_cached_for_lag(settings):
+
+    settings.TRACK_READ_DATABASE = "replica"
+    settings.TRACK_REPLICA_LAG_SECONDS = 5
+    routers.unpin()
+
+    with mock.patch.object(cache.cache, "set") as cache_set:
+        assert cache.get_or_compute("x", [cache.REPORTS], lambda: 1) == 1
+        assert cache_set.call_args[1]["timeout"] == 5
+
+        routers.pin()
+        cache.get_or_compute("y", [cache.REPORTS], lambda: 1)
+        assert cache_set.call_args[1]["timeout"] == (
+            settings.TRACK_REPORT_CACHE_TIMEOUT
+        )
+
+    routers.unpin()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_read_your_writes(replica):
+
+    Project.objects.using("replica").create(name="replicated")
+    create_project(name="written")
+    routers.unpin()
+
+    url = reverse("api:project-list")
+    client = Client()
+
+    def names(client):
+        resp = client.get(url)
+        assert resp.status_code == 200
+        return sorted(p["name"] for p in resp.json()["results"])
+
+    assert names(client) == ["replicated"]
+    assert routers.COOKIE not in client.cookies
+
+    resp = client.post(url, data={"name": "new", "categories": []})
+    assert resp.status_code == 201, resp.content
+    assert resp.cookies[routers.COOKIE]["max-age"] == 5
+
+    # The client which wrote reads from the default database for a while,
+    # everyone else still reads from the replica.
+    assert names(client) == ["new", "written"]
+    assert names(Client()) == ["replicated"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_active_record_read_from_default(replica):
+
+    record = factories.RecordFactory(stop_time_epoch=None)
+    routers.unpin()
+
+    # The replica has not caught up with the record yet
+    assert not Project.objects.using("replica").exists()
+    assert get_active_record() == record
@@ -2,12 +2,28 @@ from datetime import datetime, date, timedelta
 
 import pytest
 
+from track import events
 from track.selectors import (
+    ACTIVE_RECORD_TTL_LOCAL,
+    ACTIVE_RECORD_TTL_SHARED,
+    _active_record_ttl,
     get_active_record,
+    get_daily_totals_discrepancies,
     get_elapsed_time,
     get_elapsed_time_per_category,
     get_entries_per_day,
+    get_entries_per_period,
     get_entries_per_week,
+    get_records,
+    iter_records,
+)
+
+from track.models import DailyProjectTotal, Record
+from track.services import (
+    add_project_to_category,
+    archive_records,
+    rebuild_daily_totals,
+    update_record,
 )
 
 from . import factories
@@ -31,6 +47,97 @@ def test_get_active_record_one_is_running():
     assert active.stop_time_epoch is None
 
 
+@pytest.mark.django_db
+def test_get_active_record_is_cached(django_assert_num_queries):
+    target = factories.RecordFactory(stop_time_epoch=None)
+
+    with django_assert_num_queries(1):
+        assert get_active_record() == target
+
+    with django_assert_num_queries(0):
+        active = get_active_record()
+
+    assert active == target
+    assert active.project == target.project
+
+
+@pytest.mark.django_db
+def test_get_active_record_invalidated_by_writes():
+    target = factories.RecordFactory(stop_time_epoch=None)
+    assert get_active_record() == target
+
+    update_record(
+        record=target,
+        project=target.project,
+        start_time=target.start_time,
+        stop_time=target.start_time + timedelta(minutes=1),
+    )
+    assert get_active_record() is None
+
+    record = factories.RecordFactory(stop_time_epoch=None)
+    assert get_active_record() == record
+
+
+@pytest.mark.django_db
+def test_get_active_record_expires(settings, django_assert_num_queries):
+    settings.TRACK_ACTIVE_RECORD_TTL_SECONDS = 0
+    target = factories.RecordFactory(stop_time_epoch=None)
+
+    for _ in range(2):
+        with django_assert_num_queries(1):
+            assert get_active_record() == target
+
+
+def test_active_record_ttl_follows_the_cache(settings):
+    settings.TRACK_ACTIVE_RECORD_TTL_SECONDS = None
+    assert _active_record_ttl() == ACTIVE_RECORD_TTL_SHARED
+
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    assert _active_record_ttl() == ACTIVE_RECORD_TTL_LOCAL
+
+    settings.TRACK_ACTIVE_RECORD_TTL_SECONDS = 10
+    assert _active_record_ttl() == 10
+
+
+@pytest.mark.django_db
+def test_get_active_record_forgotten_on_events():
+    target = factories.RecordFactory(stop_time_epoch=None)
+    assert get_active_record() == target
+
+    # Stopped by another process, whose generations this one cannot see
+    Record.objects.filter(pk=target.pk).update(
+        stop_time_epoch=target.start_time_epoch + 60
+    )
+    assert get_active_record() == target
+
+    events.notifier.publish(None)
+    assert get_active_record() is None
+
+
+@pytest.mark.django_db
+def test_update_record_from_a_stale_copy():
+    target = factories.RecordFactory(stop_time_epoch=None)
+    stale = get_active_record()
+
+    def stop(record, minutes):
+        update_record(
+            record=record,
+            project=target.project,
+            start_time=target.start_time,
+            stop_time=target.start_time + timedelta(minutes=minutes),
+        )
+
+    stop(Record.objects.get(pk=target.pk), 30)
+    stop(stale, 45)
+
+    assert get_daily_totals_discrepancies() == []
+    assert sum(
+        DailyProjectTotal.objects.values_list("seconds", flat=True)
+    ) == (45 * 60)
+
+
 @pytest.mark.django_db
 def test_get_elapsed_time():
 
@@ -125,6 +232,49 @@ def test_get_elapsed_time_with_lower_and_upper_bounds():
     )
 
 
+@pytest.mark.django_db
+def test_get_elapsed_time_with_open_record():
+
+    project1 = factories.ProjectFactory()
+
+    now = datetime.now().replace(microsecond=0)
+
+    factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(now - timedelta(hours=3)),
+        stop_time_epoch=datetime.timestamp(now - timedelta(hours=2)),
+        project=project1,
+    )
+    factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(now - timedelta(hours=1)),
+        stop_time_epoch=None,
+        project=project1,
+    )
+
+    assert get_elapsed_time(project=project1, now=now) == 2 * 60 * 60
+
+
+@pytest.mark.django_db
+def test_get_elapsed_time_clips_records_to_the_range():
+
+    project1 = factories.ProjectFactory()
+
+    now = datetime.now().replace(microsecond=0)
+    factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(now - timedelta(hours=10)),
+        stop_time_epoch=datetime.timestamp(now - timedelta(hours=2)),
+        project=project1,
+    )
+
+    assert (
+        get_elapsed_time(
+            project=project1,
+            begin=now - timedelta(hours=8),
+            end=now - timedelta(hours=6),
+        )
+        == 2 * 60 * 60
+    )
+
+
 @pytest.mark.django_db
 def test_get_elapsed_time_per_category():
 
@@ -166,6 +316,29 @@ def test_get_elapsed_time_per_category():
     assert get_elapsed_time_per_category(category=category3) == 0
 
 
+@pytest.mark.django_db
+def test_get_elapsed_time_per_category_query_count(django_assert_num_queries):
+
+    category = factories.CategoryFactory()
+    projects = factories.ProjectFactory.create_batch(10)
+
+    now = datetime.now().replace(microsecond=0)
+    for project in projects:
+        category.projects.add(project)
+
+        factories.RecordFactory(
+            start_time_epoch=datetime.timestamp(now - timedelta(hours=2)),
+            stop_time_epoch=datetime.timestamp(now - timedelta(hours=1)),
+            project=project,
+        )
+
+    # One query for the records and one for the archived ones
+    with django_assert_num_queries(2):
+        total = get_elapsed_time_per_category(category=category)
+
+    assert total == 10 * 60 * 60
+
+
 @pytest.mark.django_db
 def test_get_elapsed_time_per_category_with_lower_bounds():
 
@@ -279,12 +452,11 @@ def test_get_entries_per_day():
             project=project1,
         )
 
+    # The records cover the last 48 hours without gaps, so everything from
+    # midnight up until now is attributed to today.
     expected = {
         project1: int(
-            (
-                now.replace(minute=0, second=0)
-                - now.replace(hour=0, minute=0, second=0)
-            ).total_seconds()
+            (now - now.replace(hour=0, minute=0, second=0)).total_seconds()
         )
     }
 
@@ -321,12 +493,11 @@ def test_get_entries_per_day_for_category():
             project=project2,
         )
 
+    # The records cover the last 48 hours without gaps, so everything from
+    # midnight up until now is attributed to today.
     expected = {
         project1: int(
-            (
-                now.replace(minute=0, second=0)
-                - now.replace(hour=0, minute=0, second=0)
-            ).total_seconds()
+            (now - now.replace(hour=0, minute=0, second=0)).total_seconds()
         )
     }
 
@@ -335,6 +506,24 @@ def test_get_entries_per_day_for_category():
     )
 
 
+@pytest.mark.django_db
+def test_get_entries_per_day_splits_records_crossing_midnight():
+    project1 = factories.ProjectFactory()
+
+    start_time = datetime(2019, 7, 9, 18)
+    factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(start_time),
+        stop_time_epoch=datetime.timestamp(start_time + timedelta(hours=30)),
+        project=project1,
+    )
+
+    assert get_entries_per_day(day=date(2019, 7, 9)) == {project1: 6 * 60 * 60}
+    assert get_entries_per_day(day=date(2019, 7, 10)) == {
+        project1: 24 * 60 * 60
+    }
+    assert get_entries_per_day(day=date(2019, 7, 11)) == {}
+
+
 @pytest.mark.parametrize("with_category", [False, True])
 @pytest.mark.django_db
 def test_get_entries_per_week(with_category):
@@ -377,3 +566,368 @@ def test_get_entries_per_week(with_category):
         get_entries_per_week(week_number="2019-W27", category=category_param)
         == expected
     )
+
+
+@pytest.mark.parametrize("with_category", [False, True])
+@pytest.mark.django_db
+def test_get_entries_per_week_query_count(
+    with_category, django_assert_num_queries
+):
+
+    category = factories.CategoryFactory()
+    projects = factories.ProjectFactory.create_batch(20)
+
+    now = datetime(2019, 7, 9)  # A Tuesday
+    for offset, project in enumerate(projects):
+        category.projects.add(project)
+        start_time = now + timedelta(hours=offset)
+
+        factories.RecordFactory(
+            start_time_epoch=datetime.timestamp(start_time),
+            stop_time_epoch=datetime.timestamp(
+                start_time + timedelta(minutes=30)
+            ),
+            project=project,
+        )
+
+    category_param = category.name if with_category else None
+
+    with django_assert_num_queries(2):
+        result = get_entries_per_week(
+            week_number="2019-W28", category=category_param
+        )
+
+    assert result["projects"] == sorted(p.name for p in projects)
+    assert sum(day["total"] for day in result["days"]) == 20 * 30 * 60
+
+
+@pytest.mark.django_db
+def test_get_daily_totals_discrepancies():
+
+    project = factories.ProjectFactory()
+
+    now = datetime(2019, 7, 9, 12)
+    first, second = [
+        factories.RecordFactory(
+            start_time_epoch=datetime.timestamp(now - timedelta(days=offset)),
+            stop_time_epoch=datetime.timestamp(
+                now - timedelta(days=offset) + timedelta(hours=1)
+            ),
+            project=project,
+        )
+        for offset in (1, 0)
+    ]
+    assert get_daily_totals_discrepancies() == []
+
+    DailyProjectTotal.objects.filter(day=first.start_time.date()).update(
+        seconds=1
+    )
+    Record.objects.filter(pk=second.pk).delete()
+
+    assert get_daily_totals_discrepancies() == [
+        {
+            "day": first.start_time.date(),
+            "project_id": project.id,
+            "expected": (60 * 60, 1),
+            "actual": (1, 1),
+        },
+        {
+            "day": second.start_time.date(),
+            "project_id": project.id,
+            "expected": (0, 0),
+            "actual": (60 * 60, 1),
+        },
+    ]
+
+    rebuild_daily_totals()
+    assert get_daily_totals_discrepancies() == []
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+@pytest.mark.django_db
+def test_selectors_include_archived_records(backend, settings):
+    if backend == "numpy":
+        pytest.importorskip("numpy")
+    settings.TRACK_REPORT_BACKEND = backend
+
+    category = factories.CategoryFactory()
+    project = factories.ProjectFactory()
+    category.projects.add(project)
+
+    # Monday the 1st of July, the first record is archived
+    records = [
+        factories.RecordFactory(
+            start_time_epoch=datetime.timestamp(datetime(2019, 7, day, 9)),
+            stop_time_epoch=datetime.timestamp(datetime(2019, 7, day, 10)),
+            project=project,
+        )
+        for day in (1, 2)
+    ]
+    running = factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(datetime(2019, 6, 30, 9)),
+        stop_time_epoch=None,
+        project=project,
+    )
+
+    def read():
+        return (
+            get_elapsed_time(project=project, end=datetime(2019, 7, 3)),
+            get_elapsed_time_per_category(
+                category=category,
+                begin=datetime(2019, 7, 1, 9, 30),
+                end=datetime(2019, 7, 3),
+            ),
+            get_entries_per_week(week_number="2019-W27")["days"][:2],
+            get_entries_per_period(
+                begin=date(2019, 7, 1), end=date(2019, 7, 3), period="day"
+            )["periods"],
+            list(iter_records(begin=datetime(2019, 6, 30))),
+        )
+
+    before = read()
+    assert archive_records(before=date(2019, 7, 2)) == 1
+    assert set(Record.objects.values_list("id", flat=True)) == {
+        records[1].id,
+        running.id,
+    }
+
+    assert read() == before
+    assert [row[0] for row in before[-1]] == [
+        running.id,
+        records[0].id,
+        records[1].id,
+    ]
+    assert get_daily_totals_discrepancies() == []
+
+
+@pytest.mark.django_db
+def test_get_records_min_elapsed_counts_running_records():
+    project = factories.ProjectFactory()
+    now = datetime(2019, 7, 9, 12)
+
+    def record(start, stop):
+        return factories.RecordFactory(
+            start_time_epoch=datetime.timestamp(start),
+            stop_time_epoch=stop and datetime.timestamp(stop),
+            project=project,
+        )
+
+    short = record(datetime(2019, 7, 8, 9), datetime(2019, 7, 8, 9, 30))
+    long = record(datetime(2019, 7, 8, 10), datetime(2019, 7, 8, 12))
+    running = record(datetime(2019, 7, 9, 10), None)
+
+    def ids(**filters):
+        records = get_records(now=now, **filters)
+        return [record.id for record in records]
+
+    assert ids() == [running.id, long.id, short.id]
+    assert ids(min_elapsed=3600) == [running.id, long.id]
+    assert ids(min_elapsed=3 * 3600) == []
+    assert ids(min_elapsed=3600, running=False) == [long.id]
+    assert get_records(now=now, min_elapsed=0)[0].elapsed_seconds == 7200
+
+
+@pytest.mark.django_db
+def test_iter_records_pages_over_tied_start_times():
+    project = factories.ProjectFactory()
+    starts = [9, 9, 9, 10, 10, 11, 12]
+    records = [
+        factories.RecordFactory(
+            start_time_epoch=datetime.timestamp(datetime(2019, 7, 1, hour)),
+            stop_time_epoch=datetime.timestamp(datetime(2019, 7, 1, 13)),
+            project=project,
+        )
+        for hour in starts
+    ]
+
+    rows = list(iter_records(project=project.name, chunk_size=2))
+
+    assert [row[0] for row in rows] == [record.id for record in records]
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+@pytest.mark.parametrize("period", ["day", "week", "month"])
+@pytest.mark.django_db
+def test_get_entries_per_period(backend, period, settings):
+    if backend == "numpy":
+        pytest.importorskip("numpy")
+    settings.TRACK_REPORT_BACKEND = backend
+
+    category = factories.CategoryFactory()
+    project1 = factories.ProjectFactory()
+    project2 = factories.ProjectFactory()
+    category.projects.add(project1)
+
+    # Sunday the 30th of June at 20:00 until Monday the 1st of July at 4:00
+    start_time = datetime(2019, 6, 30, 20)
+    factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(start_time),
+        stop_time_epoch=datetime.timestamp(start_time + timedelta(hours=8)),
+        project=project1,
+    )
+    factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(datetime(2019, 7, 2, 9)),
+        stop_time_epoch=datetime.timestamp(datetime(2019, 7, 2, 10)),
+        project=project2,
+    )
+
+    expected_periods = {
+        "day": [
+            (date(2019, 6, 30), {project1.name: 4 * 60 * 60}),
+            (date(2019, 7, 1), {project1.name: 4 * 60 * 60}),
+            (date(2019, 7, 2), {project2.name: 60 * 60}),
+        ],
+        "week": [
+            (date(2019, 6, 24), {project1.name: 4 * 60 * 60}),
+            (
+                date(2019, 7, 1),
+                {project1.name: 4 * 60 * 60, project2.name: 60 * 60},
+            ),
+        ],
+        "month": [
+            (date(2019, 6, 1), {project1.name: 4 * 60 * 60}),
+            (
+                date(2019, 7, 1),
+                {project1.name: 4 * 60 * 60, project2.name: 60 * 60},
+            ),
+        ],
+    }[period]
+
+    result = get_entries_per_period(
+        begin=date(2019, 6, 30), end=date(2019, 7, 3), period=period
+    )
+
+    assert result == {
+        "begin": date(2019, 6, 30),
+        "end": date(2019, 7, 3),
+        "period": period,
+        "projects": sorted([project1.name, project2.name]),
+        "periods": [
+            {"date": day, "records": records, "total": sum(records.values())}
+            for day, records in expected_periods
+        ],
+    }
+
+    result = get_entries_per_period(
+        begin=date(2019, 6, 30),
+        end=date(2019, 7, 3),
+        period=period,
+        category=category.name,
+    )
+
+    assert result["category"] == category.name
+    assert result["projects"] == [project1.name]
+    assert sum(p["total"] for p in result["periods"]) == 8 * 60 * 60
+
+
+@pytest.mark.django_db
+def test_get_entries_per_period_backends_agree(settings):
+    pytest.importorskip("numpy")
+
+    factories.RecordFactory.create_batch(50)
+    factories.RecordFactory(stop_time_epoch=None)
+
+    begin = date.today() - timedelta(days=40)
+    end = date.today() + timedelta(days=1)
+
+    settings.TRACK_REPORT_BACKEND = "python"
+    expected = get_entries_per_period(begin=begin, end=end, period="week")
+
+    settings.TRACK_REPORT_BACKEND = "numpy"
+    result = get_entries_per_period(begin=begin, end=end, period="week")
+
+    for got, wanted in zip(result["periods"], expected["periods"]):
+        assert got["records"].keys() == wanted["records"].keys()
+        for name, seconds in got["records"].items():
+            # The running record may tick between the two reports
+            assert abs(seconds - wanted["records"][name]) <= 1
+
+
+@pytest.mark.django_db
+def test_get_entries_per_week_is_cached(django_assert_num_queries):
+
+    project = factories.ProjectFactory()
+    factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(datetime(2019, 7, 9, 9)),
+        stop_time_epoch=datetime.timestamp(datetime(2019, 7, 9, 10)),
+        project=project,
+    )
+
+    expected = get_entries_per_week(week_number="2019-W28")
+
+    with django_assert_num_queries(0):
+        assert get_entries_per_week(week_number="2019-W28") == expected
+
+
+@pytest.mark.django_db
+def test_get_entries_per_week_invalidated_by_writes(django_assert_num_queries):
+
+    project = factories.ProjectFactory()
+    record = factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(datetime(2019, 7, 9, 9)),
+        stop_time_epoch=datetime.timestamp(datetime(2019, 7, 9, 10)),
+        project=project,
+    )
+
+    get_entries_per_week(week_number="2019-W27")
+    get_entries_per_week(week_number="2019-W28")
+
+    update_record(
+        record=record,
+        project=project,
+        start_time=datetime(2019, 7, 9, 9),
+        stop_time=datetime(2019, 7, 9, 11),
+    )
+
+    # Only the week containing the record is computed again
+    with django_assert_num_queries(0):
+        get_entries_per_week(week_number="2019-W27")
+
+    with django_assert_num_queries(1):
+        result = get_entries_per_week(week_number="2019-W28")
+
+    assert result["days"][1]["records"] == {project.name: 2 * 60 * 60}
+
+
+@pytest.mark.django_db
+def test_get_entries_per_week_cached_with_running_record():
+
+    project = factories.ProjectFactory()
+    start_time = datetime.now().replace(microsecond=0) - timedelta(minutes=1)
+    week_number = start_time.strftime("%G-W%V")
+
+    assert get_entries_per_week(week_number=week_number)["projects"] == []
+
+    factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(start_time),
+        stop_time_epoch=None,
+        project=project,
+    )
+
+    assert get_entries_per_week(week_number=week_number)["projects"] == [
+        project.name
+    ]
+
+
+@pytest.mark.django_db
+def test_get_entries_per_week_for_category_invalidated_by_membership():
+
+    category = factories.CategoryFactory()
+    project = factories.ProjectFactory()
+    factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(datetime(2019, 7, 9, 9)),
+        stop_time_epoch=datetime.timestamp(datetime(2019, 7, 9, 10)),
+        project=project,
+    )
+
+    result = get_entries_per_week(
+        week_number="2019-W28", category=category.name
+    )
+    assert result["projects"] == []
+
+    add_project_to_category(project=project, category=category)
+
+    result = get_entries_per_week(
+        week_number="2019-W28", category=category.name
+    )
+    assert result["projects"] == [project.name]
@@ -1,14 +1,29 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError
 import pytest
 
+from track.models import (
+    ArchivedRecord,
+    Category,
+    DailyProjectTotal,
+    Project,
+    Record,
+)
 from track.services import (
     add_project_to_category,
+    archive_records,
+    bulk_create_records,
     create_category,
     create_project,
     create_record,
+    delete_category,
+    delete_project,
+    delete_record,
     remove_project_from_category,
+    update_category,
+    update_project,
     update_record,
 )
 from . import factories
@@ -61,6 +76,69 @@ def test_create_project_without_description():
     assert project.description is None
 
 
+@pytest.mark.django_db
+def test_update_category():
+    category = factories.CategoryFactory()
+
+    result = update_category(
+        category=category, name="foobar", description="foo bar"
+    )
+
+    assert result.name == "foobar"
+    assert result.description == "foo bar"
+
+
+@pytest.mark.django_db
+def test_delete_category():
+    category = factories.CategoryFactory()
+
+    delete_category(category=category)
+
+    assert not Category.objects.exists()
+
+
+@pytest.mark.django_db
+def test_update_project():
+    project = factories.ProjectFactory()
+
+    result = update_project(
+        project=project, name="foobar", description="foo bar"
+    )
+
+    assert result.name == "foobar"
+    assert result.description == "foo bar"
+
+
+@pytest.mark.django_db
+def test_update_project_categories():
+    category1 = factories.CategoryFactory()
+    category2 = factories.CategoryFactory()
+    category3 = factories.CategoryFactory()
+
+    project = factories.ProjectFactory()
+    project.categories.add(category1, category2)
+
+    update_project(
+        project=project,
+        name=project.name,
+        description=project.description,
+        categories=[category2, category3],
+    )
+
+    assert set(project.categories.all()) == {category2, category3}
+
+
+@pytest.mark.django_db
+def test_delete_project():
+    project = factories.ProjectFactory()
+    factories.RecordFactory(project=project)
+
+    delete_project(project=project)
+
+    assert not Project.objects.exists()
+    assert not DailyProjectTotal.objects.exists()
+
+
 @pytest.mark.django_db
 def test_add_project_to_category():
 
@@ -135,6 +213,33 @@ def test_create_record_stop_time_in_the_past():
         )
 
 
+@pytest.mark.django_db
+def test_create_record_second_running_record():
+
+    project = factories.ProjectFactory()
+    factories.RecordFactory(project=project, stop_time_epoch=None)
+
+    with pytest.raises(ValidationError):
+        create_record(
+            project=project, start_time=datetime.now(), stop_time=None
+        )
+
+
+@pytest.mark.django_db
+def test_second_running_record_rejected_by_database():
+
+    project = factories.ProjectFactory()
+    start_time_epoch = int(datetime.now().timestamp())
+
+    with pytest.raises(IntegrityError):
+        Record.objects.bulk_create(
+            [
+                Record(project=project, start_time_epoch=start_time_epoch),
+                Record(project=project, start_time_epoch=start_time_epoch),
+            ]
+        )
+
+
 @pytest.mark.django_db
 def test_update_record_project():
 
@@ -198,3 +303,277 @@ def test_update_record_remove_stop_time():
     )
 
     assert result.stop_time_epoch is None
+
+
+def _daily_totals():
+    return {
+        (t.day, t.project_id): (t.seconds, t.record_count)
+        for t in DailyProjectTotal.objects.all()
+    }
+
+
+@pytest.mark.django_db
+def test_create_record_credits_daily_totals():
+
+    project = factories.ProjectFactory()
+    start_time = datetime(2019, 7, 9, 9)
+
+    create_record(
+        project=project,
+        start_time=start_time,
+        stop_time=start_time + timedelta(hours=2),
+    )
+    create_record(
+        project=project,
+        start_time=start_time + timedelta(hours=3),
+        stop_time=start_time + timedelta(hours=4),
+    )
+
+    assert _daily_totals() == {
+        (start_time.date(), project.id): (3 * 60 * 60, 2)
+    }
+
+
+@pytest.mark.django_db
+def test_create_record_splits_daily_totals_at_midnight():
+
+    project = factories.ProjectFactory()
+    start_time = datetime(2019, 7, 9, 18)
+
+    create_record(
+        project=project,
+        start_time=start_time,
+        stop_time=start_time + timedelta(hours=30),
+    )
+
+    assert _daily_totals() == {
+        (date(2019, 7, 9), project.id): (6 * 60 * 60, 1),
+        (date(2019, 7, 10), project.id): (24 * 60 * 60, 1),
+    }
+
+
+@pytest.mark.django_db
+def test_create_record_no_stop_time_skips_daily_totals():
+
+    project = factories.ProjectFactory()
+    create_record(
+        project=project, start_time=datetime(2019, 7, 9, 9), stop_time=None
+    )
+
+    assert _daily_totals() == {}
+
+
+@pytest.mark.django_db
+def test_update_record_moves_daily_totals():
+
+    project = factories.ProjectFactory()
+    new_project = factories.ProjectFactory()
+    start_time = datetime(2019, 7, 9, 9)
+
+    record = create_record(
+        project=project,
+        start_time=start_time,
+        stop_time=start_time + timedelta(hours=2),
+    )
+
+    update_record(
+        record=record,
+        project=new_project,
+        start_time=start_time + timedelta(days=1),
+        stop_time=start_time + timedelta(days=1, hours=1),
+    )
+
+    assert _daily_totals() == {
+        (start_time.date() + timedelta(days=1), new_project.id): (60 * 60, 1)
+    }
+
+
+@pytest.mark.django_db
+def test_delete_record_debits_daily_totals():
+
+    project = factories.ProjectFactory()
+    start_time = datetime(2019, 7, 9, 9)
+
+    record = create_record(
+        project=project,
+        start_time=start_time,
+        stop_time=start_time + timedelta(hours=2),
+    )
+    create_record(
+        project=project,
+        start_time=start_time + timedelta(hours=3),
+        stop_time=start_time + timedelta(hours=4),
+    )
+
+    delete_record(record=record)
+
+    assert _daily_totals() == {(start_time.date(), project.id): (60 * 60, 1)}
+
+
+@pytest.mark.django_db
+def test_bulk_create_records(django_assert_max_num_queries):
+
+    project1 = factories.ProjectFactory()
+    project2 = factories.ProjectFactory()
+    start_time = datetime(2019, 7, 9, 18)
+
+    records = [
+        {
+            "project": project.name,
+            "start_time": start_time + timedelta(hours=offset),
+            "stop_time": start_time + timedelta(hours=offset, minutes=30),
+        }
+        for offset in range(1000)
+        for project in (project1, project2)
+    ]
+
+    with django_assert_max_num_queries(50):
+        created, errors = bulk_create_records(records=records)
+
+    assert created == 2000
+    assert errors == {}
+    assert Record.objects.count() == 2000
+    assert sum(t[0] for t in _daily_totals().values()) == 2000 * 30 * 60
+
+
+@pytest.mark.django_db
+def test_bulk_create_records_with_errors():
+
+    project = factories.ProjectFactory()
+    factories.RecordFactory(project=project, stop_time_epoch=None)
+    start_time = datetime(2019, 7, 9, 9)
+
+    created, errors = bulk_create_records(
+        records=[
+            {
+                "project": project.name,
+                "start_time": start_time,
+                "stop_time": start_time + timedelta(hours=1),
+            },
+            {
+                "project": "does-not-exist",
+                "start_time": start_time,
+                "stop_time": start_time + timedelta(hours=1),
+            },
+            {
+                "project": project.name,
+                "start_time": start_time,
+                "stop_time": start_time - timedelta(hours=1),
+            },
+            {"project": project.name, "start_time": start_time},
+            {
+                "project": project.name,
+                "start_time": datetime(1969, 12, 31, 23),
+                "stop_time": datetime(1970, 1, 1, 1),
+            },
+            {
+                "project": project.name,
+                "start_time": datetime(1969, 12, 31, 22),
+                "stop_time": datetime(1969, 12, 31, 23),
+            },
+        ]
+    )
+
+    assert created == 1
+    assert errors == {
+        1: ["Project does-not-exist does not exist"],
+        2: ["Stop time cannot be before start time"],
+        3: ["Another record is already running"],
+        4: ["Start time cannot be before 1970"],
+        5: [
+            "Start time cannot be before 1970",
+            "Stop time cannot be before 1970",
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_bulk_create_records_updates_existing_daily_totals():
+
+    project = factories.ProjectFactory()
+    start_time = datetime(2019, 7, 9, 9)
+
+    create_record(
+        project=project,
+        start_time=start_time,
+        stop_time=start_time + timedelta(hours=1),
+    )
+    bulk_create_records(
+        records=[
+            {
+                "project": project.name,
+                "start_time": start_time + timedelta(hours=2),
+                "stop_time": start_time + timedelta(hours=4),
+            }
+        ]
+    )
+
+    assert _daily_totals() == {
+        (start_time.date(), project.id): (3 * 60 * 60, 2)
+    }
+
+
+@pytest.mark.django_db
+def test_archive_records():
+
+    project = factories.ProjectFactory()
+    start_time = datetime(2019, 7, 9, 9)
+
+    old = [
+        factories.RecordFactory(
+            start_time_epoch=datetime.timestamp(start_time + timedelta(n)),
+            stop_time_epoch=datetime.timestamp(
+                start_time + timedelta(n, hours=1)
+            ),
+            project=project,
+        )
+        for n in range(3)
+    ]
+    # Stopped after the cutoff, and still running
+    crossing = factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(datetime(2019, 7, 11, 23)),
+        stop_time_epoch=datetime.timestamp(datetime(2019, 7, 12, 1)),
+        project=project,
+    )
+    running = factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(start_time),
+        stop_time_epoch=None,
+        project=project,
+    )
+    totals = _daily_totals()
+
+    assert archive_records(before=date(2019, 7, 12), limit=2) == 2
+    assert archive_records(before=date(2019, 7, 12), limit=2) == 1
+    assert archive_records(before=date(2019, 7, 12), limit=2) == 0
+
+    assert set(Record.objects.values_list("id", flat=True)) == {
+        crossing.id,
+        running.id,
+    }
+    assert [
+        (a.id, a.start_time_epoch, a.stop_time_epoch, a.created, a.modified)
+        for a in ArchivedRecord.objects.order_by("id")
+    ] == [
+        (r.id, r.start_time_epoch, r.stop_time_epoch, r.created, r.modified)
+        for r in old
+    ]
+    assert _daily_totals() == totals
+
+
+@pytest.mark.django_db
+def test_archive_records_stopped_at_the_cutoff():
+
+    cutoff = datetime(2019, 7, 12)
+    before = factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(cutoff - timedelta(hours=1)),
+        stop_time_epoch=datetime.timestamp(cutoff - timedelta(seconds=1)),
+    )
+    factories.RecordFactory(
+        start_time_epoch=datetime.timestamp(cutoff - timedelta(hours=1)),
+        stop_time_epoch=datetime.timestamp(cutoff),
+    )
+
+    assert archive_records(before=cutoff.date()) == 1
+    assert list(ArchivedRecord.objects.values_list("id", flat=True)) == [
+        before.id
+    ]
@@ -0,0 +1,72 @@
+import logging
+from types import SimpleNamespace
+
+from django.db import connection
+import pytest
+
+from track.models import Record
+from track.selectors import get_elapsed_time
+from track.slowlog import SlowQueryLog, install
+
+from . import factories
+
+
+@pytest.mark.django_db
+def test_slow_queries_are_logged(settings, caplog):
+
+    project = factories.ProjectFactory()
+    settings.TRACK_SLOW_QUERY_SECONDS = 1e-9
+
+    with caplog.at_level(logging.WARNING, logger="track.slowlog"):
+        get_elapsed_time(project=project)
+
+    record = next(r for r in caplog.records if r.name == "track.slowlog")
+    assert record.sql.startswith("SELECT")
+    assert "track_record" in record.sql
+    assert any("SEARCH track_record USING" in line for line in record.plan)
+
+    message = record.getMessage()
+    assert "track/selectors.py" in message
+    assert "in get_elapsed_time" in message
+    assert "test_slowlog.py" in message
+
+
+@pytest.mark.django_db
+def test_fast_queries_are_not_logged(settings, caplog):
+
+    settings.TRACK_SLOW_QUERY_SECONDS = 10
+
+    with caplog.at_level(logging.WARNING, logger="track.slowlog"):
+        list(Record.objects.all())
+
+    assert not [r for r in caplog.records if r.name == "track.slowlog"]
+
+
+@pytest.mark.django_db
+def test_writes_are_not_explained(settings, caplog):
+
+    settings.TRACK_SLOW_QUERY_SECONDS = 1e-9
+
+    with caplog.at_level(logging.WARNING, logger="track.slowlog"):
+        factories.ProjectFactory()
+
+    logged = [r for r in caplog.records if r.name == "track.slowlog"]
+    assert any(r.sql.startswith("INSERT") for r in logged)
+    assert all(
+        r.plan == [] for r in logged if not r.sql.startswith("SELECT")
+    )
+
+
+def test_installed_once_and_outside_execute_wrappers():
+
+    assert isinstance(connection.execute_wrappers[0], SlowQueryLog)
+
+    # A connection opened within an execute_wrapper() block
+    timer = object()
+    opened = SimpleNamespace(execute_wrappers=[timer])
+    install(sender=None, connection=opened)
+    install(sender=None, connection=opened)
+
+    assert len(opened.execute_wrappers) == 2
+    assert opened.execute_wrappers.pop() is timer
+    assert isinstance(opened.execute_wrappers[0], SlowQueryLog)
@@ -0,0 +1,54 @@
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+import pytest
+
+
+def _pragma(wrapper, name):
+    with wrapper.cursor() as cursor:
+        cursor.execute(f"PRAGMA {name}")
+        return cursor.fetchone()[0]
+
+
+@pytest.fixture
+def database(tmp_path, django_db_blocker):
+    settings_dict = {
+        **connection.settings_dict,
+        "NAME": str(tmp_path / "db.sqlite3"),
+    }
+    wrapper = DatabaseWrapper(settings_dict, alias="pragmas")
+    with django_db_blocker.unblock():
+        yield wrapper
+        wrapper.close()
+
+
+def test_pragmas_applied_to_new_connections(database):
+
+    database.ensure_connection()
+
+    assert _pragma(database, "journal_mode") == "wal"
+    assert _pragma(database, "synchronous") == 1
+    assert _pragma(database, "cache_size") == -64 * 1024
+    assert _pragma(database, "mmap_size") == 256 * 1024 * 1024
+    assert _pragma(database, "temp_store") == 2
+
+
+def test_pragmas_from_settings(database, settings):
+
+    settings.TRACK_SQLITE_PRAGMAS = {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "mmap_size": "",
+    }
+    database.ensure_connection()
+
+    assert _pragma(database, "journal_mode") == "delete"
+    assert _pragma(database, "synchronous") == 2
+    assert _pragma(database, "mmap_size") == 0
+
+
+def test_invalid_pragma_value(database, settings):
+
+    settings.TRACK_SQLITE_PRAGMAS = {"journal_mode": "WAL; DROP TABLE x"}
+
+    with pytest.raises(ValueError):
+        database.ensure_connection()